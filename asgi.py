@@ -0,0 +1,15 @@
+"""
+Asynchronous Server Gateway Interface (ASGI) entry point
+
+Serve it with the uvicorn worker of gunicorn:
+    gunicorn --worker-class uvicorn.workers.UvicornWorker asgi:app
+"""
+from service import create_app
+
+flask_app = create_app()
+
+# The async routes use the API models, which exist once the app is created
+# pylint: disable=wrong-import-position
+from service.async_routes import create_asgi_app  # noqa: E402
+
+app = create_asgi_app(flask_app)
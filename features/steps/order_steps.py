@@ -38,16 +38,12 @@ WAIT_TIMEOUT = 60
 def step_impl(context):
     """Delete all Orders and load new ones"""
 
-    # Get a list all of the orders
+    # Delete all of the orders with a single bulk delete
     rest_endpoint = f"{context.base_url}/api/orders"
-    context.resp = requests.get(rest_endpoint, timeout=WAIT_TIMEOUT)
+    context.resp = requests.delete(
+        rest_endpoint, params={"all": "true"}, timeout=WAIT_TIMEOUT
+    )
     expect(context.resp.status_code).equal_to(HTTP_200_OK)
-    # and delete them one by one
-    for order in context.resp.json():
-        context.resp = requests.delete(
-            f"{rest_endpoint}/{order['id']}", timeout=WAIT_TIMEOUT
-        )
-        expect(context.resp.status_code).equal_to(HTTP_204_NO_CONTENT)
 
     # load the database with new orders
     for row in context.table:
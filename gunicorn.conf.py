@@ -0,0 +1,111 @@
+"""
+Gunicorn configuration
+
+Every setting can be changed with an environment variable so the same
+image can be tuned per deployment. The defaults fit a pod limited to half
+a CPU and 128Mi of memory: one worker with a few threads.
+Run it with:
+    gunicorn --config gunicorn.conf.py
+"""
+import math
+import os
+
+
+def cpu_quota() -> float:
+    """Returns the number of CPUs the container may use
+
+    The CFS quota of the cgroup is used when there is one, since
+    os.cpu_count() reports the CPUs of the node, not the pod limit.
+    """
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max", encoding="utf-8") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: a quota of -1 means no limit
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", encoding="utf-8") as cfs_quota:
+                quota = int(cfs_quota.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", encoding="utf-8") as cfs_period:
+                period = int(cfs_period.read())
+            if quota > 0:
+                return quota / period
+        except (OSError, ValueError):
+            pass
+    return float(os.cpu_count() or 1)
+
+
+def memory_limit():
+    """Returns the memory limit of the container in MiB, or None"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path, encoding="utf-8") as limit:
+                value = limit.read().strip()
+        except OSError:
+            continue
+        # cgroup v1 reports no limit as a huge number
+        if value.isdigit() and int(value) < 2**60:
+            return int(value) // 2**20
+        return None
+    return None
+
+
+def default_workers() -> int:
+    """Two workers per CPU of the quota, as many as fit in the memory limit"""
+    count = max(1, math.floor(cpu_quota() * 2))
+    limit = memory_limit()
+    if limit is not None:
+        # the master, which does not load the app, takes about half a worker
+        worker_memory = int(os.getenv("GUNICORN_WORKER_MEMORY", "64"))
+        count = min(count, max(1, (limit - worker_memory // 2) // worker_memory))
+    return count
+
+
+# Worker class: gthread (the default), sync, gevent (needs gevent installed)
+# or uvicorn.workers.UvicornWorker, which serves asgi:app instead of wsgi:app
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+wsgi_app = os.getenv("GUNICORN_APP", "asgi:app" if "uvicorn" in worker_class else "wsgi:app")
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+
+# Each worker holds its own copy of the app (about 64MiB, set in
+# GUNICORN_WORKER_MEMORY) and its own connection pool, so memory limits
+# the workers more than CPU does on small pods
+workers = int(os.getenv("GUNICORN_WORKERS", str(default_workers())))
+# Requests served at once by a gthread worker (connections for gevent)
+threads = int(os.getenv("GUNICORN_THREADS", "4" if worker_class == "gthread" else "1"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "100"))
+
+# Seconds an idle client connection is kept open, longer than the default
+# of 2 so that clients and load balancers can reuse connections
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Restart a worker after this many requests, plus up to the jitter so that
+# the workers do not all restart at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+# Load the app once in the master and fork the workers from it. This
+# starts workers faster, but the master then holds a whole copy of the app
+# and the pages it shares with the workers are copied as they run, so it
+# only pays with several workers and is off by default
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() in ("true", "yes", "1")
+
+# Seconds a worker may stay silent before it is killed and restarted, and
+# seconds the workers get to finish their requests on a restart or stop
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+# The worker heartbeat files go to memory, not to the container overlay
+worker_tmp_dir = os.getenv("GUNICORN_WORKER_TMP_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else None)
+
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_worker_init(worker):  # pylint: disable=unused-argument
+    """Opens the connection pool of a new worker, /ready answers 503 until then"""
+    from service.common.readiness import readiness  # pylint: disable=import-outside-toplevel
+
+    readiness.start()
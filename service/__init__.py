@@ -38,8 +38,14 @@ api = None  # pylint: disable=invalid-name
 ############################################################
 # Initialize the Flask instance
 ############################################################
-def create_app():
-    """Initialize the core application."""
+def create_app(check_schema: bool = True):
+    """Initialize the core application.
+
+    The workers only check that the database schema is at the version of
+    the code. DB_AUTO_UPGRADE makes them apply the migrations instead, for
+    development and tests, and check_schema=False skips the check for
+    the flask db-upgrade command.
+    """
     # Create Flask application
     app = Flask(__name__)
     app.config.from_object(config)
@@ -72,15 +78,25 @@ def create_app():
     with app.app_context():
         # Dependencies require we import the routes AFTER the Flask app is created
         # pylint: disable=wrong-import-position, wrong-import-order, unused-import, cyclic-import
-        from service import routes, models  # noqa: F401 E402
-        from service.common import error_handlers, cli_commands  # noqa: F401, E402
+        from service import routes, item_routes, outbox_routes, rollup_routes, models  # noqa: F401 E402
+        from service.common import error_handlers, cli_commands, migrations  # noqa: F401, E402
+        from service.common.readiness import readiness, retry_database
 
         try:
-            db.create_all()
+            # PostgreSQL may still be starting, so connecting is retried
+            if app.config["DB_AUTO_UPGRADE"]:
+                retry_database(app, migrations.upgrade, db.engine)
+            elif check_schema:
+                retry_database(app, migrations.verify, db.engine)
         except Exception as error:  # pylint: disable=broad-except
             app.logger.critical("%s: Cannot continue", error)
             # gunicorn requires exit code 4 to stop spawning workers when they die
             sys.exit(4)
+        # gunicorn may fork the workers from this process (preload_app), and
+        # they must not share the connections opened so far
+        db.engine.dispose()
+        # each worker warms its own pool, see post_worker_init in gunicorn.conf.py
+        readiness.init_app(app)
 
         # Set up logging for production
         log_handlers.init_logging(app, "gunicorn.error")
@@ -0,0 +1,415 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Async Routes
+
+This module serves the busiest Order and Item paths under an ASGI server
+with an async SQLAlchemy engine, so a worker keeps answering requests
+while others wait on PostgreSQL. It runs the same statements as the
+models and writes the same outbox events.
+
+Every other request goes to the Flask application. So does any request
+that the fast path cannot answer by itself, like invalid data, missing
+rows, archived Orders or query strings. Those requests get exactly the
+same responses and errors as under WSGI.
+
+GET    /api/orders/{order_id}
+PATCH  /api/orders/{order_id}
+DELETE /api/orders/{order_id}
+GET    /api/orders/{order_id}/items
+POST   /api/orders/{order_id}/items
+GET    /api/orders/{order_id}/item/{item_id}
+PATCH  /api/orders/{order_id}/item/{item_id}
+DELETE /api/orders/{order_id}/item/{item_id}
+GET    /api/orders/status-stream
+
+The status stream runs on the event loop, reading the changes of the
+status hub from an asyncio queue, so an open stream holds no thread and a
+worker serves up to STATUS_STREAM_MAX_CLIENTS of them.
+"""
+import asyncio
+import json
+import logging
+import re
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask_restx import marshal
+from sqlalchemy import delete, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import selectinload
+from service.common import status
+from service.common.status_hub import hub, SubscriberLimitError
+from service.models import DataValidationError, Item, Order, OrderEvent
+from service.outbox_routes import server_sent_event
+from service.routes import id_list, item_model, order_model, order_summary_model
+
+logger = logging.getLogger("flask.app")
+
+
+class _ThreadedWsgiInstance(WsgiToAsgiInstance):
+    """Runs a Flask request in the thread pool of the event loop
+
+    asgiref runs every request on one shared thread by default, so a
+    single change feed or status stream would hold up all the others.
+    """
+
+    run_wsgi_app = sync_to_async(
+        WsgiToAsgiInstance.run_wsgi_app.__wrapped__, thread_sensitive=False
+    )
+
+
+class _ThreadedWsgiToAsgi(WsgiToAsgi):  # pylint: disable=too-few-public-methods
+    """Wraps the Flask application like WsgiToAsgi with many threads"""
+
+    async def __call__(self, scope, receive, send):
+        await _ThreadedWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(
+            scope, receive, send
+        )
+
+
+class AsyncService:
+    """ASGI application that answers the hot paths and hands the rest to Flask"""
+
+    def __init__(self, flask_app, engine=None):
+        self.flask = _ThreadedWsgiToAsgi(flask_app)
+        self.config = flask_app.config
+        self.engine = engine or create_async_engine(
+            flask_app.config["SQLALCHEMY_DATABASE_URI"],
+            pool_size=flask_app.config["ASYNC_POOL_SIZE"],
+            max_overflow=flask_app.config["ASYNC_MAX_OVERFLOW"],
+        )
+        orders = r"/api/orders/(\d+)"
+        item = orders + r"/item/(\d+)"
+        self.routes = [
+            ("GET", orders, self.get_order),
+            ("PATCH", orders, self.patch_order),
+            ("DELETE", orders, self.delete_order),
+            ("GET", orders + "/items", self.list_items),
+            ("POST", orders + "/items", self.create_item),
+            ("GET", item, self.get_item),
+            ("PATCH", item, self.patch_item),
+            ("DELETE", item, self.delete_item),
+        ]
+        self.routes = [
+            (method, re.compile(pattern + "/?"), handler) for method, pattern, handler in self.routes
+        ]
+        # streams send their own response and return False to leave the request to Flask
+        self.streams = [("GET", re.compile(r"/api/orders/status-stream/?"), self.stream_status)]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        stream, _ = self._match(scope, self.streams)
+        if stream is not None and await stream(scope, receive, send):
+            return
+        handler, args = self._match(scope, self.routes)
+        if handler is None:
+            await self.flask(scope, receive, send)
+            return
+        body = await _read_body(receive)
+        try:
+            response = await handler(scope, body, *args)
+        except SQLAlchemyError as error:
+            # the transaction was rolled back, Flask reports the error
+            logger.error("Async %s %s failed: %s", scope["method"], scope["path"], error)
+            response = None
+        if response is None:
+            await self.flask(scope, _replay(body, receive), send)
+            return
+        await _send_json(send, *response)
+
+    @staticmethod
+    def _match(scope, routes) -> tuple:
+        """Returns the handler of a request and its arguments, or None"""
+        if scope["type"] == "http":
+            for method, pattern, handler in routes:
+                found = pattern.fullmatch(scope["path"])
+                if found and scope["method"] == method:
+                    return handler, [int(arg) for arg in found.groups()]
+        return None, None
+
+    async def _lifespan(self, receive, send):
+        """Disposes of the connection pool when the server shuts down"""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    ######################################################################
+    # ORDERS
+    ######################################################################
+
+    async def get_order(self, scope, body, order_id):  # pylint: disable=unused-argument
+        """Returns an Order with its Items, archived Orders are left to Flask"""
+        async with AsyncSession(self.engine) as session:
+            order = await session.scalar(
+                select(Order).where(Order.id == order_id).options(selectinload(Order.items))
+            )
+            if order is None:
+                return None
+            return status.HTTP_200_OK, marshal(order.serialize(), order_model)
+
+    async def patch_order(self, scope, body, order_id):
+        """Updates some fields of an Order with one UPDATE ... RETURNING"""
+        try:
+            statement, event_type = Order.patch_statement(order_id, _json_body(scope, body))
+        except DataValidationError:
+            return None
+        async with AsyncSession(self.engine) as session, session.begin():
+            row = (await session.execute(statement)).first()
+            if row is None:
+                # Flask tells a missing Order from one in the wrong status
+                return None
+            await _record(session, event_type, [order_id])
+        return status.HTTP_200_OK, marshal(Order.serialize_summary(row), order_summary_model)
+
+    async def delete_order(self, scope, body, order_id):  # pylint: disable=unused-argument
+        """Deletes an Order, the database cascades it to the Items"""
+        async with AsyncSession(self.engine) as session, session.begin():
+            deleted = (
+                await session.scalars(delete(Order).where(Order.id == order_id).returning(Order.id))
+            ).all()
+            await _record(session, OrderEvent.DELETED, deleted)
+        return status.HTTP_204_NO_CONTENT, None
+
+    ######################################################################
+    # ITEMS
+    ######################################################################
+
+    async def list_items(self, scope, body, order_id):  # pylint: disable=unused-argument
+        """Returns every Item of an Order, filters and pages are left to Flask"""
+        if scope["query_string"]:
+            return None
+        async with AsyncSession(self.engine) as session:
+            rows = (await session.execute(Item.list_statement(order_id))).all()
+            if not rows:
+                return None
+            items = [item.serialize() for _, item in rows if item is not None]
+        return status.HTTP_200_OK, marshal(items, item_model)
+
+    async def create_item(self, scope, body, order_id):
+        """Adds an Item to an Order with one INSERT ... SELECT"""
+        try:
+            statement = Item.add_statement(order_id, _json_body(scope, body))
+        except DataValidationError:
+            return None
+        async with AsyncSession(self.engine) as session, session.begin():
+            item = await session.scalar(statement)
+            if item is None:
+                return None
+            message = item.serialize()
+            await _record(session, OrderEvent.UPDATED, [order_id], refresh_totals=True)
+        location = _url(scope, f"/api/orders/{order_id}/item/{message['id']}")
+        return status.HTTP_201_CREATED, marshal(message, item_model), {"Location": location}
+
+    async def get_item(self, scope, body, order_id, item_id):  # pylint: disable=unused-argument
+        """Returns an Item of an Order"""
+        async with AsyncSession(self.engine) as session:
+            item = await session.scalar(
+                select(Item).where(Item.order_id == order_id, Item.id == item_id)
+            )
+            if item is None:
+                return None
+            return status.HTTP_200_OK, marshal(item.serialize(), item_model)
+
+    async def patch_item(self, scope, body, order_id, item_id):
+        """Updates the quantity and price of an Item with one UPDATE ... RETURNING"""
+        try:
+            statement = Item.patch_statement(order_id, item_id, _json_body(scope, body))
+        except DataValidationError:
+            return None
+        async with AsyncSession(self.engine) as session, session.begin():
+            item = await session.scalar(statement)
+            if item is None:
+                return None
+            message = item.serialize()
+            await _record(session, OrderEvent.UPDATED, [order_id], refresh_totals=True)
+        return status.HTTP_200_OK, marshal(message, item_model)
+
+    async def delete_item(self, scope, body, order_id, item_id):  # pylint: disable=unused-argument
+        """Deletes an Item of an Order, a missing one is reported by Flask"""
+        async with AsyncSession(self.engine) as session, session.begin():
+            _, deleted = (await session.execute(Item.delete_statement(order_id, item_id))).one()
+            if not deleted:
+                return None
+            await _record(session, OrderEvent.UPDATED, [order_id], refresh_totals=True)
+        return status.HTTP_204_NO_CONTENT, None
+
+    ######################################################################
+    # STATUS STREAM
+    ######################################################################
+
+    async def stream_status(self, scope, receive, send) -> bool:
+        """Streams status changes as Server-Sent Events, invalid ids are left to Flask"""
+        try:
+            ids = id_list(parse_qs(scope["query_string"].decode("latin1")).get("ids", [""])[-1])
+        except ValueError:
+            return False
+        if len(ids) > self.config["LOOKUP_MAX_IDS"]:
+            return False
+        dsn = self.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        try:
+            subscription = await hub.subscribe_async(
+                dsn,
+                ids,
+                self.config["STATUS_STREAM_QUEUE_SIZE"],
+                max_subscribers=self.config["STATUS_STREAM_MAX_CLIENTS"],
+            )
+        except (ConnectionError, SubscriberLimitError) as error:
+            logger.warning("Refusing a status stream: %s", error)
+            await _send_json(send, status.HTTP_503_SERVICE_UNAVAILABLE, {"message": str(error)})
+            return True
+        try:
+            # read after subscribing so that no change falls in between
+            current = await self._statuses(ids) if ids else []
+            logger.info("Streaming the status of %s orders", len(ids) if ids else "all")
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": status.HTTP_200_OK,
+                    "headers": [
+                        (b"content-type", b"text/event-stream; charset=utf-8"),
+                        (b"cache-control", b"no-cache"),
+                        (b"x-accel-buffering", b"no"),
+                    ],
+                }
+            )
+            for change in current:
+                await _send_chunk(send, server_sent_event("status", change))
+            await self._push(subscription, receive, send)
+        finally:
+            hub.unsubscribe(subscription)
+        return True
+
+    async def _statuses(self, ids: list) -> list:
+        """Returns the id and status name of Orders like Order.statuses()"""
+        async with AsyncSession(self.engine) as session:
+            rows = (await session.execute(Order.statuses_statement(ids))).all()
+        return [{"id": order_id, "status": order_status.name} for order_id, order_status in rows]
+
+    async def _push(self, subscription, receive, send):
+        """Sends the changes of a subscription until the client disconnects or falls behind"""
+        heartbeat = self.config["STATUS_STREAM_HEARTBEAT"]
+        disconnected = asyncio.ensure_future(_disconnected(receive))
+        try:
+            while True:
+                change = asyncio.ensure_future(subscription.get(heartbeat))
+                await asyncio.wait({change, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    change.cancel()
+                    return
+                if subscription.overflowed:
+                    # the client reconnects and reads the current status again
+                    await _send_chunk(send, server_sent_event("reset", {}), more_body=False)
+                    return
+                change = change.result()
+                await _send_chunk(send, server_sent_event("status", change) if change else ": keepalive\n\n")
+        finally:
+            disconnected.cancel()
+
+
+######################################################################
+# U T I L I T Y   F U N C T I O N S
+######################################################################
+
+
+async def _record(session, event_type: str, order_ids, refresh_totals: bool = False):
+    """Refreshes the totals of Orders and writes their outbox events"""
+    connection = await session.connection()
+    if refresh_totals:
+        await connection.execute(Order.refresh_totals_statement(order_ids))
+    for sql, parameters in OrderEvent.record_statements(event_type, order_ids):
+        await connection.exec_driver_sql(sql, parameters)
+
+
+async def _read_body(receive) -> bytes:
+    """Reads the whole body of a request"""
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _disconnected(receive):
+    """Returns once the client of a streamed response disconnects"""
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def _replay(body: bytes, receive):
+    """Returns a receive callable that sends a body that was already read"""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def replay():
+        if messages:
+            return messages.pop()
+        return await receive()
+
+    return replay
+
+
+def _json_body(scope, body: bytes):
+    """Returns the JSON body of a request, or None like get_json(silent=True)"""
+    headers = dict(scope["headers"])
+    if not headers.get(b"content-type", b"").startswith(b"application/json"):
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def _url(scope, path: str) -> str:
+    """Returns the external URL of a path like url_for(_external=True)"""
+    headers = dict(scope["headers"])
+    host = headers.get(b"host", b"").decode("latin1")
+    if not host:
+        server, port = scope.get("server") or ("localhost", 80)
+        host = f"{server}:{port}"
+    return f"{scope.get('scheme', 'http')}://{host}{scope.get('root_path', '')}{path}"
+
+
+async def _send_json(send, code: int, body=None, headers=None):
+    """Sends a response with a JSON body like flask-restx does"""
+    content = b"" if body is None else (json.dumps(body) + "\n").encode()
+    raw_headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(content)).encode()),
+    ]
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode(), value.encode("latin1")))
+    await send({"type": "http.response.start", "status": code, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": content})
+
+
+async def _send_chunk(send, text: str, more_body: bool = True):
+    """Sends a part of a streamed response"""
+    await send({"type": "http.response.body", "body": text.encode(), "more_body": more_body})
+
+
+def create_asgi_app(flask_app) -> AsyncService:
+    """Wraps the Flask application in the ASGI application"""
+    return AsyncService(flask_app)
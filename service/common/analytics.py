@@ -0,0 +1,180 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Analytics
+
+This module loads the items of the live and archived orders in column
+batches through a server side cursor and computes revenue, quantiles and
+histograms with vectorized NumPy operations. Every column arrives as a
+number, status as its OrderStatus value and created_at as days since the
+epoch, so no ORM objects or Python dates are ever created.
+"""
+import time
+import numpy as np
+from service.models import db, OrderStatus
+
+# name and dtype of each column, in the order of ITEM_QUERY
+COLUMNS = (
+    ("id", np.int64),
+    ("order_id", np.int64),
+    ("quantity", np.int64),
+    ("price", np.float64),
+    ("status", np.int8),
+    ("day", np.int32),
+)
+
+# the items of the live and of the archived orders
+ITEM_QUERY = " UNION ALL ".join(
+    f"""
+    SELECT i.id, i.order_id, i.quantity, i.price,
+           array_position(enum_range(NULL::orderstatus), o.status) - 1,
+           o.created_at - DATE '1970-01-01'
+    FROM {items} i JOIN {orders} o ON o.id = i.order_id
+    WHERE (%(created_from)s::date IS NULL OR o.created_at >= %(created_from)s::date)
+      AND (%(created_to)s::date IS NULL OR o.created_at <= %(created_to)s::date)
+    """
+    for items, orders in (("item", '"order"'), ("item_archive", "order_archive"))
+)
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def empty_columns() -> dict:
+    """Returns a dictionary of empty column arrays"""
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+
+
+def iter_batches(conn, batch_size: int = 100000, created_from=None, created_to=None):
+    """Reads the items in column batches through a server side cursor
+
+    :param conn: a psycopg connection
+    :param batch_size: the number of rows fetched per round trip
+    :param created_from: only read items of orders created on or after this date
+    :param created_to: only read items of orders created on or before this date
+
+    :return: an iterator of dictionaries of NumPy arrays, one per column
+    """
+    params = {"created_from": created_from, "created_to": created_to}
+    with conn.cursor(name="analytics") as cur:
+        cur.itersize = batch_size
+        cur.execute(ITEM_QUERY, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            yield {
+                name: np.fromiter((row[index] for row in rows), dtype=dtype, count=len(rows))
+                for index, (name, dtype) in enumerate(COLUMNS)
+            }
+
+
+def load_items(batch_size: int = 100000, created_from=None, created_to=None) -> dict:
+    """Loads every item matching the dates into one array per column"""
+    connection = db.engine.raw_connection()
+    try:
+        batches = list(
+            iter_batches(connection.driver_connection, batch_size, created_from, created_to)
+        )
+        connection.commit()
+    finally:
+        connection.close()
+    if not batches:
+        return empty_columns()
+    return {name: np.concatenate([batch[name] for batch in batches]) for name, _ in COLUMNS}
+
+
+def summarize(columns: dict, bins: int = 10) -> dict:
+    """Computes revenue, quantiles and a histogram of order values
+
+    :param columns: the item columns returned by load_items()
+    :param bins: the number of histogram bins
+
+    :return: a dictionary of statistics
+    :rtype: dict
+    """
+    value = columns["quantity"] * columns["price"]
+    report = {
+        "items": int(value.size),
+        "orders": 0,
+        "revenue": float(value.sum()),
+        "revenue_by_status": {
+            status.name: float(total)
+            for status, total in zip(
+                OrderStatus,
+                np.bincount(columns["status"], weights=value, minlength=len(OrderStatus)),
+            )
+        },
+        "item_value_quantiles": {},
+        "order_value_quantiles": {},
+        "order_value_histogram": [],
+    }
+    if not value.size:
+        return report
+
+    # sum the item values of each order without a Python loop
+    _, order_index = np.unique(columns["order_id"], return_inverse=True)
+    order_value = np.bincount(order_index, weights=value)
+    report["orders"] = int(order_value.size)
+    report["item_value_quantiles"] = _quantiles(value)
+    report["order_value_quantiles"] = _quantiles(order_value)
+    counts, edges = np.histogram(order_value, bins=bins)
+    report["order_value_histogram"] = [
+        (float(low), float(high), int(count))
+        for low, high, count in zip(edges[:-1], edges[1:], counts)
+    ]
+    return report
+
+
+def _quantiles(values) -> dict:
+    return {
+        f"p{int(q * 100)}": float(v) for q, v in zip(QUANTILES, np.quantile(values, QUANTILES))
+    }
+
+
+def analyze(batch_size: int = 100000, created_from=None, created_to=None, bins: int = 10) -> dict:
+    """Loads the items and summarizes them, timing both steps"""
+    start = time.perf_counter()
+    columns = load_items(batch_size, created_from, created_to)
+    loaded = time.perf_counter()
+    report = summarize(columns, bins)
+    report["load_seconds"] = loaded - start
+    report["compute_seconds"] = time.perf_counter() - loaded
+    return report
+
+
+def format_report(report: dict) -> str:
+    """Formats a report from analyze() for the terminal"""
+    lines = [
+        f"Items: {report['items']}  Orders: {report['orders']}  Revenue: {report['revenue']:.2f}",
+        "Revenue by status: "
+        + ", ".join(f"{name}={total:.2f}" for name, total in report["revenue_by_status"].items()),
+    ]
+    for name in ("item_value_quantiles", "order_value_quantiles"):
+        if report[name]:
+            values = ", ".join(f"{q}={v:.2f}" for q, v in report[name].items())
+            lines.append(f"{name.replace('_', ' ').capitalize()}: {values}")
+    if report["order_value_histogram"]:
+        lines.append("Order value histogram:")
+        width = max(count for _, _, count in report["order_value_histogram"]) or 1
+        for low, high, count in report["order_value_histogram"]:
+            bar = "#" * round(40 * count / width)
+            lines.append(f"  {low:>10.2f} - {high:<10.2f} {count:>8} {bar}")
+    if "load_seconds" in report:
+        lines.append(
+            f"Loaded in {report['load_seconds']:.2f}s, computed in {report['compute_seconds']:.2f}s"
+        )
+    return "\n".join(lines)
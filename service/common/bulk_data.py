@@ -0,0 +1,332 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Bulk Data
+
+This module moves large amounts of Orders and Items in and out of the
+database with the PostgreSQL COPY protocol instead of going through the
+ORM one row at a time
+"""
+import csv
+import gzip
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from itertools import groupby
+from psycopg import sql
+from service.models import db, OrderStatus, OrderEvent, DataValidationError, OUTBOX_SQL, PARTITIONED
+
+ORDER_COLUMNS = (
+    "id",
+    "customer_id",
+    "shipping_address",
+    "created_at",
+    "status",
+    "total_amount",
+    "item_count",
+)
+ITEM_COLUMNS = ("id", "order_id", "product_id", "product_description", "quantity", "price")
+
+# Columns of a flat CSV import file, one row per item
+CSV_COLUMNS = (
+    "order_ref",
+    "customer_id",
+    "shipping_address",
+    "created_at",
+    "status",
+    "product_id",
+    "product_description",
+    "quantity",
+    "price",
+)
+
+
+######################################################################
+# Order sources
+######################################################################
+def generate_orders(count: int, items_per_order: int = 3, days: int = 365):
+    """Generates random orders with a number of items each
+
+    :param count: the number of orders to generate
+    :param items_per_order: the maximum number of items per order
+    :param days: how far back in time the created_at dates are spread
+
+    :return: an iterator of order dictionaries
+    """
+    today = date.today()
+    statuses = [e.name for e in OrderStatus]
+    for _ in range(count):
+        yield {
+            "customer_id": random.randint(1, 100000),
+            "shipping_address": f"{random.randint(1, 9999)} Seed Street",
+            "created_at": today - timedelta(days=random.randint(0, days)),
+            "status": random.choice(statuses),
+            "items": [
+                {
+                    "product_id": random.randint(1, 5000),
+                    "product_description": f"Product {random.randint(1, 5000)}",
+                    "quantity": random.randint(1, 10),
+                    "price": round(random.uniform(1, 500), 2),
+                }
+                for _ in range(random.randint(1, items_per_order))
+            ],
+        }
+
+
+def read_ndjson(stream):
+    """Reads orders in the API format from a newline delimited JSON stream"""
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    """Reads orders from a CSV stream with one row per item
+
+    Consecutive rows that share an order_ref belong to the same order. A
+    row with an empty product_id describes an order without items.
+    """
+    reader = csv.DictReader(stream)
+    missing = set(CSV_COLUMNS) - set(reader.fieldnames or [])
+    if missing:
+        raise DataValidationError(f"CSV file is missing columns: {', '.join(sorted(missing))}")
+    for _, rows in groupby(reader, key=lambda row: row["order_ref"]):
+        rows = list(rows)
+        order = {key: rows[0][key] for key in CSV_COLUMNS[1:5]}
+        order["items"] = [
+            {key: row[key] for key in CSV_COLUMNS[5:]} for row in rows if row["product_id"]
+        ]
+        yield order
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+######################################################################
+# COPY based loader
+######################################################################
+class BulkLoader:
+    """Loads batches of orders and their items with COPY FROM STDIN"""
+
+    def __init__(self, batch_size: int = 5000, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.orders = 0
+        self.items = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        """Rows loaded per second so far"""
+        return (self.orders + self.items) / self.elapsed if self.elapsed else 0.0
+
+    def load(self, orders) -> "BulkLoader":
+        """Loads an iterable of order dictionaries in batches"""
+        start = time.perf_counter()
+        connection = db.engine.raw_connection()
+        try:
+            batch = []
+            for order in orders:
+                batch.append(order)
+                if len(batch) >= self.batch_size:
+                    self._load_batch(connection.driver_connection, batch)
+                    self._report(start)
+                    batch = []
+            if batch:
+                self._load_batch(connection.driver_connection, batch)
+                self._report(start)
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+            self.elapsed = time.perf_counter() - start
+        return self
+
+    def _report(self, start: float):
+        self.elapsed = time.perf_counter() - start
+        if self.progress:
+            self.progress(self)
+
+    def _load_batch(self, conn, batch: list):
+        order_rows, item_rows = self._rows(batch)
+        with conn.cursor() as cur:
+            order_ids = _reserve_ids(cur, "order", len(order_rows))
+            item_ids = _reserve_ids(cur, "item", len(item_rows))
+            with cur.copy(f'COPY "order" ({", ".join(ORDER_COLUMNS)}) FROM STDIN') as copy:
+                for order_id, row in zip(order_ids, order_rows):
+                    copy.write_row((order_id, *row))
+            # a partitioned item table also needs the created_at of its order
+            columns = ITEM_COLUMNS + ("order_created_at",) if PARTITIONED else ITEM_COLUMNS
+            with cur.copy(f'COPY item ({", ".join(columns)}) FROM STDIN') as copy:
+                for item_id, (index, row) in zip(item_ids, item_rows):
+                    key = (order_rows[index][2],) if PARTITIONED else ()
+                    copy.write_row((item_id, order_ids[index], *row, *key))
+            # the change feed sees the imported orders like any other new order
+            cur.execute(OUTBOX_SQL, {"type": OrderEvent.CREATED, "ids": order_ids})
+        conn.commit()
+        self.orders += len(order_rows)
+        self.items += len(item_rows)
+
+    @staticmethod
+    def _rows(batch: list):
+        """Validates a batch and splits it into order rows and item rows"""
+        order_rows = []
+        item_rows = []
+        for index, data in enumerate(batch):
+            try:
+                status = OrderStatus[str(data.get("status") or "CREATED").upper()].name
+                items = [
+                    (
+                        str(item["product_id"]),
+                        item["product_description"],
+                        int(item["quantity"]),
+                        float(item["price"]),
+                    )
+                    for item in data.get("items") or []
+                ]
+                order_rows.append(
+                    (
+                        str(data["customer_id"]),
+                        data["shipping_address"],
+                        data.get("created_at") or date.today(),
+                        status,
+                        sum(quantity * price for _, _, quantity, price in items),
+                        len(items),
+                    )
+                )
+                item_rows.extend((index, item) for item in items)
+            except (KeyError, ValueError, TypeError) as error:
+                raise DataValidationError(f"Invalid order {data!r}: {error!r}") from error
+        return order_rows, item_rows
+
+
+def _reserve_ids(cur, table: str, count: int) -> list:
+    """Draws a block of ids from the serial sequence of a table"""
+    if not count:
+        return []
+    cur.execute(
+        "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+        (f'"{table}"', count),
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+######################################################################
+# Parallel exporter
+######################################################################
+class BulkExporter:
+    """Streams the order and item tables and their archives to files in parallel by id range
+
+    CSV files are written straight from COPY TO STDOUT and NDJSON files are
+    built by PostgreSQL with row_to_json and read through a server side
+    cursor, so no ORM objects are ever created. Every worker reads through
+    the snapshot exported by one coordinating transaction, so the files are
+    consistent with each other even while orders change.
+    """
+
+    TABLES = ("order", "item", "order_archive", "item_archive")
+    FORMATS = ("csv", "ndjson")
+
+    def __init__(self, directory: str, fmt: str = "csv", workers: int = 4, compress: bool = True):
+        if fmt not in self.FORMATS:
+            raise DataValidationError(f"Unsupported export format: {fmt}")
+        self.directory = directory
+        self.fmt = fmt
+        self.workers = workers
+        self.compress = compress
+
+    def export(self) -> list:
+        """Exports every table and returns a list of (path, rows) tuples"""
+        os.makedirs(self.directory, exist_ok=True)
+        # worker threads have no application context so bind the engine here
+        engine = db.engine
+        # the snapshot stays importable while the transaction that exported it is open
+        with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+            snapshot = conn.exec_driver_sql("SELECT pg_export_snapshot()").scalar()
+            tasks = [
+                (engine, snapshot, table, part, low, high)
+                for table in self.TABLES
+                for part, (low, high) in enumerate(self._id_ranges(conn, table), start=1)
+            ]
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                return list(executor.map(lambda task: self._export_range(*task), tasks))
+
+    def _id_ranges(self, conn, table: str) -> list:
+        """Splits the id space of a table into one range per worker"""
+        low, high = conn.exec_driver_sql(f'SELECT min(id), max(id) FROM "{table}"').one()
+        if low is None:
+            return [(0, 0)]
+        step = (high - low) // self.workers + 1
+        return [(start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+
+    def _path(self, table: str, part: int) -> str:
+        name = f"{table}-{part:04d}.{self.fmt}" + (".gz" if self.compress else "")
+        return os.path.join(self.directory, name)
+
+    # pylint: disable=too-many-arguments
+    def _export_range(self, engine, snapshot: str, table: str, part: int, low: int, high: int):
+        path = self._path(table, part)
+        query = (
+            f'SELECT {_export_columns(table)} FROM "{table}" '
+            f"WHERE id BETWEEN {int(low)} AND {int(high)} ORDER BY id"
+        )
+        opener = gzip.open if self.compress else open
+        connection = engine.raw_connection()
+        try:
+            with connection.cursor() as cur:
+                cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                # SET takes no bind parameters so quote the snapshot id here
+                cur.execute(sql.SQL("SET TRANSACTION SNAPSHOT {}").format(sql.Literal(snapshot)))
+            with opener(path, "wb") as out:
+                if self.fmt == "csv":
+                    rows = _copy_csv(connection.driver_connection, query, out)
+                else:
+                    rows = _write_ndjson(connection.driver_connection, query, out)
+            connection.commit()
+        finally:
+            connection.close()
+        return path, rows
+
+
+def _export_columns(table: str) -> str:
+    """Lists the stored columns of a table, leaving out generated ones like search_vector"""
+    return ", ".join(f'"{column.name}"' for column in db.metadata.tables[table].columns if column.computed is None)
+
+
+def _copy_csv(conn, query: str, out) -> int:
+    """Streams a query to a file as CSV with COPY TO STDOUT"""
+    with conn.cursor() as cur:
+        with cur.copy(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)") as copy:
+            for data in copy:
+                out.write(data)
+        return cur.rowcount
+
+
+def _write_ndjson(conn, query: str, out, batch_size: int = 5000) -> int:
+    """Streams a query to a file as NDJSON through a server side cursor"""
+    rows = 0
+    with conn.cursor(name="bulk_export") as cur:
+        cur.itersize = batch_size
+        cur.execute(f"SELECT row_to_json(t)::text FROM ({query}) t")
+        for (line,) in cur:
+            out.write(line.encode("utf-8") + b"\n")
+            rows += 1
+    return rows
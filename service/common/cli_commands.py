@@ -16,8 +16,16 @@
 """
 Flask CLI Command Extensions
 """
+import json
+import time
+from datetime import timedelta
+import click
 from flask import current_app as app  # Import Flask application
-from service.models import db
+from service.models import db, DataValidationError, IdempotencyKey, OrderArchive, OrderEvent, StatsRollup
+from service.common.load_generator import LoadGenerator, parse_mix
+from service.common.bulk_data import BulkExporter, BulkLoader, READERS, generate_orders
+from service.common import analytics, migrations, partitions
+from service.common.readiness import retry_database
 
 
 ######################################################################
@@ -31,6 +39,297 @@ def db_create():
     Recreates a local database. You probably should not use this on
     production. ;-)
     """
-    db.drop_all()
-    db.create_all()
+    migrations.drop(db.engine)
+    migrations.upgrade(db.engine)
     db.session.commit()
+
+
+######################################################################
+# Command to apply the pending schema migrations
+# Usage:
+#   flask db-upgrade
+#   flask db-upgrade --to 3
+######################################################################
+@app.cli.command("db-upgrade")
+@click.option("--to", "target", type=click.IntRange(min=1), default=None, help="Version to stop at (default: latest)")
+def db_upgrade(target):
+    """
+    Applies the pending schema migrations, run it before a release starts
+    """
+    # the init container may start before PostgreSQL accepts connections
+    applied = retry_database(app, migrations.upgrade, db.engine, target or migrations.LATEST_VERSION)
+    for migration in applied:
+        click.echo(f"  {migration.version:04d} {migration.description}")
+    with db.engine.connect() as conn:
+        version = migrations.current_version(conn)
+    click.echo(f"Applied {len(applied)} migrations, the schema is at version {version}")
+
+
+######################################################################
+# Command to generate load against a running service
+# Usage:
+#   flask load-test --url http://localhost:8000 --requests 5000 --concurrency 20
+######################################################################
+@app.cli.command("load-test")
+@click.option("--url", default="http://localhost:8000", show_default=True, help="Base URL of the running service")
+@click.option(
+    "--requests", "total", default=1000, show_default=True, type=click.IntRange(min=1), help="Number of requests to send"
+)
+@click.option(
+    "--concurrency", default=10, show_default=True, type=click.IntRange(min=1), help="Number of worker threads"
+)
+@click.option(
+    "--mix",
+    default="create=20,list=10,get=50,update=10,status=10",
+    show_default=True,
+    help="Weighted mix of create, list, get, update and status operations",
+)
+@click.option("--timeout", default=10.0, show_default=True, help="Per request timeout in seconds")
+def load_test(url, total, concurrency, mix, timeout):
+    """
+    Drives a mix of Order API traffic against a running instance and
+    reports throughput and p50/p95/p99 latency
+    """
+    try:
+        weights = parse_mix(mix)
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint="--mix") from error
+
+    click.echo(f"Sending {total} requests to {url} with {concurrency} threads...")
+    report = LoadGenerator(url, weights, timeout).run(total, concurrency)
+    click.echo(report.format())
+
+
+def _print_progress(loader):
+    click.echo(
+        f"  {loader.orders} orders, {loader.items} items "
+        f"({loader.rows_per_second:,.0f} rows/s)"
+    )
+
+
+def _load(orders, batch_size):
+    """Loads orders with COPY and prints a summary"""
+    try:
+        loader = BulkLoader(batch_size, progress=_print_progress).load(orders)
+    except DataValidationError as error:
+        raise click.ClickException(str(error)) from error
+    click.echo(
+        f"Loaded {loader.orders} orders and {loader.items} items in "
+        f"{loader.elapsed:.2f}s ({loader.rows_per_second:,.0f} rows/s)"
+    )
+
+
+######################################################################
+# Command to seed the database with generated orders
+# Usage:
+#   flask db-seed --orders 1000000 --items 5
+######################################################################
+@app.cli.command("db-seed")
+@click.option("--orders", "count", default=1000, show_default=True, type=click.IntRange(min=1), help="Number of orders")
+@click.option("--items", default=3, show_default=True, type=click.IntRange(min=0), help="Maximum items per order")
+@click.option("--days", default=365, show_default=True, type=click.IntRange(min=0), help="Spread of created_at dates")
+@click.option("--batch-size", default=5000, show_default=True, type=click.IntRange(min=1), help="Orders per COPY batch")
+def db_seed(count, items, days, batch_size):
+    """
+    Seeds the database with randomly generated orders and items using COPY
+    """
+    click.echo(f"Seeding {count} orders...")
+    _load(generate_orders(count, items, days), batch_size)
+
+
+######################################################################
+# Command to import orders from a CSV or NDJSON file
+# Usage:
+#   flask db-import orders.ndjson
+######################################################################
+@app.cli.command("db-import")
+@click.argument("source", type=click.File("r", encoding="utf-8"))
+@click.option(
+    "--format", "fmt", type=click.Choice(sorted(READERS)), default=None, help="File format (default: from extension)"
+)
+@click.option("--batch-size", default=5000, show_default=True, type=click.IntRange(min=1), help="Orders per COPY batch")
+def db_import(source, fmt, batch_size):
+    """
+    Imports orders and items from a CSV or NDJSON file using COPY
+    """
+    fmt = fmt or source.name.rsplit(".", 1)[-1].lower()
+    if fmt not in READERS:
+        raise click.BadParameter(f"Cannot tell the format of {source.name}", param_hint="--format")
+    click.echo(f"Importing {fmt} orders from {source.name}...")
+    _load(READERS[fmt](source), batch_size)
+
+
+######################################################################
+# Command to export the order and item tables and their archives to files
+# Usage:
+#   flask db-export ./export --format ndjson --workers 8
+######################################################################
+@app.cli.command("db-export")
+@click.argument("directory", type=click.Path(file_okay=False))
+@click.option("--format", "fmt", type=click.Choice(BulkExporter.FORMATS), default="csv", show_default=True)
+@click.option("--workers", default=4, show_default=True, type=click.IntRange(min=1), help="Parallel id ranges per table")
+@click.option("--gzip/--no-gzip", "compress", default=True, show_default=True, help="Compress the output files")
+def db_export(directory, fmt, workers, compress):
+    """
+    Exports the order and item tables and their archives to CSV or NDJSON files
+    """
+    start = time.perf_counter()
+    results = BulkExporter(directory, fmt, workers, compress).export()
+    for path, rows in results:
+        click.echo(f"  {path}: {rows} rows")
+    total = sum(rows for _, rows in results)
+    click.echo(f"Exported {total} rows to {len(results)} files in {time.perf_counter() - start:.2f}s")
+
+
+######################################################################
+# Command to move old completed orders to the archive tables
+# Usage:
+#   flask db-archive --days 90
+#   flask db-archive --every 3600    (keeps running, once an hour)
+######################################################################
+@app.cli.command("db-archive")
+@click.option("--days", type=click.IntRange(min=0), default=None, help="Archive orders older than this [ARCHIVE_AFTER_DAYS]")
+@click.option("--batch-size", type=click.IntRange(min=1), default=None, help="Orders per transaction [ARCHIVE_BATCH_SIZE]")
+@click.option("--every", type=click.IntRange(min=1), default=None, help="Run again every this many seconds until stopped")
+def db_archive(days, batch_size, every):
+    """
+    Moves completed orders older than a number of days to the archive tables
+    """
+    days = app.config["ARCHIVE_AFTER_DAYS"] if days is None else days
+    batch_size = batch_size or app.config["ARCHIVE_BATCH_SIZE"]
+    try:
+        while True:
+            try:
+                archived = OrderArchive.archive_completed(days, batch_size)
+                click.echo(f"Archived {archived} completed orders older than {days} days")
+            except DataValidationError as error:
+                if not every:
+                    raise click.ClickException(str(error)) from error
+                click.echo(f"Archiving failed, will retry: {error}", err=True)
+            if not every:
+                return
+            time.sleep(every)
+    except KeyboardInterrupt:
+        click.echo("Archiver stopped")
+
+
+######################################################################
+# Command to forget old idempotency keys
+# Usage:
+#   flask db-purge-keys --hours 24
+######################################################################
+@app.cli.command("db-purge-keys")
+@click.option(
+    "--hours", type=click.IntRange(min=0), default=None, help="Delete keys older than this [IDEMPOTENCY_KEY_TTL_HOURS]"
+)
+def db_purge_keys(hours):
+    """
+    Deletes the idempotency keys of order creation requests older than the ttl
+    """
+    hours = app.config["IDEMPOTENCY_KEY_TTL_HOURS"] if hours is None else hours
+    try:
+        purged = IdempotencyKey.purge(timedelta(hours=hours))
+    except DataValidationError as error:
+        raise click.ClickException(str(error)) from error
+    click.echo(f"Purged {purged} idempotency keys older than {hours} hours")
+
+
+######################################################################
+# Command to delete old events of the change feed
+# Usage:
+#   flask db-purge-events --days 7
+######################################################################
+@app.cli.command("db-purge-events")
+@click.option("--days", type=click.IntRange(min=0), default=None, help="Delete events older than this [OUTBOX_RETAIN_DAYS]")
+def db_purge_events(days):
+    """
+    Deletes the order events older than a number of days from the outbox
+    """
+    days = app.config["OUTBOX_RETAIN_DAYS"] if days is None else days
+    try:
+        purged = OrderEvent.purge(days)
+    except DataValidationError as error:
+        raise click.ClickException(str(error)) from error
+    click.echo(f"Purged {purged} order events older than {days} days")
+
+
+######################################################################
+# Command to create future partitions and detach old ones
+# Usage:
+#   flask db-partitions --ahead 3 --retain 24
+######################################################################
+@app.cli.command("db-partitions")
+@click.option("--ahead", type=click.IntRange(min=0), default=None, help="Months to create ahead [PARTITION_MONTHS_AHEAD]")
+@click.option(
+    "--retain", type=click.IntRange(min=0), default=None,
+    help="Past months to keep attached, 0 keeps all [PARTITION_RETAIN_MONTHS]",
+)
+def db_partitions(ahead, retain):
+    """
+    Creates the monthly partitions of the coming months and detaches the old ones
+    """
+    ahead = app.config["PARTITION_MONTHS_AHEAD"] if ahead is None else ahead
+    retain = app.config["PARTITION_RETAIN_MONTHS"] if retain is None else retain
+    with db.engine.begin() as conn:
+        if not partitions.is_partitioned(conn, "order"):
+            raise click.ClickException("The order table is not partitioned, see PARTITION_ORDERS")
+        result = partitions.maintain(conn, ahead, retain)
+    click.echo(f"Created partitions: {', '.join(result['created']) or 'none'}")
+    click.echo(f"Detached partitions: {', '.join(result['detached']) or 'none'}")
+
+
+######################################################################
+# Command to refresh the daily reporting rollups
+# Usage:
+#   flask db-rollups
+#   flask db-rollups --every 300    (keeps running, every 5 minutes)
+######################################################################
+@app.cli.command("db-rollups")
+@click.option("--every", type=click.IntRange(min=1), default=None, help="Run again every this many seconds until stopped")
+@click.option("--blocking", is_flag=True, help="Lock out readers instead of refreshing concurrently")
+def db_rollups(every, blocking):
+    """
+    Refreshes the materialized daily rollups read by /api/orders/stats
+    """
+    try:
+        while True:
+            try:
+                start = time.perf_counter()
+                refreshed_at = StatsRollup.refresh(concurrently=not blocking)
+                elapsed = time.perf_counter() - start
+                click.echo(f"Refreshed daily rollups at {refreshed_at:%Y-%m-%d %H:%M:%S} in {elapsed:.2f}s")
+            except DataValidationError as error:
+                if not every:
+                    raise click.ClickException(str(error)) from error
+                click.echo(f"Refresh failed, will retry: {error}", err=True)
+            if not every:
+                return
+            time.sleep(every)
+    except KeyboardInterrupt:
+        click.echo("Rollup refresher stopped")
+
+
+######################################################################
+# Command to compute order analytics from column batches
+# Usage:
+#   flask analytics --from 2024-01-01 --to 2024-12-31 --bins 20
+######################################################################
+@app.cli.command("analytics")
+@click.option("--from", "created_from", type=click.DateTime(["%Y-%m-%d"]), default=None, help="First day of orders to include")
+@click.option("--to", "created_to", type=click.DateTime(["%Y-%m-%d"]), default=None, help="Last day of orders to include")
+@click.option("--bins", default=10, show_default=True, type=click.IntRange(min=1), help="Bins of the order value histogram")
+@click.option(
+    "--batch-size", default=100000, show_default=True, type=click.IntRange(min=1), help="Rows fetched per round trip"
+)
+@click.option("--json", "as_json", is_flag=True, help="Print the report as JSON")
+def analytics_report(created_from, created_to, bins, batch_size, as_json):  # pylint: disable=too-many-arguments
+    """
+    Computes revenue, quantiles and histograms over the live and archived order items
+    """
+    report = analytics.analyze(
+        batch_size,
+        created_from and created_from.date(),
+        created_to and created_to.date(),
+        bins,
+    )
+    click.echo(json.dumps(report) if as_json else analytics.format_report(report))
@@ -18,17 +18,57 @@ Module: error_handlers
 """
 from flask import jsonify
 from flask import current_app as app  # Import Flask application
+from sqlalchemy.exc import DataError, IntegrityError, InterfaceError, OperationalError, SQLAlchemyError
 from service.models import DataValidationError
+from service import api
 from . import status
 
 
+def _database_failure(error: DataValidationError):
+    """Returns the status, error and message of a DataValidationError that wraps a database error
+
+    The database error itself is only logged: it carries SQL, and most of
+    them are not the fault of the request. None is returned for the
+    errors in the data of the request.
+    """
+    cause = error.__cause__
+    if not isinstance(cause, SQLAlchemyError):
+        return None
+    app.logger.error("Database error: %s", cause)
+    if isinstance(cause, (DataError, IntegrityError)):
+        return status.HTTP_400_BAD_REQUEST, "Bad Request", "The database rejected the values of the request"
+    if isinstance(cause, (OperationalError, InterfaceError)):
+        return status.HTTP_503_SERVICE_UNAVAILABLE, "Service Unavailable", "The database is unavailable"
+    return status.HTTP_500_INTERNAL_SERVER_ERROR, "Internal Server Error", "The database could not complete the request"
+
+
 ######################################################################
 # Error Handlers
 ######################################################################
 @app.errorhandler(DataValidationError)
 def request_validation_error(error):
     """Handles Value Errors from bad data"""
-    return bad_request(error)
+    failure = _database_failure(error)
+    if failure is None:
+        return bad_request(error)
+    code, title, message = failure
+    return jsonify(status=code, error=title, message=message), code
+
+
+@api.errorhandler(DataValidationError)
+def api_validation_error(error):
+    """Handles Value Errors raised by the REST API resources
+
+    Flask-RESTX only hands exceptions to the Flask error handlers while
+    they propagate (in testing), so the resources need one of their own.
+    """
+    failure = _database_failure(error)
+    if failure is None:
+        message = str(error)
+        app.logger.warning(message)
+        failure = status.HTTP_400_BAD_REQUEST, "Bad Request", message
+    code, title, message = failure
+    return {"status": code, "error": title, "message": message}, code
 
 
 @app.errorhandler(status.HTTP_400_BAD_REQUEST)
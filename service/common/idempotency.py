@@ -0,0 +1,111 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Idempotency
+
+This module makes a resource method safe to retry when the client sends
+an Idempotency-Key header. The first request claims the key and its
+successful response is saved; a retry with the same key and body gets the
+saved response back without running the method again. A key whose
+request did not finish within IDEMPOTENCY_KEY_LEASE_SECONDS, because its
+worker was killed for example, is claimed again by the next retry.
+
+The method leaves its changes in the session and they are committed with
+the saved response. A request that outlived its lease while a retry took
+its key over finds its claim gone and rolls its changes back, so only one
+of them ever creates the Order.
+"""
+from datetime import timedelta
+from functools import wraps
+from flask import abort, request
+from flask import current_app as app
+from service.models import db, DataValidationError, IdempotencyKey
+from service.common import status
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def idempotent(method):
+    """Decorates a resource method that must run once per Idempotency-Key
+
+    The method must not commit: a successful response is committed with its
+    changes, a failed one rolls them back. Place it above marshal_with so
+    that the marshalled response is saved.
+    """
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return _commit(method(*args, **kwargs))
+        if not key or len(key) > 255:
+            abort(status.HTTP_400_BAD_REQUEST, f"{HEADER} must be 1 to 255 characters")
+
+        request_hash = IdempotencyKey.hash_request(request.get_json(silent=True))
+        ttl = timedelta(hours=app.config["IDEMPOTENCY_KEY_TTL_HOURS"])
+        lease = timedelta(seconds=app.config["IDEMPOTENCY_KEY_LEASE_SECONDS"])
+        claimed_at, earlier = IdempotencyKey.claim(key, request_hash, ttl, lease)
+        if earlier is not None:
+            return _replay(key, request_hash, earlier)
+
+        try:
+            result = method(*args, **kwargs)
+        except Exception:
+            IdempotencyKey.release(key, claimed_at)
+            raise
+        body, code = _body_and_code(result)
+        # only successes are remembered, a failed request can be fixed and retried
+        if not 200 <= code < 300:
+            IdempotencyKey.release(key, claimed_at)
+        elif not IdempotencyKey.save(key, claimed_at, code, body):
+            abort(status.HTTP_409_CONFLICT, f"The request with {HEADER} {key} took too long and was retried")
+        return result
+
+    return wrapper
+
+
+def _replay(key: str, request_hash: str, earlier) -> tuple:
+    """Returns the saved response of the request that claimed a key first"""
+    if earlier.request_hash != request_hash:
+        abort(
+            status.HTTP_400_BAD_REQUEST,
+            f"{HEADER} {key} was already used with a different request",
+        )
+    if earlier.status_code is None:
+        abort(status.HTTP_409_CONFLICT, f"A request with {HEADER} {key} is in progress")
+    app.logger.info("Replaying the response of %s %s", HEADER, key)
+    return earlier.response, earlier.status_code, {REPLAYED_HEADER: "true"}
+
+
+def _body_and_code(result) -> tuple:
+    """Returns the body and the status code of the result of a resource method"""
+    return (result[0], result[1]) if isinstance(result, tuple) else (result, 200)
+
+
+def _commit(result):
+    """Commits the changes of a successful resource method, rolls back the others"""
+    _, code = _body_and_code(result)
+    try:
+        if 200 <= code < 300:
+            db.session.commit()
+        else:
+            db.session.rollback()
+    except Exception as e:
+        db.session.rollback()
+        raise DataValidationError(e) from e
+    return result
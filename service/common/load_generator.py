@@ -0,0 +1,272 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Load Generator
+
+This module drives a weighted mix of Order API calls against a running
+instance of the service using a pool of threads and collects latency
+statistics so that we can capacity plan without external tooling
+"""
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+OPERATIONS = ("create", "list", "get", "update", "status")
+
+# The order status life cycle that the status operation walks through
+NEXT_STATUS = {"CREATED": "PROCESSING", "PROCESSING": "COMPLETED"}
+
+
+def parse_mix(mix: str) -> dict:
+    """Parses a traffic mix like "create=20,get=80" into weights
+
+    :param mix: comma separated list of operation=weight pairs
+    :type mix: str
+
+    :return: a dictionary of operation names to integer weights
+    :rtype: dict
+
+    """
+    weights = {}
+    for pair in mix.split(","):
+        name, _, weight = pair.strip().partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}' in mix")
+        try:
+            weights[name] = int(weight)
+        except ValueError as error:
+            raise ValueError(f"Invalid weight '{weight}' for {name}") from error
+        if weights[name] < 0:
+            raise ValueError(f"Weight for {name} cannot be negative")
+    if sum(weights.values()) == 0:
+        raise ValueError("The mix must contain at least one positive weight")
+    return weights
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Returns the nearest-rank percentile of an already sorted list"""
+    if not samples:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(samples)))
+    return samples[rank - 1]
+
+
+######################################################################
+# Order bookkeeping shared by the worker threads
+######################################################################
+class OrderPool:
+    """Thread safe record of the orders created during a run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._orders = {}
+
+    def add(self, order_id: int, status: str):
+        """Remembers an order and its current status"""
+        with self._lock:
+            self._orders[order_id] = status
+
+    def pick(self, *statuses):
+        """Returns a random known order id, optionally limited to some statuses"""
+        with self._lock:
+            ids = [
+                order_id
+                for order_id, status in self._orders.items()
+                if not statuses or status in statuses
+            ]
+        return random.choice(ids) if ids else None
+
+    def advance(self, order_id: int) -> str:
+        """Returns the next status for an order and records it"""
+        with self._lock:
+            new_status = NEXT_STATUS[self._orders[order_id]]
+            self._orders[order_id] = new_status
+        return new_status
+
+
+######################################################################
+# Latency and error collection
+######################################################################
+class LoadReport:
+    """Collects the outcome of every request made during a run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {name: [] for name in OPERATIONS}
+        self.errors = {name: 0 for name in OPERATIONS}
+        self.elapsed = 0.0
+
+    def record(self, operation: str, latency: float, ok: bool):
+        """Records the latency of a single request"""
+        with self._lock:
+            self.latencies[operation].append(latency)
+            if not ok:
+                self.errors[operation] += 1
+
+    @property
+    def total(self) -> int:
+        """Total number of requests that were made"""
+        return sum(len(samples) for samples in self.latencies.values())
+
+    @property
+    def throughput(self) -> float:
+        """Requests per second over the whole run"""
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> list:
+        """Returns one row of statistics per operation that was exercised"""
+        rows = []
+        everything = []
+        for name in OPERATIONS:
+            samples = sorted(self.latencies[name])
+            if not samples:
+                continue
+            everything.extend(samples)
+            rows.append(self._row(name, samples, self.errors[name]))
+        rows.append(self._row("total", sorted(everything), sum(self.errors.values())))
+        return rows
+
+    @staticmethod
+    def _row(name: str, samples: list, errors: int) -> dict:
+        return {
+            "operation": name,
+            "count": len(samples),
+            "errors": errors,
+            "p50": percentile(samples, 50) * 1000,
+            "p95": percentile(samples, 95) * 1000,
+            "p99": percentile(samples, 99) * 1000,
+        }
+
+    def format(self) -> str:
+        """Formats the report as a plain text table"""
+        lines = [
+            f"{'operation':<10}{'count':>8}{'errors':>8}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        ]
+        for row in self.summary():
+            lines.append(
+                f"{row['operation']:<10}{row['count']:>8}{row['errors']:>8}"
+                f"{row['p50']:>10.1f}{row['p95']:>10.1f}{row['p99']:>10.1f}"
+            )
+        lines.append(
+            f"{self.total} requests in {self.elapsed:.2f}s "
+            f"({self.throughput:.1f} req/s)"
+        )
+        return "\n".join(lines)
+
+
+######################################################################
+# Load Generator
+######################################################################
+class LoadGenerator:
+    """Sends a weighted mix of Order API requests from a thread pool"""
+
+    def __init__(self, base_url: str, weights: dict, timeout: float = 10.0):
+        self.base_url = base_url.rstrip("/") + "/api/orders"
+        self.weights = weights
+        self.timeout = timeout
+        self.orders = OrderPool()
+        self.report = LoadReport()
+
+    def send(self, method: str, path: str = "", body: dict = None):
+        """Sends a single request and returns the status code and parsed body"""
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = Request(self.base_url + path, data=data, method=method)
+        req.add_header("Content-Type", "application/json")
+        try:
+            with urlopen(req, timeout=self.timeout) as resp:
+                payload = resp.read()
+                return resp.status, json.loads(payload) if payload else None
+        except HTTPError as error:
+            return error.code, None
+        except (OSError, HTTPException):
+            # URLError, refused and reset connections, or a worker that died mid request
+            return 0, None
+
+    def create(self):
+        """POST a new order with a couple of items"""
+        body = {
+            "customer_id": random.randint(1, 10000),
+            "shipping_address": f"{random.randint(1, 999)} Load Test Ave",
+            "status": "CREATED",
+            "items": [
+                {
+                    "order_id": 0,
+                    "product_id": random.randint(1, 500),
+                    "product_description": "Load test product",
+                    "quantity": random.randint(1, 5),
+                    "price": round(random.uniform(1, 100), 2),
+                }
+                for _ in range(random.randint(1, 3))
+            ],
+        }
+        code, data = self.send("POST", body=body)
+        if code == 201 and data:
+            self.orders.add(data["id"], "CREATED")
+        return code == 201
+
+    def list(self):
+        """GET the list of orders"""
+        code, _ = self.send("GET")
+        return code == 200
+
+    def get(self):
+        """GET a single known order"""
+        order_id = self.orders.pick()
+        if order_id is None:
+            return self.create()
+        code, _ = self.send("GET", f"/{order_id}")
+        return code == 200
+
+    def update(self):
+        """PUT a new shipping address on an order that can still be edited"""
+        order_id = self.orders.pick("CREATED")
+        if order_id is None:
+            return self.create()
+        body = {"shipping_address": f"{random.randint(1, 999)} Updated St"}
+        code, _ = self.send("PUT", f"/{order_id}", body)
+        return code == 200
+
+    def status(self):
+        """PUT the next status on an order that has not been completed"""
+        order_id = self.orders.pick(*NEXT_STATUS)
+        if order_id is None:
+            return self.create()
+        body = {"status": self.orders.advance(order_id)}
+        code, _ = self.send("PUT", f"/{order_id}/status", body)
+        return code == 200
+
+    def _one(self, operation: str):
+        start = time.perf_counter()
+        ok = getattr(self, operation)()
+        self.report.record(operation, time.perf_counter() - start, ok)
+
+    def run(self, total: int, concurrency: int) -> LoadReport:
+        """Runs the load test and returns the report"""
+        names = list(self.weights)
+        plan = random.choices(names, weights=[self.weights[n] for n in names], k=total)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(self._one, plan))
+        self.report.elapsed = time.perf_counter() - start
+        return self.report
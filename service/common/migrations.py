@@ -0,0 +1,401 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Migrations
+
+This module brings the database schema up to the version the code
+expects. Every migration has a number and runs once, in its own
+transaction, after which its number is written to the schema_version
+table. `flask db-upgrade` (or an init container running it) applies the
+pending migrations before a release starts, and the workers only check
+the version, so they no longer race each other creating tables.
+
+Every step only creates what is missing, so the same migrations upgrade
+databases that were created by db.create_all() before the schema had a
+version, whatever release created them.
+
+The DDL of every migration is written out here and never read from the
+models, so a migration creates the same schema whatever the models look
+like when it runs. Change the schema with a new migration.
+"""
+import logging
+from collections import namedtuple
+from datetime import date
+from sqlalchemy import func, inspect, select, text
+from service import config
+from service.common import partitions
+from service.models import db, PARTITIONED, SEARCH_CONFIG
+
+logger = logging.getLogger("flask.app")
+
+# Any number will do as long as it is the same for every process
+UPGRADE_LOCK_ID = 4902
+
+schema_version = db.Table(
+    "schema_version",
+    db.Column("version", db.Integer, primary_key=True),
+    db.Column("description", db.String(128), nullable=False),
+    db.Column(
+        "applied_at", db.DateTime(timezone=True), nullable=False, server_default=func.now()  # pylint: disable=not-callable
+    ),
+)
+
+Migration = namedtuple("Migration", "version description apply")
+
+
+class SchemaVersionError(Exception):
+    """Used when the database schema is older than the code"""
+
+
+######################################################################
+#  M I G R A T I O N S
+######################################################################
+ORDER_STATUS_SQL = """
+DO $$ BEGIN
+    CREATE TYPE orderstatus AS ENUM ('CREATED', 'PROCESSING', 'COMPLETED');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$
+"""
+
+ORDER_TABLE_SQL = """
+CREATE TABLE "order" (
+    id serial NOT NULL,
+    customer_id varchar(16) NOT NULL,
+    shipping_address varchar(128) NOT NULL,
+    created_at date NOT NULL,
+    status orderstatus NOT NULL DEFAULT 'CREATED',
+    PRIMARY KEY (id)
+)
+"""
+
+PARTITIONED_ORDER_TABLE_SQL = """
+CREATE TABLE "order" (
+    id serial NOT NULL,
+    customer_id varchar(16) NOT NULL,
+    shipping_address varchar(128) NOT NULL,
+    created_at date NOT NULL,
+    status orderstatus NOT NULL DEFAULT 'CREATED',
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at)
+"""
+
+ITEM_TABLE_SQL = """
+CREATE TABLE item (
+    id serial NOT NULL,
+    order_id integer NOT NULL REFERENCES "order" (id) ON DELETE CASCADE,
+    product_id varchar(16) NOT NULL,
+    product_description varchar(64) NOT NULL,
+    quantity integer NOT NULL,
+    price float NOT NULL,
+    PRIMARY KEY (id)
+)
+"""
+
+PARTITIONED_ITEM_TABLE_SQL = """
+CREATE TABLE item (
+    id serial NOT NULL,
+    order_id integer NOT NULL,
+    order_created_at date NOT NULL,
+    product_id varchar(16) NOT NULL,
+    product_description varchar(64) NOT NULL,
+    quantity integer NOT NULL,
+    price float NOT NULL,
+    PRIMARY KEY (id, order_created_at),
+    FOREIGN KEY (order_id, order_created_at) REFERENCES "order" (id, created_at) ON DELETE CASCADE
+) PARTITION BY RANGE (order_created_at)
+"""
+
+
+def _create_orders(conn):
+    """Creates the order and item tables with their partitions"""
+    conn.execute(text(ORDER_STATUS_SQL))
+    tables = {"order": ORDER_TABLE_SQL, "item": ITEM_TABLE_SQL}
+    if PARTITIONED:
+        tables = {"order": PARTITIONED_ORDER_TABLE_SQL, "item": PARTITIONED_ITEM_TABLE_SQL}
+    for name, ddl in tables.items():
+        if inspect(conn).has_table(name):
+            continue
+        conn.execute(text(ddl))
+        if PARTITIONED:
+            partitions.create_default_partition(conn, name)
+            partitions.create_partitions(conn, name, date.today(), config.PARTITION_MONTHS_AHEAD + 1)
+
+
+def _add_totals_and_search(conn):
+    """Adds the totals and search vectors to orders and items that lack them"""
+    conn.execute(
+        text(
+            'ALTER TABLE "order" '
+            "ADD COLUMN IF NOT EXISTS total_amount float NOT NULL DEFAULT 0, "
+            "ADD COLUMN IF NOT EXISTS item_count integer NOT NULL DEFAULT 0, "
+            "ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', shipping_address)) STORED"
+        )
+    )
+    conn.execute(
+        text(
+            "ALTER TABLE item ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', product_description)) STORED"
+        )
+    )
+    conn.execute(
+        text(
+            "ALTER TABLE IF EXISTS order_archive "
+            "ADD COLUMN IF NOT EXISTS total_amount float NOT NULL DEFAULT 0, "
+            "ADD COLUMN IF NOT EXISTS item_count integer NOT NULL DEFAULT 0"
+        )
+    )
+    # the totals of existing orders start at 0, only those with items change
+    conn.execute(
+        text(
+            'UPDATE "order" o SET total_amount = t.total_amount, item_count = t.item_count '
+            "FROM (SELECT order_id, sum(quantity * price) AS total_amount, count(*) AS item_count "
+            "FROM item GROUP BY order_id) t "
+            "WHERE o.id = t.order_id AND o.item_count <> t.item_count"
+        )
+    )
+
+
+TABLES_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS order_archive (
+        id integer NOT NULL,
+        customer_id varchar(16) NOT NULL,
+        shipping_address varchar(128) NOT NULL,
+        created_at date NOT NULL,
+        status orderstatus NOT NULL,
+        total_amount float NOT NULL DEFAULT '0',
+        item_count integer NOT NULL DEFAULT '0',
+        archived_at timestamp without time zone NOT NULL DEFAULT now(),
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_order_archive_created_at ON order_archive (created_at)",
+    """
+    CREATE TABLE IF NOT EXISTS item_archive (
+        id integer NOT NULL,
+        order_id integer NOT NULL REFERENCES order_archive (id) ON DELETE CASCADE,
+        product_id varchar(16) NOT NULL,
+        product_description varchar(64) NOT NULL,
+        quantity integer NOT NULL,
+        price float NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_item_archive_order_id ON item_archive (order_id)",
+    """
+    CREATE TABLE IF NOT EXISTS stats_rollup (
+        name varchar(64) NOT NULL,
+        refreshed_at timestamp with time zone NOT NULL,
+        PRIMARY KEY (name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS idempotency_key (
+        key varchar(255) NOT NULL,
+        request_hash varchar(64) NOT NULL,
+        status_code integer,
+        response jsonb,
+        created_at timestamp with time zone NOT NULL,
+        PRIMARY KEY (key)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_idempotency_key_created_at ON idempotency_key (created_at)",
+    """
+    CREATE TABLE IF NOT EXISTS order_event (
+        id bigserial NOT NULL,
+        xid bigint NOT NULL DEFAULT (pg_current_xact_id()::text::bigint),
+        order_id integer NOT NULL,
+        type varchar(16) NOT NULL,
+        payload jsonb NOT NULL,
+        created_at timestamp with time zone NOT NULL DEFAULT now(),
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_order_event_xid_id ON order_event (xid, id)",
+    "CREATE INDEX IF NOT EXISTS ix_order_event_created_at ON order_event (created_at)",
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS order_daily_stats AS
+    SELECT created_at AS day, status, count(*) AS orders, sum(item_count) AS items, sum(total_amount) AS revenue
+    FROM "order" GROUP BY created_at, status
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS order_daily_stats_key ON order_daily_stats (day, status)",
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS product_daily_stats AS
+    SELECT o.created_at AS day, i.product_id, count(DISTINCT i.order_id) AS orders,
+           count(*) AS items, sum(i.quantity * i.price) AS revenue
+    FROM item i JOIN "order" o ON o.id = i.order_id GROUP BY o.created_at, i.product_id
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS product_daily_stats_key ON product_daily_stats (day, product_id)",
+)
+
+INDEXES_SQL = (
+    "CREATE INDEX IF NOT EXISTS ix_item_order_id ON item (order_id)",
+    "CREATE INDEX IF NOT EXISTS ix_item_search_vector ON item USING gin (search_vector)",
+    'CREATE INDEX IF NOT EXISTS ix_order_created_at_id ON "order" (created_at, id)',
+    'CREATE INDEX IF NOT EXISTS ix_order_total_amount_id ON "order" (total_amount, id)',
+    'CREATE INDEX IF NOT EXISTS ix_order_item_count_id ON "order" (item_count, id)',
+    'CREATE INDEX IF NOT EXISTS ix_order_search_vector ON "order" USING gin (search_vector)',
+)
+
+
+def _create_tables(conn):
+    """Creates the archive, rollup, idempotency and outbox tables and the rollup views"""
+    for ddl in TABLES_SQL:
+        conn.execute(text(ddl))
+
+
+def _create_indexes(conn):
+    """Creates the sort, search and lookup indexes of the order and item tables"""
+    for ddl in INDEXES_SQL:
+        conn.execute(text(ddl))
+
+
+def _add_idempotency_lease(conn):
+    """Adds the lease of the requests that claimed an idempotency key"""
+    conn.execute(text("ALTER TABLE idempotency_key ADD COLUMN IF NOT EXISTS locked_until timestamp with time zone"))
+    # claims made before the lease existed can be taken over a minute after they were made
+    conn.execute(
+        text(
+            "UPDATE idempotency_key SET locked_until = created_at + interval '1 minute' "
+            "WHERE status_code IS NULL AND locked_until IS NULL"
+        )
+    )
+
+
+ROLLUP_VIEWS_SQL = (
+    "DROP MATERIALIZED VIEW IF EXISTS order_daily_stats, product_daily_stats",
+    """
+    CREATE MATERIALIZED VIEW order_daily_stats AS
+    SELECT created_at AS day, status, count(*) AS orders, sum(item_count) AS items, sum(total_amount) AS revenue
+    FROM (
+        SELECT created_at, status, item_count, total_amount FROM "order"
+        UNION ALL
+        SELECT created_at, status, item_count, total_amount FROM order_archive
+    ) o
+    GROUP BY created_at, status
+    """,
+    "CREATE UNIQUE INDEX order_daily_stats_key ON order_daily_stats (day, status)",
+    """
+    CREATE MATERIALIZED VIEW product_daily_stats AS
+    SELECT day, product_id, count(DISTINCT order_id) AS orders, count(*) AS items, sum(quantity * price) AS revenue
+    FROM (
+        SELECT o.created_at AS day, i.product_id, i.order_id, i.quantity, i.price
+        FROM item i JOIN "order" o ON o.id = i.order_id
+        UNION ALL
+        SELECT o.created_at, i.product_id, i.order_id, i.quantity, i.price
+        FROM item_archive i JOIN order_archive o ON o.id = i.order_id
+    ) i
+    GROUP BY day, product_id
+    """,
+    "CREATE UNIQUE INDEX product_daily_stats_key ON product_daily_stats (day, product_id)",
+    # the views were filled when they were created
+    "UPDATE stats_rollup SET refreshed_at = now()",
+)
+
+
+def _archive_rollups(conn):
+    """Rebuilds the rollup views over the live and the archived orders"""
+    for ddl in ROLLUP_VIEWS_SQL:
+        conn.execute(text(ddl))
+
+
+MIGRATIONS = (
+    Migration(1, "Create the order and item tables", _create_orders),
+    Migration(2, "Add order totals and search vectors", _add_totals_and_search),
+    Migration(3, "Create the archive, rollup, idempotency and outbox tables", _create_tables),
+    Migration(4, "Create the sort, search and lookup indexes", _create_indexes),
+    Migration(5, "Add the lease of idempotency keys", _add_idempotency_lease),
+    Migration(6, "Count the archived orders in the rollup views", _archive_rollups),
+)
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+######################################################################
+#  U P G R A D E S
+######################################################################
+def current_version(conn) -> int:
+    """Returns the version of the schema, 0 when it has none"""
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.scalar(select(func.max(schema_version.c.version))) or 0
+
+
+def upgrade(engine, target: int = LATEST_VERSION) -> list:
+    """
+    Applies the pending migrations up to a version
+
+    Every migration runs in its own transaction while holding an advisory
+    lock, so processes that upgrade at the same time wait for each other
+    and each migration is applied only once.
+
+    :param engine: the engine of the database to upgrade
+    :param target: the version to stop at
+    :return: the migrations that were applied
+    """
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version > target:
+            break
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": UPGRADE_LOCK_ID})
+            schema_version.create(conn, checkfirst=True)
+            if current_version(conn) >= migration.version:
+                continue
+            logger.info("Migrating the schema to version %d: %s", migration.version, migration.description)
+            migration.apply(conn)
+            conn.execute(
+                schema_version.insert().values(version=migration.version, description=migration.description)
+            )
+        applied.append(migration)
+    return applied
+
+
+def drop(engine):
+    """
+    Drops every table and view the migrations created
+
+    The rollup views are not models, so they are dropped before the
+    tables they read.
+
+    :param engine: the engine of the database to empty
+    """
+    with engine.begin() as conn:
+        conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS order_daily_stats, product_daily_stats"))
+        db.metadata.drop_all(conn)
+
+
+def verify(engine) -> int:
+    """
+    Checks that the schema is at the version of the code
+
+    A newer schema is accepted because the old release keeps running
+    while a new one rolls out, and migrations only ever add to the schema.
+
+    :param engine: the engine of the database to check
+    :return: the version of the schema
+    """
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version < LATEST_VERSION:
+        raise SchemaVersionError(
+            f"Database schema is at version {version} but version {LATEST_VERSION} is required, "
+            "run flask db-upgrade"
+        )
+    if version > LATEST_VERSION:
+        logger.warning("Database schema version %d is newer than %d", version, LATEST_VERSION)
+    return version
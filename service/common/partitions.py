@@ -0,0 +1,238 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Partitions
+
+This module manages the monthly range partitions of the order and item
+tables when the service runs with PARTITION_ORDERS enabled. Partitions
+are named <table>_pYYYYMM and every partitioned table also gets a DEFAULT
+partition so that rows outside of the managed months are never rejected.
+"""
+import logging
+from datetime import date
+from sqlalchemy import text
+
+logger = logging.getLogger("flask.app")
+
+# Partitioned tables, parents before children. The order table is
+# partitioned by created_at and item by order_created_at
+PARTITIONED_TABLES = ("order", "item")
+
+
+def month_start(day: date, months: int = 0) -> date:
+    """Returns the first day of the month that is a number of months away"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """Returns the name of the partition of a table holding a month"""
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(conn, table: str) -> bool:
+    """Tells if a table is a partitioned table"""
+    return bool(
+        conn.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table p "
+                "JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+            ),
+            {"table": table},
+        ).scalar()
+    )
+
+
+def partitions(conn, table: str) -> list:
+    """Returns the names of the partitions attached to a table"""
+    return list(
+        conn.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = :table AND pg_table_is_visible(p.oid) "
+                "ORDER BY c.relname"
+            ),
+            {"table": table},
+        ).scalars()
+    )
+
+
+def create_default_partition(conn, table: str):
+    """Creates the DEFAULT partition of a table"""
+    conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{table}_default" PARTITION OF "{table}" DEFAULT'))
+
+
+def partition_key(conn, table: str) -> str:
+    """Returns the column a table is range partitioned by"""
+    definition = conn.execute(
+        text("SELECT pg_get_partkeydef(CAST(:table AS regclass))"), {"table": f'"{table}"'}
+    ).scalar()
+    # the definition reads like RANGE (created_at)
+    return definition[definition.index("(") + 1:definition.rindex(")")]
+
+
+def stored_columns(conn, table: str) -> str:
+    """Lists the columns of a table that can be inserted, leaving out generated ones"""
+    names = conn.execute(
+        text(
+            "SELECT attname FROM pg_attribute "
+            "WHERE attrelid = CAST(:table AS regclass) AND attnum > 0 "
+            "AND NOT attisdropped AND attgenerated = '' ORDER BY attnum"
+        ),
+        {"table": f'"{table}"'},
+    ).scalars()
+    return ", ".join(f'"{name}"' for name in names)
+
+
+def _month_rows(conn, table: str, source: str, start: date) -> tuple:
+    """Returns the condition and parameters selecting the rows of a month"""
+    key = f'"{source}"."{partition_key(conn, table)}"'
+    return f"{key} >= :start AND {key} < :end", {"start": start, "end": month_start(start, 1)}
+
+
+def _stash(conn, table: str, source: str, start: date) -> str:
+    """Moves the rows of a month out of a table or one of its partitions into a temporary table"""
+    stash = f"{table}_stash"
+    columns = stored_columns(conn, table)
+    condition, params = _month_rows(conn, table, source, start)
+    conn.execute(text(f'CREATE TEMPORARY TABLE "{stash}" AS SELECT {columns} FROM "{table}" WITH NO DATA'))
+    moved = conn.execute(
+        text(
+            f'WITH moved AS (DELETE FROM "{source}" WHERE {condition} RETURNING {columns}) '
+            f'INSERT INTO "{stash}" SELECT * FROM moved'
+        ),
+        params,
+    ).rowcount
+    logger.info("Moving %d rows of %s for %s", moved, source, f"{start:%Y-%m}")
+    return stash
+
+
+def _restore(conn, table: str, stash: str):
+    """Inserts the rows of a temporary table back into a table and drops it"""
+    columns = stored_columns(conn, table)
+    conn.execute(text(f'INSERT INTO "{table}" ({columns}) SELECT {columns} FROM "{stash}"'))
+    conn.execute(text(f'DROP TABLE "{stash}"'))
+
+
+def _default_holds(conn, table: str, start: date) -> bool:
+    """Tells if the DEFAULT partition of a table holds rows of a month"""
+    default = f"{table}_default"
+    if default not in partitions(conn, table):
+        return False
+    condition, params = _month_rows(conn, table, default, start)
+    return bool(conn.execute(text(f'SELECT EXISTS (SELECT 1 FROM "{default}" WHERE {condition})'), params).scalar())
+
+
+def create_partitions(conn, table: str, first: date, months: int, children=()) -> list:
+    """Creates the monthly partitions of a table starting at a month
+
+    PostgreSQL refuses to create a partition for rows that already sit in
+    the DEFAULT partition, so those rows are moved out and back in around
+    it, together with the rows of the children that reference them, since
+    deleting a parent row cascades. Run it in a transaction so that nothing
+    is lost when it fails.
+
+    :param conn: a SQLAlchemy connection
+    :param table: the name of the partitioned table
+    :param first: any day of the first month to create
+    :param months: the number of consecutive months to create
+    :param children: the tables referencing this one, children before grandchildren,
+        partitioned by the same months
+
+    :return: the names of the partitions that were created
+    :rtype: list
+    """
+    existing = set(partitions(conn, table))
+    created = []
+    for offset in range(months):
+        start = month_start(first, offset)
+        name = partition_name(table, start)
+        if name in existing:
+            continue
+        stashes = []
+        if _default_holds(conn, table, start):
+            # grandchildren first so that the deletes have nothing left to cascade to
+            stashes = [(child, _stash(conn, child, child, start)) for child in reversed(children)]
+            stashes.append((table, _stash(conn, table, f"{table}_default", start)))
+        conn.execute(
+            text(
+                f'CREATE TABLE "{name}" PARTITION OF "{table}" '
+                f"FOR VALUES FROM ('{start}') TO ('{month_start(start, 1)}')"
+            )
+        )
+        for stashed_table, stash in reversed(stashes):
+            _restore(conn, stashed_table, stash)
+        logger.info("Created partition %s", name)
+        created.append(name)
+    return created
+
+
+def detach_partitions(conn, table: str, before: date) -> list:
+    """Detaches the monthly partitions of a table that end before a month
+
+    The detached tables are kept as ordinary tables for cold storage. Any
+    foreign keys they carry are dropped so that the partitions they point
+    to can be detached as well.
+
+    :return: the names of the partitions that were detached
+    :rtype: list
+    """
+    cutoff = partition_name(table, month_start(before))
+    prefix = f"{table}_p"
+    detached = []
+    for name in partitions(conn, table):
+        if not name.startswith(prefix) or name >= cutoff:
+            continue
+        conn.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+        foreign_keys = conn.execute(
+            text(
+                "SELECT conname FROM pg_constraint "
+                "WHERE conrelid = CAST(:name AS regclass) AND contype = 'f'"
+            ),
+            {"name": f'"{name}"'},
+        ).scalars()
+        for constraint in list(foreign_keys):
+            conn.execute(text(f'ALTER TABLE "{name}" DROP CONSTRAINT "{constraint}"'))
+        logger.info("Detached partition %s", name)
+        detached.append(name)
+    return detached
+
+
+def maintain(conn, ahead: int, retain: int, today: date = None, tables=PARTITIONED_TABLES) -> dict:
+    """Creates the partitions for the coming months and detaches old ones
+
+    :param conn: a SQLAlchemy connection
+    :param ahead: the number of months after the current one to create
+    :param retain: the number of past months to keep attached, 0 keeps all
+    :param today: the current date, for testing
+    :param tables: the partitioned tables, parents before children
+
+    :return: a dictionary with the created and detached partition names
+    :rtype: dict
+    """
+    today = today or date.today()
+    result = {"created": [], "detached": []}
+    for index, table in enumerate(tables):
+        result["created"] += create_partitions(conn, table, today, ahead + 1, tables[index + 1:])
+    if retain:
+        # children first so that nothing references a detached parent
+        for table in reversed(tables):
+            result["detached"] += detach_partitions(conn, table, month_start(today, -retain))
+    return result
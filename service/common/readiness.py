@@ -0,0 +1,121 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Readiness
+
+This module decides when a worker may take traffic. A worker that starts
+before PostgreSQL accepts connections retries with a bounded exponential
+backoff instead of exiting at the first refused connection. After that
+every worker opens the connections of its pool in a background thread,
+and /ready answers 503 until they are open, so Kubernetes only routes
+requests to workers that will not wait for a connection.
+"""
+import logging
+import os
+import threading
+from retry.api import retry_call
+from sqlalchemy.exc import OperationalError
+from service.models import db
+
+logger = logging.getLogger("flask.app")
+
+
+def retry_database(app, func, *args):
+    """
+    Calls a function again while the database cannot be reached
+
+    It tries RETRY_COUNT times, waiting RETRY_DELAY seconds after the first
+    failure and twice as long after each next one, up to RETRY_MAX_DELAY.
+
+    :param app: the Flask application with the retry settings
+    :param func: the function that uses the database
+    :return: what the function returned
+    """
+    return retry_call(
+        func,
+        fargs=args,
+        exceptions=OperationalError,
+        tries=max(1, app.config["RETRY_COUNT"]),
+        delay=app.config["RETRY_DELAY"],
+        max_delay=app.config["RETRY_MAX_DELAY"],
+        backoff=2,
+        logger=logger,
+    )
+
+
+def warm_pool(engine) -> int:
+    """Opens every connection of the pool of an engine and returns them to it"""
+    size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+    connections = []
+    try:
+        for _ in range(size):
+            connections.append(engine.connect())
+            connections[-1].exec_driver_sql("SELECT 1")
+    finally:
+        for connection in connections:
+            connection.close()
+    return size
+
+
+class Readiness:
+    """Warms the connection pool of a worker process and tells when it is warm"""
+
+    def __init__(self):
+        self._app = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        """Keeps the application whose pool is warmed"""
+        self._app = app
+
+    @property
+    def ready(self) -> bool:
+        """Tells if the pool of this process is warm"""
+        return self._ready.is_set() and self._pid == os.getpid()
+
+    def start(self):
+        """Starts warming the pool of this process unless it is warm or warming"""
+        with self._lock:
+            # a forked worker inherits neither the thread nor the connections
+            if self._pid == os.getpid() and (self._ready.is_set() or self._thread.is_alive()):
+                return
+            self._pid = os.getpid()
+            self._ready.clear()
+            self._thread = threading.Thread(target=self._warm, name="pool-warmer", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout: float) -> bool:
+        """Waits until the pool is warm and tells if it is"""
+        return self._ready.wait(timeout) and self.ready
+
+    def _warm(self):
+        with self._app.app_context():
+            try:
+                size = retry_database(self._app, warm_pool, db.engine)
+            except OperationalError as error:
+                # the next readiness check starts over
+                logger.error("Cannot open the connection pool: %s", error)
+                return
+        logger.info("Connection pool warm with %d connections", size)
+        self._ready.set()
+
+
+# the readiness of this worker process
+readiness = Readiness()
@@ -0,0 +1,233 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Status Hub
+
+This module fans the order status notifications of PostgreSQL out to the
+clients of the status stream. Every worker process runs one listener
+thread with its own connection that LISTENs on the STATUS_CHANNEL,
+so the database sees one listener per worker no matter how many clients
+are watching. Notifications are sent by OrderEvent.record() in the same
+transaction as the status change, so PostgreSQL only delivers them once
+the change is committed.
+
+Under wsgi:app every client holds a worker thread for as long as its
+stream is open. The ASGI application gives each client an asyncio queue
+instead, which the listener thread fills through the event loop, so an
+open stream costs a queue and a socket rather than a thread. Either way
+subscribe() refuses subscribers past a limit of the process.
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import psycopg
+from service.models import STATUS_CHANNEL
+
+logger = logging.getLogger("flask.app")
+
+
+class SubscriberLimitError(Exception):
+    """Used when a process already has as many subscribers as it allows"""
+
+
+class Subscription:
+    """The queue of status changes of one client"""
+
+    def __init__(self, order_ids=None, queue_size: int = 100):
+        self.order_ids = set(order_ids) if order_ids else None
+        self.queue = queue.Queue(maxsize=queue_size)
+        # set when the client fell behind and changes were dropped
+        self.overflowed = False
+
+    def wants(self, change: dict) -> bool:
+        """Tells if a change is about an Order the client watches"""
+        return self.order_ids is None or change.get("id") in self.order_ids
+
+    def offer(self, change: dict):
+        """Queues a change without ever blocking the listener"""
+        try:
+            self.queue.put_nowait(change)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout: float):
+        """Returns the next change or None when there was none in time"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription(Subscription):
+    """The queue of status changes of one client on an event loop"""
+
+    def __init__(self, loop, order_ids=None, queue_size: int = 100):
+        super().__init__(order_ids, queue_size)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+    def offer(self, change: dict):
+        """Hands a change to the event loop of the client"""
+        try:
+            self.loop.call_soon_threadsafe(self._put, change)
+        except RuntimeError:
+            # the event loop is closed, the client is gone
+            pass
+
+    def _put(self, change: dict):
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout: float):
+        """Returns the next change or None when there was none in time"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class StatusHub:
+    """Shares one LISTEN connection between the subscribers of a process"""
+
+    def __init__(self, poll_interval: float = 5.0, retry_delay: float = 1.0):
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._listening = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._dsn = None
+
+    @property
+    def subscribers(self) -> int:
+        """The number of subscribers of this process"""
+        return len(self._subscribers)
+
+    def subscribe(  # pylint: disable=too-many-arguments
+        self, dsn: str, order_ids=None, queue_size: int = 100, timeout: float = 5.0, max_subscribers: int = None
+    ):
+        """Adds a subscriber and starts the listener of this process if needed
+
+        Waits until the listener is LISTENing so that no change committed
+        after this returns can be missed.
+
+        :param dsn: the libpq connection string of the database
+        :param order_ids: the ids of the Orders to watch, None watches all
+        :param queue_size: the number of changes buffered for the subscriber
+        :param timeout: the number of seconds to wait for the listener
+        :param max_subscribers: the most subscribers of this process, None for no limit
+
+        :return: the new Subscription
+        :rtype: Subscription
+
+        :raises SubscriberLimitError: when the process has max_subscribers already
+        :raises ConnectionError: when the listener did not connect in time
+        """
+        return self._add(dsn, Subscription(order_ids, queue_size), timeout, max_subscribers)
+
+    async def subscribe_async(  # pylint: disable=too-many-arguments
+        self, dsn: str, order_ids=None, queue_size: int = 100, timeout: float = 5.0, max_subscribers: int = None
+    ):
+        """Adds a subscriber that is read on the running event loop
+
+        Takes the same arguments and raises the same errors as subscribe(),
+        waiting for the listener on a thread of the loop instead of blocking it.
+
+        :return: the new AsyncSubscription
+        :rtype: AsyncSubscription
+        """
+        subscription = AsyncSubscription(asyncio.get_running_loop(), order_ids, queue_size)
+        return await asyncio.to_thread(self._add, dsn, subscription, timeout, max_subscribers)
+
+    def unsubscribe(self, subscription: Subscription):
+        """Removes a subscriber"""
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, change: dict):
+        """Hands a change to every subscriber that watches its Order"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.wants(change):
+                subscription.offer(change)
+
+    def stop(self):
+        """Stops the listener thread"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self._listening.clear()
+        self._thread = None
+        self._pid = None
+
+    def _add(self, dsn: str, subscription: Subscription, timeout: float, max_subscribers: int):
+        with self._lock:
+            if max_subscribers is not None and len(self._subscribers) >= max_subscribers:
+                raise SubscriberLimitError(f"At most {max_subscribers} status streams can be open at once")
+            self._subscribers.add(subscription)
+            # a forked worker does not inherit the listener thread
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._start(dsn)
+        if not self._listening.wait(timeout):
+            self.unsubscribe(subscription)
+            raise ConnectionError("The status listener is not connected")
+        return subscription
+
+    def _start(self, dsn: str):
+        self._dsn = dsn
+        self._pid = os.getpid()
+        self._listening.clear()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="status-hub", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """Listens until stopped, reconnecting after connection errors"""
+        while not self._stopped.is_set():
+            try:
+                with psycopg.connect(self._dsn, autocommit=True) as conn:
+                    conn.add_notify_handler(self._notified)
+                    conn.execute(f"LISTEN {STATUS_CHANNEL}")
+                    self._listening.set()
+                    logger.info("Status hub listening on %s", STATUS_CHANNEL)
+                    while not self._stopped.is_set():
+                        select.select([conn.fileno()], [], [], self.poll_interval)
+                        # delivers the pending notifications and checks the connection
+                        conn.execute("SELECT 1")
+            except psycopg.Error as error:
+                self._listening.clear()
+                logger.warning("Status hub lost its connection, reconnecting: %s", error)
+                self._stopped.wait(self.retry_delay)
+
+    def _notified(self, notify):
+        try:
+            self.publish(json.loads(notify.payload))
+        except ValueError:
+            logger.warning("Ignoring an invalid status notification: %s", notify.payload)
+
+
+# the hub of this worker process
+hub = StatusHub()
@@ -15,6 +15,66 @@ SQLALCHEMY_DATABASE_URI = DATABASE_URI
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 # SQLALCHEMY_POOL_SIZE = 2
 
+# Attempts to reach the database when a worker starts, waiting RETRY_DELAY
+# seconds after the first failure and twice as long after each next one, up
+# to RETRY_MAX_DELAY. Keep the total below the gunicorn timeout, which kills
+# workers that take longer to start (10 attempts wait 27.5 seconds)
+RETRY_COUNT = int(os.getenv("RETRY_COUNT", "10"))
+RETRY_DELAY = float(os.getenv("RETRY_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "4"))
+
+# Apply the pending schema migrations when the app starts instead of only
+# checking the schema version (for development, tests and CI; production
+# runs flask db-upgrade before the release starts)
+DB_AUTO_UPGRADE = os.getenv("DB_AUTO_UPGRADE", "false").lower() in ("true", "yes", "1")
+
+# Number of rows removed per statement by bulk deletes
+BULK_DELETE_BATCH_SIZE = int(os.getenv("BULK_DELETE_BATCH_SIZE", "1000"))
+
+# Maximum number of ids accepted by a single order lookup
+LOOKUP_MAX_IDS = int(os.getenv("LOOKUP_MAX_IDS", "500"))
+
+# Maximum number of operations accepted by a single item batch
+ITEM_BATCH_MAX_OPERATIONS = int(os.getenv("ITEM_BATCH_MAX_OPERATIONS", "500"))
+
+# Completed orders older than this many days are moved to the archive
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+# Responses to requests sent with an Idempotency-Key are kept this long
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+# A key stays claimed by its request this long, after which a retry may claim
+# it again. Keep it above GUNICORN_TIMEOUT, which kills longer requests
+IDEMPOTENCY_KEY_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_LEASE_SECONDS", "60"))
+
+# Order change events are kept this long for the change feed, which waits
+# at most CHANGE_FEED_MAX_WAIT seconds for new events and polls for them
+# every CHANGE_FEED_POLL_INTERVAL seconds
+OUTBOX_RETAIN_DAYS = int(os.getenv("OUTBOX_RETAIN_DAYS", "7"))
+CHANGE_FEED_MAX_WAIT = int(os.getenv("CHANGE_FEED_MAX_WAIT", "30"))
+CHANGE_FEED_POLL_INTERVAL = float(os.getenv("CHANGE_FEED_POLL_INTERVAL", "0.5"))
+
+# The status stream sends a comment when nothing happened for this many
+# seconds and ends the stream of a client that fell this many changes behind
+STATUS_STREAM_HEARTBEAT = float(os.getenv("STATUS_STREAM_HEARTBEAT", "15"))
+STATUS_STREAM_QUEUE_SIZE = int(os.getenv("STATUS_STREAM_QUEUE_SIZE", "100"))
+# Each worker serving asgi:app answers 503 to new status streams past this
+# many, an open stream costs it a queue and a socket but no thread
+STATUS_STREAM_MAX_CLIENTS = int(os.getenv("STATUS_STREAM_MAX_CLIENTS", "1000"))
+# Under wsgi:app every open status stream holds a thread of its worker, so
+# each worker answers 503 past this many. Keep it below GUNICORN_THREADS so
+# that the other requests still get a thread
+STATUS_STREAM_MAX_THREADS = int(os.getenv("STATUS_STREAM_MAX_THREADS", "2"))
+
+# Connection pool of the async engine used when serving with asgi:app
+ASYNC_POOL_SIZE = int(os.getenv("ASYNC_POOL_SIZE", "5"))
+ASYNC_MAX_OVERFLOW = int(os.getenv("ASYNC_MAX_OVERFLOW", "10"))
+
+# Range partition the order and item tables by month (set before tables are created)
+PARTITION_ORDERS = os.getenv("PARTITION_ORDERS", "false").lower() in ("true", "yes", "1")
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_RETAIN_MONTHS = int(os.getenv("PARTITION_RETAIN_MONTHS", "0"))
+
 # Secret for session management
 SECRET_KEY = os.getenv("SECRET_KEY", "sup3r-s3cr3t")
 LOGGING_LEVEL = logging.INFO
@@ -0,0 +1,340 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Item Routes
+
+The Items of an Order: adding, listing, reading, updating, patching and
+deleting them one at a time or many at once in a batch
+"""
+import logging
+from flask import jsonify, request, abort
+from flask import current_app as app  # Import Flask application
+from flask_restx import Resource, fields, reqparse
+from service.models import db, Item, Order, OrderStatus, BATCH_OPERATIONS, apply_item_batch
+from service.common import status  # HTTP Status Codes
+from service.routes import item_model, order_page_args
+from . import api
+
+logger = logging.getLogger("flask.app")
+
+
+item_patch_model = api.model(
+    "ItemPatchModel",
+    {
+        "quantity": fields.Integer(description="The new quantity of the Item"),
+        "price": fields.Float(description="The new unit price of the Item"),
+    },
+)
+
+# query string arguments
+item_args = reqparse.RequestParser()
+item_args.add_argument(
+    "product_id",
+    type=int,
+    location="args",
+    required=False,
+    help="List Items with a specific product id",
+)
+item_args.add_argument(
+    "quantity",
+    type=int,
+    location="args",
+    required=False,
+    help="List Items with a specific quantity",
+)
+item_args.add_argument(
+    "price",
+    type=float,
+    location="args",
+    required=False,
+    help="List Items with a specific price",
+)
+
+item_batch_operation_model = api.model(
+    "ItemBatchOperationModel",
+    {
+        "op": fields.String(
+            required=True, enum=list(BATCH_OPERATIONS), description="The operation to apply"
+        ),
+        "id": fields.Integer(description="The ID of the Item to update or remove"),
+        "value": fields.Raw(
+            description="The Item to add, or the quantity and price to update"
+        ),
+    },
+)
+
+item_batch_result_model = api.model(
+    "ItemBatchResultModel",
+    {
+        "added": fields.List(fields.Nested(item_model)),
+        "updated": fields.List(fields.Nested(item_model)),
+        "removed": fields.List(fields.Integer, description="The ids of the removed Items"),
+    },
+)
+
+######################################################################
+#  PATH: /orders/{order_id:int}/items
+######################################################################
+
+
+@api.route("/orders/<int:order_id>/items")
+class ItemCollection(Resource):
+    """Class to handle Item collection operations"""
+
+    @api.doc("create_item")
+    @api.response(400, "Invalid Item data")
+    @api.expect(item_model)
+    @api.marshal_with(item_model, code=201)
+    def post(self, order_id):
+        """
+        Add a new item to an order.
+        """
+        app.logger.info("Request to add an item to order %s", order_id)
+
+        order = Order.query.get(int(order_id))
+        if not order:
+            abort(
+                status.HTTP_404_NOT_FOUND, f"Order with id '{order_id}' was not found."
+            )
+
+        item_data = request.get_json()
+        if not item_data:
+            abort(status.HTTP_400_BAD_REQUEST, "No data provided")
+
+        try:
+            new_item = Item(
+                order_id=order.id,
+                product_id=item_data["product_id"],
+                product_description=item_data["product_description"],
+                quantity=item_data["quantity"],
+                price=item_data["price"],
+            )
+            db.session.add(new_item)
+            db.session.commit()
+        except KeyError as e:
+            abort(status.HTTP_400_BAD_REQUEST, f"Missing field: {str(e)}")
+
+        response_data = new_item.serialize()
+
+        location_url = api.url_for(
+            ItemResource, order_id=order.id, item_id=new_item.id, _external=True
+        )
+
+        return (
+            response_data,
+            status.HTTP_201_CREATED,
+            {"Location": location_url},
+        )
+
+    @api.doc("list_order_items")
+    @api.expect(item_args, order_page_args, validate=True)
+    @api.response(404, "Order not found")
+    @api.marshal_list_with(item_model)
+    def get(self, order_id):
+        """Returns the list of items in an order"""
+        logger.info("ORDER ID %d", order_id)
+        args = item_args.parse_args()
+        page = order_page_args.parse_args()
+
+        # Add query parameters for filtering
+        conditions = []
+        if args["product_id"] is not None:
+            conditions.append(Item.product_id == str(args["product_id"]))
+        if args["quantity"] is not None:
+            conditions.append(Item.quantity == args["quantity"])
+        if args["price"] is not None:
+            conditions.append(Item.price == args["price"])
+
+        # One query tells if the order exists and returns its items
+        items, next_cursor = Item.list_for_order(
+            order_id, *conditions, limit=page["limit"], cursor=page["cursor"]
+        )
+        if items is None:
+            abort(
+                status.HTTP_404_NOT_FOUND,
+                "Order not found for ID " + str(order_id) + " inside get",
+            )
+        items_list = [item.serialize() for item in items]
+
+        logger.info("Returning %d items for order ID %d", len(items_list), order_id)
+
+        headers = {}
+        if next_cursor:
+            query = request.args.to_dict()
+            query["cursor"] = next_cursor
+            next_url = api.url_for(ItemCollection, order_id=order_id, _external=True, **query)
+            headers = {"X-Next-Cursor": next_cursor, "Link": f'<{next_url}>; rel="next"'}
+        return items_list, status.HTTP_200_OK, headers
+
+
+######################################################################
+#  PATH: /orders/{order_id:int}/items:batch
+######################################################################
+@api.route("/orders/<int:order_id>/items:batch")
+@api.param("order_id", "The ID of the order (integer)")
+class ItemBatch(Resource):
+    """Edits many items of an order at once
+    POST /orders/{order_id}/items:batch - Apply a list of add, update and remove operations
+    """
+
+    @api.doc("batch_order_items")
+    @api.response(400, "Invalid operations or the order cannot be updated")
+    @api.response(404, "Order not found")
+    @api.expect([item_batch_operation_model])
+    @api.marshal_with(item_batch_result_model)
+    def post(self, order_id):
+        """Applies every operation in one transaction, or none of them"""
+        operations = request.get_json(silent=True)
+        if not isinstance(operations, list) or not operations:
+            abort(status.HTTP_400_BAD_REQUEST, "The body must be a list of operations")
+        if len(operations) > app.config["ITEM_BATCH_MAX_OPERATIONS"]:
+            abort(
+                status.HTTP_400_BAD_REQUEST,
+                f"At most {app.config['ITEM_BATCH_MAX_OPERATIONS']} operations can be applied at once",
+            )
+        app.logger.info("Request to apply %d item operations to order %s", len(operations), order_id)
+        # a DataValidationError rolls everything back and becomes a 400
+        result = apply_item_batch(order_id, operations)
+        if result is None:
+            abort(status.HTTP_404_NOT_FOUND, f"Order ID {order_id} not found")
+        return result, status.HTTP_200_OK
+
+
+######################################################################
+#  PATH: /orders/{order_id:int}/item/{item_id:int}
+######################################################################
+@api.route("/orders/<int:order_id>/item/<int:item_id>")
+@api.param("order_id", "The ID of the order (integer)")
+@api.param("item_id", "The ID of the item in the order (integer)")
+class ItemResource(Resource):
+    """
+    ItemResource
+    Handle operations on a single Item in an order
+    GET /orders/{order_id}/item/{item_id} - Get the order item with the given id
+    PUT /orders/{order_id}/item/{item_id} - Update the order item with the given id
+    PATCH /orders/{order_id}/item/{item_id} - Update some fields of the order item
+    DELETE /orders/{order_id}/item/{item_id} - Delete the order item with the given id
+
+    """
+
+    @api.doc("get_order_item")
+    @api.response(404, "Item Not Found")
+    @api.marshal_with(item_model)
+    def get(self, order_id, item_id):
+        """Returns the details of an item in an order
+
+        Args:
+            order_id (int): ID of the order
+            item_id (int): ID of the item in the order
+
+        """
+        req_item = Item.find_in_order(int(order_id), int(item_id))
+        if req_item is None:
+            abort(status.HTTP_404_NOT_FOUND, description="Item not found")
+        logger.info("Returning item details:")
+        logger.info("**********ITEM DETAILS***********")
+        logger.info(jsonify(req_item.serialize()))
+
+        message = req_item.serialize()
+        # message["created_at"] = message["created_at"].timestamp()
+
+        return message, status.HTTP_200_OK
+
+    @api.doc("update_order_item")
+    @api.response(404, "Item not found")
+    @api.response(400, "Invalid Item data")
+    @api.expect(item_model)
+    @api.marshal_with(item_model)
+    def put(self, order_id, item_id):
+        """Update an item in the order given order ID and item ID"""
+        logger.info("Updating item with ID: %s in order with ID: %s", item_id, order_id)
+
+        data = request.json
+        order = Order.query.filter_by(id=order_id).first()
+
+        if order is None:
+            abort(status.HTTP_404_NOT_FOUND, f"Order ID {order_id} not found")
+
+        if order.status != OrderStatus.CREATED:
+            abort(
+                status.HTTP_400_BAD_REQUEST,
+                f"Order ID {order_id} cannot be updated in its current status",
+            )
+
+        item = Item.query.filter_by(order_id=order_id, id=item_id).first()
+
+        if item is None:
+            abort(
+                status.HTTP_404_NOT_FOUND,
+                f"Item ID {item_id} not found in Order ID {order_id}",
+            )
+
+        logger.info("*************EXISTING ITEM DATA*********************")
+        logger.info(item.serialize())
+
+        if "quantity" in data:
+            item.quantity = data["quantity"]
+        if "price" in data:
+            item.price = data["price"]
+
+        # item.updated_at = datetime.now()
+        item.update()
+
+        logger.info("**************UPDATED ITEM DATA************")
+        logger.info(item.serialize())
+
+        message = item.serialize()
+        return message, status.HTTP_200_OK
+
+    @api.doc("patch_order_item")
+    @api.response(400, "Invalid data or the order cannot be updated")
+    @api.response(404, "Item not found")
+    @api.expect(item_patch_model)
+    @api.marshal_with(item_model)
+    def patch(self, order_id, item_id):
+        """Updates the given fields of an item without reading it first"""
+        message = Item.patch(order_id, item_id, request.get_json(silent=True))
+        if message is None:
+            abort(
+                status.HTTP_404_NOT_FOUND,
+                f"Item ID {item_id} not found in Order ID {order_id}",
+            )
+        return message, status.HTTP_200_OK
+
+    @api.doc("delete_order_item")
+    @api.response(204, "Item deleted")
+    def delete(self, order_id, item_id):
+        """Delete an item from the order
+
+        Args:
+            order_id (int): ID of the order
+            item_id (int): ID of the item in the order
+
+        """
+        # A single statement deletes the item and tells if the order exists
+        order_exists, deleted = Item.delete_from_order(int(order_id), int(item_id))
+        if not order_exists:
+            abort(status.HTTP_404_NOT_FOUND, description="Order not found")
+        if not deleted:
+            return (
+                {"message": "Item does not exist"},
+                status.HTTP_404_NOT_FOUND,
+            )
+        return (
+            {"message": "Item deleted successfully"},
+            status.HTTP_204_NO_CONTENT,
+        )
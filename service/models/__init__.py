@@ -0,0 +1,40 @@
+"""
+Models for Orders
+
+The models are split by feature into the modules of this package:
+
+base        - the SQLAlchemy object, settings and helpers shared by every model
+order       - Orders and their Items
+batch       - many Item changes applied to an Order in one transaction
+outbox      - the change events of the Orders
+archive     - completed Orders moved out of the order tables
+rollup      - the daily reporting rollups
+idempotency - the responses to requests sent with an Idempotency-Key
+
+Every public name is imported here, so use service.models and not the
+modules themselves.
+"""
+
+from .base import (
+    db,
+    logger,
+    DataValidationError,
+    OrderStatus,
+    DATE_FORMAT,
+    ORDER_SUMMARY_COLUMNS,
+    PARTITIONED,
+    SEARCH_CONFIG,
+)
+from .outbox import (
+    OrderEvent,
+    EVENT_PRECEDENCE,
+    OUTBOX_SQL,
+    OUTBOX_DELETED_SQL,
+    STATUS_CHANNEL,
+    STATUS_NOTIFY_SQL,
+)
+from .order import Item, Order, ORDER_FILTERS, STATS_GROUPS
+from .batch import BATCH_OPERATIONS, BATCH_ADD_COLUMNS, apply_item_batch
+from .archive import ItemArchive, OrderArchive
+from .rollup import StatsRollup, ORDER_DAILY_STATS, PRODUCT_DAILY_STATS
+from .idempotency import IdempotencyKey
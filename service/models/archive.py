@@ -0,0 +1,157 @@
+"""
+Archive models
+
+Completed Orders and their Items moved out of the order tables
+"""
+
+from datetime import date, timedelta
+from sqlalchemy.orm import selectinload
+from sqlalchemy import delete, func, insert, select
+from .base import db, logger, DataValidationError, OrderStatus
+from .order import Item, Order
+from .outbox import OrderEvent
+
+
+class ItemArchive(db.Model):  # pylint: disable=too-few-public-methods
+    """
+    Class that represents an Item of an archived Order
+    """
+
+    __tablename__ = "item_archive"
+
+    ##################################################
+    # Table Schema
+    ##################################################
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(
+        db.Integer,
+        db.ForeignKey("order_archive.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    product_id = db.Column(db.String(16), nullable=False)
+    product_description = db.Column(db.String(64), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"<ItemArchive id=[{self.id}]>"
+
+    serialize = Item.serialize
+
+
+class OrderArchive(db.Model):
+    """
+    Class that represents a completed Order moved out of the order table
+    """
+
+    __tablename__ = "order_archive"
+
+    ##################################################
+    # Table Schema
+    ##################################################
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    customer_id = db.Column(db.String(16), nullable=False)
+    shipping_address = db.Column(db.String(128), nullable=False)
+    created_at = db.Column(db.Date(), nullable=False, index=True)
+    status = db.Column(db.Enum(OrderStatus), nullable=False)
+    total_amount = db.Column(db.Float, nullable=False, server_default="0")
+    item_count = db.Column(db.Integer, nullable=False, server_default="0")
+    archived_at = db.Column(db.DateTime(), nullable=False, server_default=func.now())  # pylint: disable=not-callable
+    items = db.relationship("ItemArchive", passive_deletes=True, order_by="ItemArchive.id")
+
+    def __repr__(self):
+        return f"<OrderArchive id=[{self.id}]>"
+
+    serialize = Order.serialize
+
+    ##################################################
+    # CLASS METHODS
+    ##################################################
+
+    @classmethod
+    def find(cls, by_id):
+        """Finds an archived Order by it's ID"""
+        logger.info("Processing archive lookup for id %s ...", by_id)
+        return cls.query.session.get(cls, by_id)
+
+    @classmethod
+    def find_many(cls, ids: list) -> dict:
+        """Finds archived Orders and their Items by a list of ids"""
+        logger.info("Processing archive lookup for %d ids ...", len(ids))
+        orders = cls.query.options(selectinload(cls.items)).filter(cls.id.in_(ids)).all()
+        return {order.id: order for order in orders}
+
+    @classmethod
+    def archive_completed(cls, days: int, batch_size: int = 500) -> int:
+        """Moves completed Orders older than a number of days to the archive
+
+        Every batch copies the Orders and their Items into the archive tables
+        and deletes them from the hot tables in one transaction. Rows locked
+        by a concurrent request are skipped and picked up by the next run.
+
+        :param days: only Orders created more than this many days ago are moved
+        :type days: int
+        :param batch_size: the maximum number of Orders moved per transaction
+        :type batch_size: int
+
+        :return: the number of Orders that were archived
+        :rtype: int
+
+        """
+        logger.info("Archiving completed orders older than %d days ...", days)
+        cutoff = date.today() - timedelta(days=days)
+        batch = (
+            select(Order.id)
+            .where(Order.status == OrderStatus.COMPLETED, Order.created_at < cutoff)
+            .order_by(Order.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        archived = 0
+        while True:
+            try:
+                ids = db.session.execute(batch).scalars().all()
+                if ids:
+                    cls._move(ids)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error("Error archiving orders after %d were moved", archived)
+                raise DataValidationError(e) from e
+            archived += len(ids)
+            if len(ids) < batch_size:
+                return archived
+
+    @classmethod
+    def _move(cls, ids: list):
+        """Copies Orders and their Items to the archive and removes them"""
+        order_columns = _shared_columns(Order, cls)
+        item_columns = _shared_columns(Item, ItemArchive)
+        db.session.execute(
+            insert(cls).from_select(
+                order_columns,
+                select(*[Order.__table__.c[name] for name in order_columns]).where(
+                    Order.id.in_(ids)
+                ),
+            )
+        )
+        db.session.execute(
+            insert(ItemArchive).from_select(
+                item_columns,
+                select(*[Item.__table__.c[name] for name in item_columns]).where(
+                    Item.order_id.in_(ids)
+                ),
+            )
+        )
+        OrderEvent.record(db.session.connection(), OrderEvent.ARCHIVED, ids)
+        db.session.execute(
+            delete(Order).where(Order.id.in_(ids)),
+            execution_options={"synchronize_session": False},
+        )
+
+
+def _shared_columns(source, target) -> list:
+    """Returns the names of the columns a model shares with its archive"""
+    names = set(target.__table__.columns.keys())
+    return [name for name in source.__table__.columns.keys() if name in names]
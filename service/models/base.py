@@ -0,0 +1,71 @@
+"""
+Base of the Order models
+
+The SQLAlchemy object, the settings and the helpers shared by every model
+"""
+
+import base64
+import json
+import logging
+from datetime import date
+from enum import Enum
+from flask_sqlalchemy import SQLAlchemy
+from service import config
+
+
+logger = logging.getLogger("flask.app")
+
+# Create the SQLAlchemy object to be initialized later in init_db()
+db = SQLAlchemy()
+
+DATE_FORMAT = "%Y-%m-%d"
+
+# Text search configuration of the shipping address and product description
+SEARCH_CONFIG = "english"
+
+# When enabled the order table is range partitioned by month on created_at
+# and the item table on a copy of it kept in order_created_at
+PARTITIONED = config.PARTITION_ORDERS
+
+
+class DataValidationError(Exception):
+    """Used for an data validation errors when deserializing"""
+
+
+class OrderStatus(Enum):
+    """Enumeration of valid Order Status"""
+
+    CREATED = 0
+    PROCESSING = 1
+    COMPLETED = 2
+
+
+# columns returned by Order.patch()
+ORDER_SUMMARY_COLUMNS = (
+    "id",
+    "customer_id",
+    "shipping_address",
+    "created_at",
+    "status",
+    "total_amount",
+    "item_count",
+)
+
+
+def encode_cursor(value, last_id: int, sort: str) -> str:
+    """Encodes the position of the last Order of a page"""
+    if isinstance(value, date):
+        value = value.isoformat()
+    data = json.dumps([value, last_id, sort]).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    """Decodes a cursor made by encode_cursor() for the same sort"""
+    try:
+        value, last_id, cursor_sort = json.loads(base64.urlsafe_b64decode(cursor))
+    except (ValueError, TypeError) as error:
+        raise DataValidationError(f"Invalid cursor: {cursor}") from error
+    if cursor_sort != sort:
+        raise DataValidationError("The cursor belongs to a different sort order")
+    return value, int(last_id)
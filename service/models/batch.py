@@ -0,0 +1,202 @@
+"""
+Item batches
+
+Adds, updates and removes many Items of an Order in one transaction
+"""
+
+from sqlalchemy import cast, column, delete, func, insert, select, update, values
+from .base import db, logger, DataValidationError, OrderStatus, PARTITIONED
+from .order import Item, Order
+from .outbox import OrderEvent
+
+# ops accepted by apply_item_batch() and the columns an add sets
+BATCH_OPERATIONS = ("add", "update", "remove")
+BATCH_ADD_COLUMNS = ("order_id", "product_id", "product_description", "quantity", "price")
+
+
+def apply_item_batch(order_id, operations: list):
+    """Adds, updates and removes Items of an Order in one transaction
+
+    Each operation is a dictionary like a JSON Patch operation:
+    {"op": "add", "value": {...}}, {"op": "update", "id": 1, "value":
+    {"quantity": 2}} or {"op": "remove", "id": 1}. The Order is locked
+    and its status checked once, then every kind of operation runs as
+    a single statement and the totals are refreshed once.
+
+    :param order_id: the id of the Order
+    :param operations: the operations to apply
+    :type operations: list
+
+    :return: the added and updated Items serialized and the removed ids,
+             or None when the Order does not exist
+    :rtype: dict
+
+    """
+    logger.info("Applying %d item operations to order %s", len(operations), order_id)
+    adds, updates, removes = _parse_batch(order_id, operations)
+    try:
+        order = _lock_order(order_id)
+        if order is None:
+            db.session.rollback()
+            return None
+        # removes first so that an update or add cannot touch a removed Item
+        result = {"removed": _remove_items(order_id, removes)}
+        result["updated"] = _update_items(order_id, updates)
+        result["added"] = _add_items(order, adds)
+        connection = db.session.connection()
+        Order.refresh_totals(connection, [order_id])
+        OrderEvent.record(connection, OrderEvent.UPDATED, [order_id])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error applying item operations to order %s", order_id)
+        if isinstance(e, DataValidationError):
+            raise
+        raise DataValidationError(e) from e
+    return result
+
+
+######################################################################
+#  E X E C U T I N G   O P E R A T I O N S
+######################################################################
+def _lock_order(order_id):
+    """Locks an Order that can be updated and returns its status and created_at, None if it does not exist"""
+    order = db.session.execute(
+        select(Order.status, Order.created_at)
+        .where(Order.id == order_id)
+        .with_for_update()
+    ).first()
+    if order is not None and order.status != OrderStatus.CREATED:
+        raise DataValidationError(f"Order ID {order_id} cannot be updated in its current status")
+    return order
+
+
+def _remove_items(order_id, removes: list) -> list:
+    """Deletes many Items with one DELETE ... RETURNING and returns their ids"""
+    if not removes:
+        return []
+    removed = list(
+        db.session.scalars(
+            delete(Item)
+            .where(Item.order_id == order_id, Item.id.in_(removes))
+            .returning(Item.id)
+        )
+    )
+    _check_batch_ids(removes, removed)
+    return removed
+
+
+def _update_items(order_id, updates: list) -> list:
+    """Updates many Items with one UPDATE ... FROM (VALUES ...) and returns them serialized"""
+    if not updates:
+        return []
+    changes = values(
+        column("id", db.Integer),
+        column("quantity", db.Integer),
+        column("price", db.Float),
+        name="changes",
+    ).data([(change["id"], change.get("quantity"), change.get("price")) for change in updates])
+    statement = (
+        update(Item)
+        .where(Item.id == changes.c.id, Item.order_id == order_id)
+        .values(
+            quantity=func.coalesce(cast(changes.c.quantity, db.Integer), Item.quantity),
+            price=func.coalesce(cast(changes.c.price, db.Float), Item.price),
+        )
+        .returning(Item)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    updated = [item.serialize() for item in db.session.scalars(statement).all()]
+    _check_batch_ids([change["id"] for change in updates], updated)
+    return updated
+
+
+def _add_items(order, adds: list) -> list:
+    """Inserts many Items with one INSERT ... RETURNING and returns them serialized"""
+    if not adds:
+        return []
+    if PARTITIONED:
+        for row in adds:
+            row["order_created_at"] = order.created_at
+    return [item.serialize() for item in db.session.scalars(insert(Item).returning(Item), adds).all()]
+
+
+def _check_batch_ids(expected: list, found: list):
+    """Raises a DataValidationError naming the ids a statement did not match"""
+    found = {row["id"] if isinstance(row, dict) else row for row in found}
+    missing = [item_id for item_id in expected if item_id not in found]
+    if missing:
+        raise DataValidationError(
+            f"Items not found in the Order: {', '.join(str(item_id) for item_id in missing)}"
+        )
+
+
+######################################################################
+#  P A R S I N G   O P E R A T I O N S
+######################################################################
+def _parse_batch(order_id, operations: list) -> tuple:
+    """Validates batch operations and splits them into adds, updates and removes"""
+    parsed = {kind: [] for kind in BATCH_OPERATIONS}
+    seen = set()
+    for index, operation in enumerate(operations):
+        kind = _operation_kind(index, operation)
+        if kind != "add":
+            _claim_item_id(index, operation.get("id"), seen)
+        parsed[kind].append(BATCH_PARSERS[kind](index, order_id, operation))
+    return parsed["add"], parsed["update"], parsed["remove"]
+
+
+def _operation_kind(index: int, operation) -> str:
+    """Returns the op of an operation after checking that it is one of BATCH_OPERATIONS"""
+    if not isinstance(operation, dict):
+        raise DataValidationError(f"Operation {index} must be an object")
+    kind = operation.get("op")
+    if kind not in BATCH_OPERATIONS:
+        raise DataValidationError(f"Operation {index} must have an op of {', '.join(BATCH_OPERATIONS)}")
+    return kind
+
+
+def _claim_item_id(index: int, item_id, seen: set):
+    """Checks that an operation names an Item no other operation of the batch uses"""
+    if isinstance(item_id, bool) or not isinstance(item_id, int) or item_id in seen:
+        raise DataValidationError(f"Operation {index} must have the id of an Item not used by another operation")
+    seen.add(item_id)
+
+
+def _operation_value(index: int, operation: dict) -> dict:
+    """Returns the value of an operation after checking that it is an object"""
+    value = operation.get("value") or {}
+    if not isinstance(value, dict):
+        raise DataValidationError(f"Operation {index} must have an object as value")
+    return value
+
+
+def _parse_add(index: int, order_id, operation: dict) -> dict:
+    """Returns the columns of the Item an add operation inserts"""
+    item = Item().deserialize({**_operation_value(index, operation), "order_id": order_id})
+    return {key: getattr(item, key) for key in BATCH_ADD_COLUMNS}
+
+
+def _parse_update(index: int, order_id, operation: dict) -> dict:  # pylint: disable=unused-argument
+    """Returns the id and the new quantity and/or price of an update operation"""
+    value = _operation_value(index, operation)
+    change = {"id": operation["id"]}
+    try:
+        if value.get("quantity") is not None:
+            change["quantity"] = int(value["quantity"])
+        if value.get("price") is not None:
+            change["price"] = float(value["price"])
+    except (TypeError, ValueError) as error:
+        raise DataValidationError(f"Operation {index} has an invalid value: {error}") from error
+    if len(change) == 1:
+        raise DataValidationError(f"Operation {index} must update quantity or price")
+    return change
+
+
+def _parse_remove(index: int, order_id, operation: dict) -> int:  # pylint: disable=unused-argument
+    """Returns the id of the Item a remove operation deletes"""
+    return operation["id"]
+
+
+# the parser of each op in BATCH_OPERATIONS
+BATCH_PARSERS = {"add": _parse_add, "update": _parse_update, "remove": _parse_remove}
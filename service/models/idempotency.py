@@ -0,0 +1,170 @@
+"""
+Idempotency key model
+
+Remembers the responses to requests sent with an Idempotency-Key
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy import and_, delete, or_, select, update
+from .base import db, logger, DataValidationError
+
+
+class IdempotencyKey(db.Model):
+    """
+    Class that remembers the response to a request sent with an Idempotency-Key
+
+    A key is claimed before the request is processed and its response is
+    saved afterwards, so a retry of the same request gets the saved response
+    back instead of creating a second Order. A claim is only held until
+    locked_until, so the key of a worker that died before saving the
+    response can be claimed again. The response is saved in the transaction
+    of the changes of the request, and only while the claim is still the
+    one of the request, so a request that outlived its lease cannot commit
+    an Order next to the one of the retry that took its key over.
+    """
+
+    __tablename__ = "idempotency_key"
+
+    ##################################################
+    # Table Schema
+    ##################################################
+    key = db.Column(db.String(255), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    # both null while the first request is still being processed
+    status_code = db.Column(db.Integer)
+    response = db.Column(JSONB)
+    # the request that claimed the key may be retried after this
+    locked_until = db.Column(db.DateTime(timezone=True))
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey key=[{self.key}]>"
+
+    @staticmethod
+    def hash_request(data) -> str:
+        """Returns a digest of a request body that ignores the order of its keys"""
+        body = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+    ##################################################
+    # CLASS METHODS
+    ##################################################
+
+    @classmethod
+    def claim(cls, key: str, request_hash: str, ttl: timedelta, lease: timedelta = timedelta(minutes=1)):
+        """Claims a key for a request unless it is already in use
+
+        A key older than the ttl, or claimed by a request that did not save
+        its response within its lease, is claimed again as if it was new,
+        in the same INSERT ... ON CONFLICT statement.
+
+        :param key: the Idempotency-Key header
+        :param request_hash: the hash_request() of the request body
+        :param ttl: how long a key is remembered
+        :type ttl: timedelta
+        :param lease: how long the request may take before the key is claimed again
+        :type lease: timedelta
+
+        :return: the created_at of the claim and None when the key was
+                 claimed, otherwise None and a row with the request_hash,
+                 status_code and response of the earlier request
+        :rtype: tuple
+
+        """
+        logger.info("Claiming idempotency key %s", key)
+        now = datetime.now(timezone.utc)
+        columns = {
+            "request_hash": request_hash,
+            "created_at": now,
+            "locked_until": now + lease,
+            "status_code": None,
+            "response": None,
+        }
+        expired = or_(cls.created_at < now - ttl, and_(cls.status_code.is_(None), cls.locked_until < now))
+        statement = (
+            pg_insert(cls)
+            .values(key=key, **columns)
+            .on_conflict_do_update(index_elements=[cls.key], set_=columns, where=expired)
+            .returning(cls.created_at)
+        )
+        try:
+            claimed_at = db.session.execute(statement).scalar()
+            existing = None
+            if claimed_at is None:
+                existing = db.session.execute(
+                    select(cls.request_hash, cls.status_code, cls.response).where(cls.key == key)
+                ).first()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error claiming idempotency key %s", key)
+            raise DataValidationError(e) from e
+        return claimed_at, existing
+
+    @classmethod
+    def save(cls, key: str, claimed_at: datetime, status_code: int, response) -> bool:
+        """Saves the response of the request that claimed a key
+
+        The response is committed with the changes the request left in the
+        session, unless another request claimed the key in the meantime:
+        then the changes are rolled back.
+
+        :param key: the Idempotency-Key header
+        :param claimed_at: the created_at of the claim returned by claim()
+        :param status_code: the status code of the response
+        :param response: the body of the response
+
+        :return: False when the key was claimed by another request
+        :rtype: bool
+
+        """
+        logger.info("Saving the response of idempotency key %s", key)
+        try:
+            saved = db.session.execute(
+                update(cls)
+                .where(cls.key == key, cls.created_at == claimed_at, cls.status_code.is_(None))
+                .values(status_code=status_code, response=response)
+            ).rowcount
+            if not saved:
+                logger.warning("Idempotency key %s was claimed by another request", key)
+                db.session.rollback()
+                return False
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error saving idempotency key %s", key)
+            raise DataValidationError(e) from e
+        return True
+
+    @classmethod
+    def release(cls, key: str, claimed_at: datetime):
+        """Forgets a claimed key whose request failed so that it can be retried"""
+        logger.info("Releasing idempotency key %s", key)
+        db.session.rollback()
+        db.session.execute(
+            delete(cls).where(cls.key == key, cls.created_at == claimed_at, cls.status_code.is_(None))
+        )
+        db.session.commit()
+
+    @classmethod
+    def purge(cls, ttl: timedelta) -> int:
+        """Deletes the keys older than the ttl
+
+        :return: the number of keys that were deleted
+        :rtype: int
+
+        """
+        logger.info("Purging idempotency keys older than %s", ttl)
+        try:
+            result = db.session.execute(
+                delete(cls).where(cls.created_at < datetime.now(timezone.utc) - ttl)
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error purging idempotency keys")
+            raise DataValidationError(e) from e
+        return result.rowcount
@@ -0,0 +1,1211 @@
+"""
+Order and Item models
+
+The session listeners at the end keep the totals of the Orders, their
+outbox events and the partition key of their Items in step with every
+change made through the ORM.
+"""
+
+import operator
+from datetime import date, timedelta
+from itertools import chain
+from sqlalchemy.dialects.postgresql import REAL, TSVECTOR
+from sqlalchemy.orm import deferred, selectinload
+from sqlalchemy import (
+    and_,
+    cast,
+    delete,
+    event,
+    func,
+    insert,
+    inspect,
+    literal,
+    literal_column,
+    select,
+    text,
+    tuple_,
+    union,
+    union_all,
+    update,
+)
+from .base import (
+    db,
+    logger,
+    DataValidationError,
+    OrderStatus,
+    ORDER_SUMMARY_COLUMNS,
+    PARTITIONED,
+    SEARCH_CONFIG,
+    decode_cursor,
+    encode_cursor,
+)
+from .outbox import OrderEvent, EVENT_PRECEDENCE
+
+# Order and Item refer to each other, so they share a module
+# pylint: disable=too-many-lines
+
+
+def _order_foreign_key() -> list:
+    """Returns the foreign key of Item.order_id when it is a single column"""
+    if PARTITIONED:
+        return []
+    return [db.ForeignKey("order.id", ondelete="CASCADE")]
+
+
+def _item_table_args():
+    """Returns the table arguments of Item"""
+    search_index = db.Index("ix_item_search_vector", "search_vector", postgresql_using="gin")
+    if not PARTITIONED:
+        return (search_index,)
+    return (
+        search_index,
+        db.ForeignKeyConstraint(
+            ["order_id", "order_created_at"],
+            ["order.id", "order.created_at"],
+            ondelete="CASCADE",
+        ),
+        {"postgresql_partition_by": "RANGE (order_created_at)"},
+    )
+
+
+class Item(db.Model):
+    """
+    Class that represents a Item in an Order
+    """
+
+    ##################################################
+    # Table Schema
+    ##################################################
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    order_id = db.Column(
+        db.Integer,
+        *_order_foreign_key(),
+        nullable=False,
+        index=True,
+    )
+    if PARTITIONED:
+        # copied from the Order when the Item is inserted
+        order_created_at = db.Column(db.Date(), primary_key=True)
+    product_id = db.Column(db.String(16), nullable=False)
+    product_description = db.Column(db.String(64), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    search_vector = deferred(
+        db.Column(
+            TSVECTOR,
+            db.Computed(f"to_tsvector('{SEARCH_CONFIG}', product_description)", persisted=True),
+        )
+    )
+
+    __table_args__ = _item_table_args()
+    __mapper_args__ = {"primary_key": [id]}
+
+    def __repr__(self):
+        return f"<Item id=[{self.id}]>"
+
+    def create(self):
+        """
+        Creates a Item to the database
+        """
+        logger.info("Creating %s", self.id)
+        self.id = None  # pylint: disable=invalid-name
+        try:
+            db.session.add(self)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error creating record: %s", self)
+            raise DataValidationError(e) from e
+
+    def update(self):
+        """
+        Updates a Item to the database
+        """
+        logger.info("Saving %s", self.id)
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error updating record: %s", self)
+            raise DataValidationError(e) from e
+
+    def delete(self):
+        """Removes a Item from the data store"""
+        logger.info("Deleting %s", self.id)
+        try:
+            db.session.delete(self)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error deleting record: %s", self)
+            raise DataValidationError(e) from e
+
+    def serialize(self):
+        """Serializes a Item into a dictionary"""
+        return {
+            "id": self.id,
+            "product_id": self.product_id,
+            "order_id": self.order_id,
+            "product_description": self.product_description,
+            "quantity": self.quantity,
+            "price": self.price,
+        }
+
+    def deserialize(self, data):
+        """
+        Deserializes a Item from a dictionary
+
+        Args:
+            data (dict): A dictionary containing the resource data
+        """
+        try:
+            self.product_id = data["product_id"]
+            self.order_id = data["order_id"]
+            self.product_description = data["product_description"]
+            try:
+                quantity = int(data["quantity"])
+                self.quantity = quantity
+            except Exception as e:
+                raise DataValidationError(
+                    "Invalid type for int [quantity]: " + data["quantity"]
+                ) from e
+            try:
+                price = float(data["price"])
+                self.price = price
+            except Exception as e:
+                raise DataValidationError(
+                    "Invalid type for float [price]: " + data["price"]
+                ) from e
+
+        # except AttributeError as error:
+        #     raise DataValidationError("Invalid attribute: " + error.args[0]) from error
+        except KeyError as error:
+            raise DataValidationError(
+                "Invalid Item: missing " + error.args[0]
+            ) from error
+        except TypeError as error:
+            raise DataValidationError(
+                "Invalid Item: body of request contained bad or no data " + str(error)
+            ) from error
+        return self
+
+    ##################################################
+    # CLASS METHODS
+    ##################################################
+
+    @classmethod
+    def all(cls):
+        """Returns all of the Items in the database"""
+        logger.info("Processing all Items")
+        return cls.query.all()
+
+    @classmethod
+    def find(cls, by_id):
+        """Finds a Item by it's ID"""
+        logger.info("Processing lookup for id %s ...", by_id)
+        return cls.query.session.get(cls, by_id)
+
+    @classmethod
+    def find_in_order(cls, order_id, item_id):
+        """Finds an Item by it's ID within an Order with a single query"""
+        logger.info("Processing lookup for item %s of order %s ...", item_id, order_id)
+        return cls.query.filter(cls.order_id == order_id, cls.id == item_id).first()
+
+    @classmethod
+    def list_for_order(cls, order_id, *conditions, limit: int = None, cursor: str = None) -> tuple:
+        """Returns a page of the Items of an Order and tells if it exists
+
+        The Order is outer joined to its matching Items, so a single query
+        returns the Items of an existing Order and one row without an Item
+        when it has none.
+
+        :param order_id: the id of the Order
+        :param conditions: SQLAlchemy filter expressions on Item
+        :param limit: the page size, None returns every Item
+        :type limit: int
+        :param cursor: the next_cursor of the previous page
+        :type cursor: str
+
+        :return: the Items or None when the Order does not exist, and the
+                 cursor of the next page or None
+        :rtype: tuple
+
+        """
+        logger.info("Processing items of order %s ...", order_id)
+        if cursor:
+            conditions += (cls.id > decode_cursor(cursor, "item")[1],)
+        statement = cls.list_statement(order_id, *conditions)
+        if limit is not None:
+            statement = statement.limit(limit + 1)
+        rows = db.session.execute(statement).all()
+        if not rows:
+            return None, None
+        items = [item for _, item in rows if item is not None]
+        if limit is None or len(items) <= limit:
+            return items, None
+        return items[:limit], encode_cursor(items[limit - 1].id, items[limit - 1].id, "item")
+
+    @classmethod
+    def list_statement(cls, order_id, *conditions):
+        """Returns the query of list_for_order() as (order id, Item) rows"""
+        return (
+            select(Order.id, cls)
+            .outerjoin(cls, and_(cls.order_id == Order.id, *conditions))
+            .where(Order.id == order_id)
+            .order_by(cls.id)
+        )
+
+    @classmethod
+    def add_statement(cls, order_id, data: dict):
+        """Returns an INSERT ... SELECT that adds an Item to an Order
+
+        The Order is read by the statement itself, so nothing is inserted
+        when it does not exist and the partition key is copied from it.
+
+        :raises DataValidationError: when a field is missing or invalid
+        """
+        try:
+            given = {
+                "product_id": str(data["product_id"]),
+                "product_description": str(data["product_description"]),
+                "quantity": int(data["quantity"]),
+                "price": float(data["price"]),
+            }
+        except (KeyError, TypeError, ValueError) as error:
+            raise DataValidationError(f"Invalid Item: {error}") from error
+        columns = {"order_id": Order.id}
+        if PARTITIONED:
+            columns["order_created_at"] = Order.created_at
+        columns.update(
+            {name: literal(value, getattr(cls, name).type) for name, value in given.items()}
+        )
+        return (
+            insert(cls)
+            .from_select(list(columns), select(*columns.values()).where(Order.id == order_id))
+            .returning(cls)
+        )
+
+    @classmethod
+    def delete_from_order(cls, order_id, item_id) -> tuple:
+        """Deletes an Item of an Order with a single statement
+
+        :return: whether the Order exists and whether the Item was deleted
+        :rtype: tuple
+
+        """
+        logger.info("Deleting item %s of order %s", item_id, order_id)
+        try:
+            order_exists, item_deleted = db.session.execute(
+                cls.delete_statement(order_id, item_id)
+            ).one()
+            if item_deleted:
+                Order.refresh_totals(db.session.connection(), [order_id])
+                OrderEvent.record(db.session.connection(), OrderEvent.UPDATED, [order_id])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error deleting item %s of order %s", item_id, order_id)
+            raise DataValidationError(e) from e
+        return order_exists, item_deleted
+
+    @classmethod
+    def delete_statement(cls, order_id, item_id):
+        """Returns the statement used by delete_from_order()
+
+        It deletes the Item and selects whether the Order exists and
+        whether the Item was deleted.
+        """
+        deleted = (
+            delete(cls)
+            .where(cls.id == item_id, cls.order_id == order_id)
+            .returning(cls.id)
+            .cte("deleted")
+        )
+        return select(
+            select(Order.id).where(Order.id == order_id).exists(),
+            select(deleted.c.id).exists(),
+        )
+
+    @classmethod
+    def patch(cls, order_id, item_id, data: dict):
+        """Updates the quantity and price of an Item with one UPDATE ... RETURNING
+
+        The Item is not read first: the rule that only the Items of a
+        CREATED Order can change is part of the WHERE clause, and the
+        reason nothing matched is only looked up when that happens.
+
+        :param order_id: the id of the Order
+        :param item_id: the id of the Item
+        :param data: the quantity and/or price to set
+        :type data: dict
+
+        :return: the updated Item serialized, or None when the Order or the
+                 Item does not exist
+        :rtype: dict
+
+        """
+        logger.info("Patching item %s of order %s with %s", item_id, order_id, data)
+        statement = cls.patch_statement(order_id, item_id, data)
+        try:
+            item = db.session.scalars(statement).first()
+            if item is None:
+                order_status = db.session.execute(
+                    select(Order.status).where(Order.id == order_id)
+                ).scalar()
+                db.session.rollback()
+                if order_status in (None, OrderStatus.CREATED):
+                    return None
+                raise DataValidationError(
+                    f"Order ID {order_id} cannot be updated in its current status"
+                )
+            message = item.serialize()
+            Order.refresh_totals(db.session.connection(), [order_id])
+            OrderEvent.record(db.session.connection(), OrderEvent.UPDATED, [order_id])
+            db.session.commit()
+        except DataValidationError:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error patching item %s of order %s", item_id, order_id)
+            raise DataValidationError(e) from e
+        return message
+
+    @classmethod
+    def patch_statement(cls, order_id, item_id, data: dict):
+        """Returns the UPDATE ... RETURNING used by patch()
+
+        :raises DataValidationError: when the fields cannot be patched
+        """
+        changes = _patch_changes(data, {"quantity": _patch_integer, "price": _patch_float})
+        return (
+            update(cls)
+            .where(
+                cls.id == item_id,
+                cls.order_id == order_id,
+                select(Order.id)
+                .where(Order.id == order_id, Order.status == OrderStatus.CREATED)
+                .exists(),
+            )
+            .values(**changes)
+            .returning(cls)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+
+
+def _patch_changes(data, columns: dict) -> dict:
+    """Converts the fields of a PATCH body to column values
+
+    :param data: the request body
+    :param columns: the column names that can be patched and their types
+
+    :return: the values to set keyed by column name
+    :rtype: dict
+
+    """
+    if not isinstance(data, dict) or not data:
+        raise DataValidationError("The body must be an object with the fields to update")
+    unknown = sorted(set(data) - set(columns))
+    if unknown:
+        raise DataValidationError(f"These fields cannot be updated: {', '.join(unknown)}")
+    if None in data.values():
+        raise DataValidationError("Fields cannot be updated to null")
+    changes = {}
+    for name, value in data.items():
+        try:
+            changes[name] = columns[name](value)
+        except (KeyError, TypeError, ValueError) as error:
+            raise DataValidationError(f"Invalid value of {name}: {error}") from error
+    return changes
+
+
+def _patch_integer(value) -> int:
+    """Returns a whole JSON number as an Integer column value
+
+    Booleans and fractions are refused instead of being rounded down
+    """
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"{value!r} is not an integer")
+    if not -(2**31) <= value < 2**31:
+        raise ValueError(f"{value} is out of range")
+    return value
+
+
+def _patch_float(value) -> float:
+    """Returns a JSON number as a Float column value"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{value!r} is not a number")
+    return float(value)
+
+
+def _patch_string(column):
+    """Returns the converter of a JSON string to the value of a String column"""
+
+    def convert(value) -> str:
+        if not isinstance(value, str):
+            raise ValueError(f"{value!r} is not a string")
+        if len(value) > column.type.length:
+            raise ValueError(f"it is longer than {column.type.length} characters")
+        return value
+
+    return convert
+
+
+class Order(db.Model):  # pylint: disable=too-many-public-methods
+    """
+    Class that represents an Order
+    """
+
+    ##################################################
+    # Table Schema
+    ##################################################
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    customer_id = db.Column(db.String(16), nullable=False)
+    shipping_address = db.Column(db.String(128), nullable=False)
+    # created_at is the partition key so it must never change on update
+    created_at = db.Column(
+        db.Date(), nullable=False, default=date.today, primary_key=PARTITIONED
+    )
+    status = db.Column(
+        db.Enum(OrderStatus), nullable=False, server_default=(OrderStatus.CREATED.name)
+    )
+    # maintained from the Items on every flush, see _refresh_totals()
+    total_amount = db.Column(db.Float, nullable=False, default=0.0, server_default="0")
+    item_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    search_vector = deferred(
+        db.Column(
+            TSVECTOR,
+            db.Computed(f"to_tsvector('{SEARCH_CONFIG}', shipping_address)", persisted=True),
+        )
+    )
+    items = db.relationship(
+        "Item",
+        backref="order",
+        passive_deletes=True,
+        cascade="all, delete-orphan",
+        order_by="Item.id",
+    )
+
+    # one index per sort key with id as the tie breaker of keyset pagination
+    __table_args__ = (
+        db.Index("ix_order_created_at_id", "created_at", "id"),
+        db.Index("ix_order_total_amount_id", "total_amount", "id"),
+        db.Index("ix_order_item_count_id", "item_count", "id"),
+        db.Index("ix_order_search_vector", "search_vector", postgresql_using="gin"),
+        {"postgresql_partition_by": "RANGE (created_at)"} if PARTITIONED else {},
+    )
+    __mapper_args__ = {"primary_key": [id]}
+
+    # keys the Order list can be sorted by
+    SORT_KEYS = ("id", "created_at", "total_amount", "item_count")
+
+    def __repr__(self):
+        return f"<Order id=[{self.id}]>"
+
+    def create(self, commit: bool = True):
+        """
+        Creates a Order to the database
+
+        :param commit: False only flushes the Order and its Items, for the
+                       caller to commit them with other changes
+        """
+        logger.info("Creating %s", self.id)
+        self.id = None  # pylint: disable=invalid-name
+        try:
+            db.session.add(self)
+            if commit:
+                db.session.commit()
+            else:
+                db.session.flush()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error creating record: %s", self)
+            raise DataValidationError(e) from e
+
+    def update(self):
+        """
+        Updates a Order to the database
+        """
+        logger.info("Saving %s", self.id)
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error updating record: %s", self)
+            raise DataValidationError(e) from e
+
+    def delete(self):
+        """Removes a Order from the data store
+
+        Items are removed by the ON DELETE CASCADE foreign key so only a
+        single DELETE is issued no matter how many items the Order has
+        """
+        logger.info("Deleting %s", self.id)
+        self.delete_by_id(self.id)
+
+    def serialize(self):
+        """Serializes a Order into a dictionary"""
+        order = {
+            "id": self.id,
+            "order_id": self.id,
+            "customer_id": self.customer_id,
+            "shipping_address": self.shipping_address,
+            "created_at": self.created_at,
+            "status": self.status.name,
+            "total_amount": self.total_amount,
+            "item_count": self.item_count,
+            "items": [],
+        }
+        for item in self.items:
+            order["items"].append(item.serialize())
+        return order
+
+    def deserialize(self, data):
+        """
+        Deserializes a Order from a dictionary
+
+        Args:
+            data (dict): A dictionary containing the resource data
+        """
+        try:
+            self.customer_id = data["customer_id"]
+            self.shipping_address = data["shipping_address"]
+            # self.created_at = (
+            #     datetime.strptime(data["created_at"], DATE_FORMAT).date()
+            #     if "created_at" in data
+            #     else date.today()
+            # )
+
+            # if isinstance(data["created_at"], str):
+            #     data["created_at"] = datetime.datetime.strptime(
+            #         data["created_at"], "%a, %d %b %Y %H:%M:%S %Z"
+            #     )
+            # elif isinstance(data["created_at"], datetime.datetime):
+            #     self.created_at = data["created_at"]
+            # else:
+            #     raise DataValidationError(
+            #         "Invalid type for datetime [created_at]: "
+            #         + datetime.datetime.strftime(data["created_at"], DATE_FORMAT)
+            #     )
+
+            try:
+                status = OrderStatus[data["status"].upper()]
+                self.status = status
+            except Exception as e:
+                raise DataValidationError(
+                    "Invalid type for Status [status]: " + data["status"]
+                ) from e
+
+            item_list = data.get("items")
+            for item_data in item_list:
+                item = Item()
+                item.deserialize(item_data)
+                self.items.append(item)
+
+        # except AttributeError as error:
+        #     raise DataValidationError("Invalid attribute: " + error.args[0]) from error
+        except KeyError as error:
+            raise DataValidationError(
+                "Invalid Order: missing " + error.args[0]
+            ) from error
+        except TypeError as error:
+            raise DataValidationError(
+                "Invalid Order: body of request contained bad or no data " + str(error)
+            ) from error
+        return self
+
+    ##################################################
+    # CLASS METHODS
+    ##################################################
+
+    @classmethod
+    def all(cls):
+        """Returns all of the Orders in the database"""
+        logger.info("Processing all Orders")
+        return cls.query.all()
+
+    @classmethod
+    def find(cls, by_id):
+        """Finds a Order by it's ID"""
+        logger.info("Processing lookup for id %s ...", by_id)
+        return cls.query.session.get(cls, by_id)
+
+    @classmethod
+    def find_many(cls, ids: list) -> dict:
+        """Finds Orders and their Items by a list of ids
+
+        One query loads the Orders and a second one the Items of all of
+        them, however many ids are given
+
+        :param ids: the ids of the Orders to find
+        :type ids: list
+
+        :return: the Orders that were found keyed by id
+        :rtype: dict
+
+        """
+        logger.info("Processing lookup for %d ids ...", len(ids))
+        orders = cls.query.options(selectinload(cls.items)).filter(cls.id.in_(ids)).all()
+        return {order.id: order for order in orders}
+
+    @classmethod
+    def statuses(cls, ids: list) -> list:
+        """Returns the id and status name of the Orders with the given ids"""
+        logger.info("Processing status lookup for %d ids ...", len(ids))
+        rows = db.session.execute(cls.statuses_statement(ids)).all()
+        return [{"id": order_id, "status": order_status.name} for order_id, order_status in rows]
+
+    @classmethod
+    def statuses_statement(cls, ids: list):
+        """Returns the SELECT of the id and status of the Orders with the given ids"""
+        return select(cls.id, cls.status).where(cls.id.in_(ids)).order_by(cls.id)
+
+    @classmethod
+    def delete_by_id(cls, by_id) -> int:
+        """Deletes an Order by it's ID without loading it or its Items
+
+        :param by_id: the id of the Order to delete
+        :type by_id: int
+
+        :return: the number of Orders that were deleted
+        :rtype: int
+
+        """
+        logger.info("Processing delete for id %s ...", by_id)
+        try:
+            deleted = db.session.scalars(
+                delete(cls).where(cls.id == by_id).returning(cls.id)
+            ).all()
+            OrderEvent.record(db.session.connection(), OrderEvent.DELETED, deleted)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error deleting record: %s", by_id)
+            raise DataValidationError(e) from e
+        return len(deleted)
+
+    @classmethod
+    def patch(cls, order_id, data: dict):
+        """Updates the address and status of an Order with one UPDATE ... RETURNING
+
+        The Order is not read first: the rule that only CREATED Orders can
+        change is part of the WHERE clause, and whether the Order exists
+        is only looked up when nothing matched.
+
+        :param order_id: the id of the Order
+        :param data: the shipping_address and/or status to set
+        :type data: dict
+
+        :return: the updated Order serialized without its Items, or None
+                 when it does not exist
+        :rtype: dict
+
+        """
+        logger.info("Patching order %s with %s", order_id, data)
+        statement, event_type = cls.patch_statement(order_id, data)
+        try:
+            row = db.session.execute(statement).first()
+            if row is None:
+                found = db.session.execute(select(cls.id).where(cls.id == order_id)).scalar()
+                db.session.rollback()
+                if found is None:
+                    return None
+                raise DataValidationError(
+                    f"Order ID {order_id} cannot be updated in its current status"
+                )
+            OrderEvent.record(db.session.connection(), event_type, [order_id])
+            db.session.commit()
+        except DataValidationError:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error patching order %s", order_id)
+            raise DataValidationError(e) from e
+        return cls.serialize_summary(row)
+
+    @classmethod
+    def patch_statement(cls, order_id, data: dict) -> tuple:
+        """Returns the UPDATE ... RETURNING used by patch() and its event type
+
+        :raises DataValidationError: when the fields cannot be patched
+        """
+        changes = _patch_changes(
+            data,
+            {"shipping_address": _patch_string(cls.shipping_address), "status": OrderStatus.__getitem__},
+        )
+        # a CREATED Order can only stay CREATED or move on to PROCESSING
+        if changes.get("status", OrderStatus.CREATED) not in (
+            OrderStatus.CREATED,
+            OrderStatus.PROCESSING,
+        ):
+            raise DataValidationError(
+                f"Order ID {order_id} cannot be updated to {changes['status'].name}"
+            )
+        statement = (
+            update(cls)
+            .where(cls.id == order_id, cls.status == OrderStatus.CREATED)
+            .values(**changes)
+            .returning(*(getattr(cls, name) for name in ORDER_SUMMARY_COLUMNS))
+        )
+        moved = changes.get("status", OrderStatus.CREATED) != OrderStatus.CREATED
+        return statement, OrderEvent.STATUS if moved else OrderEvent.UPDATED
+
+    @staticmethod
+    def serialize_summary(row) -> dict:
+        """Serializes a row of the ORDER_SUMMARY_COLUMNS into a dictionary"""
+        message = dict(row._mapping)  # pylint: disable=protected-access
+        message["status"] = message["status"].name
+        return message
+
+    @classmethod
+    def filter_conditions(cls, args: dict) -> list:
+        """Translates query string arguments into filter expressions
+
+        :param args: parsed arguments, missing or None values are ignored
+        :type args: dict
+
+        :return: a list of SQLAlchemy filter expressions
+        :rtype: list
+
+        """
+        conditions = []
+        for arg, name, compare, convert in ORDER_FILTERS:
+            value = args.get(arg)
+            if value in (None, "", []):
+                continue
+            conditions.append(compare(getattr(cls, name), convert(value) if convert else value))
+        return conditions
+
+    @classmethod
+    def page(cls, *conditions, sort: str = "id", limit: int = None, cursor: str = None) -> tuple:
+        """Returns a page of Orders sorted by a key, resuming after a cursor
+
+        Pages are read with keyset pagination: the cursor holds the sort
+        key and id of the last Order of the previous page, so every page
+        is an index range scan no matter how deep it is.
+
+        :param conditions: SQLAlchemy filter expressions on Order
+        :param sort: one of SORT_KEYS, prefixed with - for descending order
+        :type sort: str
+        :param limit: the page size, None returns every Order
+        :type limit: int
+        :param cursor: the next_cursor of the previous page
+        :type cursor: str
+
+        :return: the Orders of the page and the cursor of the next page or None
+        :rtype: tuple
+
+        """
+        descending = sort.startswith("-")
+        name = sort.lstrip("-")
+        if name not in cls.SORT_KEYS:
+            raise DataValidationError(f"Invalid sort key: {sort}")
+        key = getattr(cls, name)
+        keyset = tuple_(key, cls.id)
+        query = cls.query.filter(*conditions)
+        if cursor:
+            value, last_id = decode_cursor(cursor, sort)
+            if name == "created_at":
+                value = date.fromisoformat(value)
+            position = tuple_(literal(value, key.type), literal(last_id))
+            query = query.filter(keyset < position if descending else keyset > position)
+        if descending:
+            query = query.order_by(key.desc(), cls.id.desc())
+        else:
+            query = query.order_by(key, cls.id)
+        if limit is None:
+            return query.all(), None
+        orders = query.limit(limit + 1).all()
+        if len(orders) <= limit:
+            return orders, None
+        last = orders[limit - 1]
+        return orders[:limit], encode_cursor(getattr(last, name), last.id, sort)
+
+    @classmethod
+    def search_match(cls, terms: str):
+        """Returns a filter expression for Orders matching a full-text search"""
+        query_vector = _search_query(terms)
+        # a UNION of two GIN index scans, an OR would scan every Order
+        return cls.id.in_(
+            union(
+                select(cls.id).where(cls.search_vector.op("@@")(query_vector)),
+                select(Item.order_id).where(Item.search_vector.op("@@")(query_vector)),
+            )
+        )
+
+    @classmethod
+    def search(cls, terms: str, *conditions, limit: int = None, cursor: str = None) -> tuple:
+        """Returns a page of Orders matching a full-text search, best first
+
+        The terms are matched against the shipping address of the Order and
+        the product descriptions of its Items through their GIN indexed
+        tsvector columns. The rank of an Order is the rank of its address
+        plus the best rank of its Items.
+
+        :param terms: web search style terms, e.g. broadway -"main st"
+        :type terms: str
+        :param conditions: SQLAlchemy filter expressions on Order
+        :param limit: the page size, None returns every match
+        :type limit: int
+        :param cursor: the next_cursor of the previous page
+        :type cursor: str
+
+        :return: the Orders of the page and the cursor of the next page or None
+        :rtype: tuple
+
+        """
+        logger.info("Processing search for %s ...", terms)
+        query_vector = _search_query(terms)
+        item_rank = (
+            select(func.max(func.ts_rank(Item.search_vector, query_vector)))
+            .where(Item.order_id == cls.id, Item.search_vector.op("@@")(query_vector))
+            .scalar_subquery()
+        )
+        rank = func.ts_rank(cls.search_vector, query_vector) + func.coalesce(item_rank, 0)
+        query = db.session.query(cls, rank).filter(*conditions, cls.search_match(terms))
+        if cursor:
+            value, last_id = decode_cursor(cursor, "rank")
+            # ranks are float4, compare them as such and not as the float8 parameter
+            position = tuple_(cast(literal(value), REAL), literal(last_id))
+            query = query.filter(tuple_(rank, cls.id) < position)
+        query = query.order_by(rank.desc(), cls.id.desc())
+        if limit is None:
+            return [order for order, _ in query.all()], None
+        rows = query.limit(limit + 1).all()
+        orders = [order for order, _ in rows[:limit]]
+        if len(rows) <= limit:
+            return orders, None
+        return orders, encode_cursor(rows[limit - 1][1], orders[-1].id, "rank")
+
+    @classmethod
+    def count(cls, *conditions, estimate: bool = False) -> tuple:
+        """Counts the Orders matching the conditions with SELECT count(*)
+
+        Without conditions the planner statistics can be used instead, which
+        is instant on any table size but only as accurate as the last ANALYZE
+
+        :param conditions: SQLAlchemy filter expressions on Order
+        :param estimate: use the planner statistics when there are no conditions
+        :type estimate: bool
+
+        :return: the number of Orders and whether it is an estimate
+        :rtype: tuple
+
+        """
+        if estimate and not conditions:
+            # sum over the partitions too, a partitioned parent has no rows
+            estimated = db.session.execute(
+                text(
+                    "SELECT sum(reltuples), bool_or(reltuples < 0) FROM pg_class "
+                    "WHERE relkind = 'r' AND (oid = '\"order\"'::regclass OR oid IN "
+                    "(SELECT inhrelid FROM pg_inherits WHERE inhparent = '\"order\"'::regclass))"
+                )
+            ).one()
+            # reltuples is -1 until the table was vacuumed or analyzed
+            if estimated[0] is not None and not estimated[1]:
+                return int(estimated[0]), True
+        query = select(func.count()).select_from(cls).where(*conditions)  # pylint: disable=not-callable
+        return db.session.scalar(query), False
+
+    @classmethod
+    def refresh_totals(cls, connection, order_ids):
+        """Recomputes total_amount and item_count of Orders from their Items
+
+        :param connection: the connection of the current transaction
+        :param order_ids: the ids of the Orders to refresh
+        :type order_ids: iterable
+
+        """
+        connection.execute(cls.refresh_totals_statement(order_ids))
+
+    @classmethod
+    def refresh_totals_statement(cls, order_ids):
+        """Returns the UPDATE used by refresh_totals()"""
+        return (
+            update(cls)
+            .where(cls.id.in_(list(order_ids)))
+            .values(
+                total_amount=select(func.coalesce(func.sum(Item.quantity * Item.price), 0.0))
+                .where(Item.order_id == cls.id)
+                .scalar_subquery(),
+                item_count=select(func.count(Item.id))  # pylint: disable=not-callable
+                .where(Item.order_id == cls.id)
+                .scalar_subquery(),
+            )
+        )
+
+    @classmethod
+    def delete_where(cls, *conditions, batch_size: int = 1000) -> int:
+        """Deletes every Order matching the conditions in batches
+
+        Each batch is a single set based DELETE that is committed on its own
+        so that locks are never held on more than batch_size rows at a time
+
+        :param conditions: SQLAlchemy filter expressions on Order
+        :param batch_size: the maximum number of Orders deleted per statement
+        :type batch_size: int
+
+        :return: the number of Orders that were deleted
+        :rtype: int
+
+        """
+        logger.info("Processing bulk delete in batches of %d ...", batch_size)
+        batch = select(cls.id).where(*conditions).limit(batch_size).scalar_subquery()
+        deleted = 0
+        while True:
+            try:
+                ids = db.session.scalars(
+                    delete(cls).where(cls.id.in_(batch)).returning(cls.id),
+                    execution_options={"synchronize_session": False},
+                ).all()
+                OrderEvent.record(db.session.connection(), OrderEvent.DELETED, ids)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error("Error deleting records after %d deletes", deleted)
+                raise DataValidationError(e) from e
+            deleted += len(ids)
+            if len(ids) < batch_size:
+                return deleted
+
+    @classmethod
+    def find_by_customer_id(cls, customer_id: str) -> list:
+        """Returns all Orders owned by a customer
+
+        :param customer_id: the customer id to match against
+        :type customer_id: str
+
+        :return: a collection of Orders
+        :rtype: list
+
+        """
+        logger.info("Processing customer_id query for %s ...", customer_id)
+        return cls.query.filter(cls.customer_id == customer_id)
+
+    @classmethod
+    def find_by_status(cls, status: str) -> list:
+        """Returns all Orders owned by order status
+
+        :param status: the status to match against
+        :type status: str
+        :return: a collection of Orders
+        :rtype: list
+
+        """
+        logger.info("Processing status query for %s ...", status)
+        status_enum = OrderStatus[status]
+        return cls.query.filter(cls.status == status_enum)
+
+    @classmethod
+    def stats(cls, group_by: str, created_from=None, created_to=None, limit=None) -> list:
+        """Counts Orders and Items and sums revenue per group in the database
+
+        Orders grouped by status or day are summed from their maintained
+        totals. Grouping by product_id joins the Items of the Orders. The
+        archived Orders are counted along with the live ones.
+
+        :param group_by: one of STATS_GROUPS
+        :type group_by: str
+        :param created_from: only count Orders created on or after this date
+        :type created_from: date
+        :param created_to: only count Orders created on or before this date
+        :type created_to: date
+        :param limit: the maximum number of groups to return
+        :type limit: int
+
+        :return: a list of dictionaries with key, orders, items and revenue
+        :rtype: list
+
+        """
+        logger.info("Processing stats by %s from %s to %s", group_by, created_from, created_to)
+        if group_by not in STATS_GROUPS:
+            raise DataValidationError(f"Invalid group_by: {group_by}")
+        # the archive models import this module, so read their tables from the metadata
+        order_archive = db.metadata.tables["order_archive"]
+        item_archive = db.metadata.tables["item_archive"]
+        # pylint: disable=not-callable
+        if group_by == "product_id":
+            names = ("order_id", "id", "product_id", "quantity", "price")
+            live = select(*(getattr(Item, name) for name in names), cls.created_at).join(
+                cls, cls.id == Item.order_id
+            )
+            archived = select(*(item_archive.c[name] for name in names), order_archive.c.created_at).join(
+                order_archive, order_archive.c.id == item_archive.c.order_id
+            )
+        else:
+            names = ("created_at", "status", "item_count", "total_amount")
+            live = select(*(getattr(cls, name) for name in names))
+            archived = select(*(order_archive.c[name] for name in names))
+        rows = union_all(
+            _created_between(live, cls.created_at, created_from, created_to),
+            _created_between(archived, order_archive.c.created_at, created_from, created_to),
+        ).subquery()
+        if group_by == "product_id":
+            key = rows.c.product_id
+            revenue = func.sum(rows.c.quantity * rows.c.price)
+            query = select(
+                key, func.count(func.distinct(rows.c.order_id)), func.count(rows.c.id), func.coalesce(revenue, 0.0)
+            ).order_by(revenue.desc(), key)
+        else:
+            key = rows.c.status if group_by == "status" else rows.c.created_at
+            query = select(
+                key,
+                func.count(),
+                func.coalesce(func.sum(rows.c.item_count), 0),
+                func.coalesce(func.sum(rows.c.total_amount), 0.0),
+            ).order_by(key)
+        query = query.group_by(key).limit(limit)
+        return [
+            {
+                "key": getattr(value, "name", str(value)),
+                "orders": orders,
+                "items": items,
+                "revenue": revenue,
+            }
+            for value, orders, items, revenue in db.session.execute(query).all()
+        ]
+
+
+def _created_between(query, created_at, created_from=None, created_to=None):
+    """Adds the optional bounds of a date range on created_at to a query"""
+    if created_from:
+        query = query.where(created_at >= created_from)
+    if created_to:
+        query = query.where(created_at <= created_to)
+    return query
+
+
+def _order_status(name: str) -> OrderStatus:
+    """Converts a status name in any case to an OrderStatus"""
+    try:
+        return OrderStatus[name.upper()]
+    except KeyError as error:
+        raise DataValidationError(f"Invalid status: {name}") from error
+
+
+def _days_ago(days: int) -> date:
+    """Returns the date a number of days before today"""
+    return date.today() - timedelta(days=days)
+
+
+# the filters of Order.filter_conditions(): the argument, the column it is
+# compared to, the comparison and how the argument becomes a column value
+# (None when it is one already)
+ORDER_FILTERS = (
+    ("ids", "id", lambda column, ids: column.in_(ids), list),
+    ("customer_id", "customer_id", operator.eq, str),
+    ("status", "status", operator.eq, _order_status),
+    ("older_than_days", "created_at", operator.lt, _days_ago),
+    ("created_from", "created_at", operator.ge, None),
+    ("created_to", "created_at", operator.le, None),
+    ("min_total", "total_amount", operator.ge, float),
+    ("max_total", "total_amount", operator.le, float),
+)
+
+STATS_GROUPS = ("status", "day", "product_id")
+
+
+def _search_query(terms: str):
+    """Returns a tsquery for web search style terms"""
+    # the configuration is inlined so that the planner can use the GIN indexes
+    return func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), terms)
+
+
+######################################################################
+#  O R D E R   T O T A L S
+######################################################################
+def _refresh_totals(session, flush_context):  # pylint: disable=unused-argument
+    """Refreshes the totals of every Order whose Items were flushed
+
+    This runs inside the flush so the totals are written in the same
+    transaction as the Items, whichever code path changed them.
+    """
+    order_ids = set()
+    for item in chain(session.new, session.dirty, session.deleted):
+        if isinstance(item, Item):
+            history = inspect(item).attrs.order_id.history
+            order_ids.update(history.sum())
+    order_ids.discard(None)
+    if order_ids:
+        Order.refresh_totals(session.connection(), order_ids)
+        session.info.setdefault("refreshed_orders", set()).update(order_ids)
+
+
+def _expire_totals(session, flush_context):  # pylint: disable=unused-argument
+    """Makes loaded Orders read their refreshed totals from the database"""
+    order_ids = session.info.pop("refreshed_orders", set())
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Order) and obj.id in order_ids:
+            session.expire(obj, ["total_amount", "item_count"])
+
+
+event.listen(db.session, "after_flush", _refresh_totals)
+event.listen(db.session, "after_flush_postexec", _expire_totals)
+
+
+######################################################################
+#  O U T B O X   E V E N T S
+######################################################################
+def _order_events(session):
+    """Yields the id and event type of every Order that was flushed"""
+    for obj in session.new:
+        if isinstance(obj, Order):
+            yield obj.id, OrderEvent.CREATED
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            yield obj.id, OrderEvent.DELETED
+    for obj in session.dirty:
+        if isinstance(obj, Order) and session.is_modified(obj, include_collections=False):
+            changed = inspect(obj).attrs.status.history.has_changes()
+            yield obj.id, OrderEvent.STATUS if changed else OrderEvent.UPDATED
+
+
+def _item_events(session):
+    """Yields an update of every Order whose Items were flushed"""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Item):
+            for order_id in inspect(obj).attrs.order_id.history.sum():
+                yield order_id, OrderEvent.UPDATED
+
+
+def _record_events(session, flush_context):  # pylint: disable=unused-argument
+    """Writes the outbox events of the Orders and Items that were flushed
+
+    This runs after _refresh_totals() so the payloads hold the new totals.
+    Statements that bypass the ORM call OrderEvent.record() themselves.
+    Each Order gets the single event that comes first in EVENT_PRECEDENCE.
+    """
+    events = {}
+    for order_id, event_type in chain(_order_events(session), _item_events(session)):
+        current = events.get(order_id, OrderEvent.UPDATED)
+        events[order_id] = min(current, event_type, key=EVENT_PRECEDENCE.index)
+    events.pop(None, None)
+    for event_type in EVENT_PRECEDENCE:
+        OrderEvent.record(
+            session.connection(),
+            event_type,
+            [order_id for order_id, kind in events.items() if kind == event_type],
+        )
+
+
+event.listen(db.session, "after_flush", _record_events)
+
+
+######################################################################
+#  P A R T I T I O N S
+######################################################################
+def _copy_partition_key(mapper, connection, target):  # pylint: disable=unused-argument
+    """Copies created_at of the Order into a new Item before it is inserted
+
+    Rows are routed to a partition before any trigger could fill the key in,
+    so it has to be part of the INSERT itself.
+    """
+    if target.order_created_at is None:
+        target.order_created_at = connection.scalar(
+            select(Order.created_at).where(Order.id == target.order_id)
+        )
+
+
+if PARTITIONED:
+    event.listen(Item, "before_insert", _copy_partition_key)
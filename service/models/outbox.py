@@ -0,0 +1,166 @@
+"""
+Outbox model
+
+Order change events written in the same transaction as the change, read
+back by the change feed and sent to the status stream
+"""
+
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import cast, delete, func, select, text, tuple_
+from .base import db, logger, DataValidationError, ORDER_SUMMARY_COLUMNS, decode_cursor, encode_cursor
+
+
+class OrderEvent(db.Model):
+    """
+    Class that represents a change of an Order in the transactional outbox
+
+    Events are written in the same transaction as the change they describe
+    and read back in order by the change feed. Events are ordered by the
+    transaction that wrote them and then by id. The feed only returns events
+    of transactions older than every running one, so an event can never
+    appear behind a cursor that was already handed out.
+    """
+
+    __tablename__ = "order_event"
+
+    ##################################################
+    # Table Schema
+    ##################################################
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    # the 64 bit id of the writing transaction
+    xid = db.Column(
+        db.BigInteger, nullable=False, server_default=text("(pg_current_xact_id()::text::bigint)")
+    )
+    # no foreign key, the events of a deleted Order are kept
+    order_id = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(16), nullable=False)
+    payload = db.Column(JSONB, nullable=False)
+    created_at = db.Column(
+        db.DateTime(timezone=True), nullable=False, server_default=func.now(), index=True  # pylint: disable=not-callable
+    )
+
+    __table_args__ = (db.Index("ix_order_event_xid_id", "xid", "id"),)
+
+    CREATED = "created"
+    UPDATED = "updated"
+    STATUS = "status"
+    DELETED = "deleted"
+    ARCHIVED = "archived"
+    TYPES = (CREATED, UPDATED, STATUS, DELETED, ARCHIVED)
+
+    def __repr__(self):
+        return f"<OrderEvent id=[{self.id}] type=[{self.type}]>"
+
+    def serialize(self):
+        """Serializes an OrderEvent into a dictionary"""
+        return {
+            "id": self.id,
+            "order_id": self.order_id,
+            "type": self.type,
+            "payload": self.payload,
+            "created_at": self.created_at,
+        }
+
+    ##################################################
+    # CLASS METHODS
+    ##################################################
+
+    @classmethod
+    def record(cls, connection, event_type: str, order_ids):
+        """Writes one event per Order in the transaction of a connection
+
+        The payload holds the columns of the Order as they are now, except
+        for deleted Orders whose payload only holds the id. Status changes
+        are also sent to the STATUS_CHANNEL with NOTIFY.
+
+        :param connection: a SQLAlchemy connection in the current transaction
+        :param event_type: one of TYPES
+        :param order_ids: the ids of the changed Orders
+        :type order_ids: iterable
+
+        """
+        for sql, parameters in cls.record_statements(event_type, order_ids):
+            connection.exec_driver_sql(sql, parameters)
+
+    @classmethod
+    def record_statements(cls, event_type: str, order_ids) -> list:
+        """Returns the SQL and parameters that record() executes
+
+        An async connection can execute them with exec_driver_sql() too.
+        """
+        order_ids = sorted(set(order_ids))
+        if not order_ids:
+            return []
+        sql = OUTBOX_DELETED_SQL if event_type == cls.DELETED else OUTBOX_SQL
+        statements = [(sql, {"type": event_type, "ids": order_ids})]
+        if event_type == cls.STATUS:
+            # delivered to the status stream listeners on commit
+            statements.append((STATUS_NOTIFY_SQL, {"ids": order_ids}))
+        return statements
+
+    @classmethod
+    def changes(cls, cursor: str = None, limit: int = 100) -> tuple:
+        """Returns the events after a cursor in the order they were written
+
+        :param cursor: the next_cursor of the previous call, None starts
+                       at the oldest event that was kept
+        :type cursor: str
+        :param limit: the maximum number of events to return
+        :type limit: int
+
+        :return: the events and the cursor to continue from, which is the
+                 given cursor when there are no new events
+        :rtype: tuple
+
+        """
+        horizon = cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), db.Text), db.BigInteger)
+        query = select(cls).where(cls.xid < horizon).order_by(cls.xid, cls.id).limit(limit)
+        if cursor:
+            query = query.where(tuple_(cls.xid, cls.id) > decode_cursor(cursor, "changes"))
+        events = db.session.scalars(query).all()
+        if not events:
+            return events, cursor
+        return events, encode_cursor(events[-1].xid, events[-1].id, "changes")
+
+    @classmethod
+    def purge(cls, days: int) -> int:
+        """Deletes the events older than a number of days
+
+        :return: the number of events that were deleted
+        :rtype: int
+
+        """
+        logger.info("Purging order events older than %d days", days)
+        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+        try:
+            result = db.session.execute(delete(cls).where(cls.created_at < cutoff))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error purging order events")
+            raise DataValidationError(e) from e
+        return result.rowcount
+
+
+# plain SQL so that the COPY loader can write events with a psycopg cursor
+OUTBOX_SQL = (
+    "INSERT INTO order_event (order_id, type, payload) "
+    "SELECT id, %(type)s, jsonb_build_object("
+    + ", ".join(f"'{name}', {name}" for name in ORDER_SUMMARY_COLUMNS)
+    + ') FROM "order" WHERE id = ANY(%(ids)s)'
+)
+OUTBOX_DELETED_SQL = (
+    "INSERT INTO order_event (order_id, type, payload) "
+    "SELECT id, %(type)s, jsonb_build_object('id', id) FROM unnest(%(ids)s::integer[]) AS id"
+)
+
+# channel of the status stream, see service/common/status_hub.py
+STATUS_CHANNEL = "order_status"
+STATUS_NOTIFY_SQL = (
+    f"SELECT pg_notify('{STATUS_CHANNEL}', json_build_object('id', id, 'status', status)::text) "
+    'FROM "order" WHERE id = ANY(%(ids)s)'
+)
+
+# events that replace others for the same Order within one flush
+EVENT_PRECEDENCE = (OrderEvent.DELETED, OrderEvent.CREATED, OrderEvent.STATUS, OrderEvent.UPDATED)
@@ -0,0 +1,126 @@
+"""
+Daily rollup models
+
+Materialized views with one row per day and status or product. They are
+created by the migrations, rebuilt by StatsRollup.refresh() and read by
+the reporting API.
+"""
+
+from datetime import datetime, timezone
+from sqlalchemy import column, func, select, table, text
+from .base import db, logger, DataValidationError
+from .order import STATS_GROUPS
+
+
+ORDER_DAILY_STATS = table(
+    "order_daily_stats",
+    column("day"),
+    column("status"),
+    column("orders"),
+    column("items"),
+    column("revenue"),
+)
+PRODUCT_DAILY_STATS = table(
+    "product_daily_stats",
+    column("day"),
+    column("product_id"),
+    column("orders"),
+    column("items"),
+    column("revenue"),
+)
+
+
+class StatsRollup(db.Model):
+    """
+    Class that records when a daily rollup view was last refreshed
+    """
+
+    __tablename__ = "stats_rollup"
+
+    ##################################################
+    # Table Schema
+    ##################################################
+    name = db.Column(db.String(64), primary_key=True)
+    refreshed_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    VIEWS = ("order_daily_stats", "product_daily_stats")
+
+    def __repr__(self):
+        return f"<StatsRollup name=[{self.name}]>"
+
+    ##################################################
+    # CLASS METHODS
+    ##################################################
+
+    @classmethod
+    def refresh(cls, concurrently: bool = True) -> datetime:
+        """Rebuilds the daily rollup views
+
+        A concurrent refresh does not block the reporting API while the
+        views are rebuilt but cannot run on a view that was never filled.
+
+        :param concurrently: refresh without locking out readers
+        :type concurrently: bool
+
+        :return: the time of the refresh
+        :rtype: datetime
+
+        """
+        logger.info("Refreshing daily rollups ...")
+        refreshed_at = datetime.now(timezone.utc)
+        option = " CONCURRENTLY" if concurrently else ""
+        try:
+            for name in cls.VIEWS:
+                db.session.execute(text(f"REFRESH MATERIALIZED VIEW{option} {name}"))
+                db.session.merge(cls(name=name, refreshed_at=refreshed_at))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error refreshing daily rollups")
+            raise DataValidationError(e) from e
+        return refreshed_at
+
+    @classmethod
+    def last_refresh(cls):
+        """Returns when the least recently refreshed rollup was refreshed, None if one never was"""
+        query = select(func.min(cls.refreshed_at), func.count())  # pylint: disable=not-callable
+        refreshed_at, count = db.session.execute(query).one()
+        return refreshed_at if count == len(cls.VIEWS) else None
+
+    @classmethod
+    def stats(cls, group_by: str, created_from=None, created_to=None, limit=None) -> list:
+        """Reads the statistics of Order.stats() from the daily rollups
+
+        :param group_by: one of STATS_GROUPS
+        :type group_by: str
+        :param created_from: only count days on or after this date
+        :type created_from: date
+        :param created_to: only count days on or before this date
+        :type created_to: date
+        :param limit: the maximum number of groups to return
+        :type limit: int
+
+        :return: a list of dictionaries with key, orders, items and revenue
+        :rtype: list
+
+        """
+        logger.info("Processing rollup stats by %s from %s to %s", group_by, created_from, created_to)
+        if group_by not in STATS_GROUPS:
+            raise DataValidationError(f"Invalid group_by: {group_by}")
+        view = PRODUCT_DAILY_STATS if group_by == "product_id" else ORDER_DAILY_STATS
+        key = view.c[group_by]
+        revenue = func.sum(view.c.revenue)
+        query = select(key, func.sum(view.c.orders), func.sum(view.c.get("items")), revenue)
+        if created_from:
+            query = query.where(view.c.day >= created_from)
+        if created_to:
+            query = query.where(view.c.day <= created_to)
+        if group_by == "product_id":
+            query = query.order_by(revenue.desc(), key)
+        else:
+            query = query.order_by(key)
+        query = query.group_by(key).limit(limit)
+        return [
+            {"key": str(value), "orders": orders, "items": items, "revenue": revenue}
+            for value, orders, items, revenue in db.session.execute(query).all()
+        ]
@@ -0,0 +1,189 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Order Change Routes
+
+The change feed and the status stream of the orders, both read from the
+order outbox
+"""
+import json
+import time
+from flask import Response, abort
+from flask import current_app as app  # Import Flask application
+from flask_restx import Resource, fields, reqparse, inputs
+from service.models import db, Order, OrderEvent
+from service.common import status  # HTTP Status Codes
+from service.common.status_hub import hub, SubscriberLimitError
+from service.routes import id_list
+from . import api
+
+
+change_args = reqparse.RequestParser()
+change_args.add_argument(
+    "cursor",
+    type=str,
+    location="args",
+    required=False,
+    help="The next_cursor of the previous call, omit to start at the oldest event",
+)
+change_args.add_argument(
+    "limit",
+    type=inputs.int_range(1, 1000),
+    location="args",
+    required=False,
+    default=100,
+    help="Return at most this many events",
+)
+change_args.add_argument(
+    "wait",
+    type=inputs.natural,
+    location="args",
+    required=False,
+    default=0,
+    help="Wait up to this many seconds for an event when there is none",
+)
+
+status_stream_args = reqparse.RequestParser()
+status_stream_args.add_argument(
+    "ids",
+    type=id_list,
+    location="args",
+    required=False,
+    help="Watch the Orders with these comma separated ids, omit to watch every Order",
+)
+
+change_event_model = api.model(
+    "ChangeEventModel",
+    {
+        "id": fields.Integer(description="The ID of the event"),
+        "order_id": fields.Integer(description="The ID of the changed Order"),
+        "type": fields.String(enum=list(OrderEvent.TYPES), description="The kind of change"),
+        "payload": fields.Raw(description="The Order after the change, only its id once deleted"),
+        "created_at": fields.DateTime(),
+    },
+)
+
+change_feed_model = api.model(
+    "ChangeFeedModel",
+    {
+        "events": fields.List(fields.Nested(change_event_model)),
+        "next_cursor": fields.String(description="Pass as cursor to get the following events"),
+    },
+)
+
+
+######################################################################
+#  PATH: /orders/changes
+######################################################################
+@api.route("/orders/changes")
+class OrderChanges(Resource):
+    """Streams the changes of the orders
+    GET /orders/changes?cursor= - Return the events written after the cursor, in order,
+    waiting up to wait seconds for one when there is none
+    """
+
+    @api.doc("list_order_changes")
+    @api.response(400, "Invalid cursor")
+    @api.expect(change_args, validate=True)
+    @api.marshal_with(change_feed_model)
+    def get(self):
+        """Returns the order events after a cursor"""
+        args = change_args.parse_args()
+        deadline = time.monotonic() + min(args["wait"], app.config["CHANGE_FEED_MAX_WAIT"])
+        while True:
+            events, next_cursor = OrderEvent.changes(args["cursor"], args["limit"])
+            # end the transaction so that the next poll sees new events
+            db.session.rollback()
+            if events or time.monotonic() >= deadline:
+                break
+            time.sleep(app.config["CHANGE_FEED_POLL_INTERVAL"])
+        app.logger.info("Returning %d order events", len(events))
+        return (
+            {"events": [event.serialize() for event in events], "next_cursor": next_cursor},
+            status.HTTP_200_OK,
+        )
+
+
+######################################################################
+#  PATH: /orders/status-stream
+######################################################################
+@api.route("/orders/status-stream")
+class OrderStatusStream(Resource):
+    """Pushes the status changes of orders
+    GET /orders/status-stream?ids= - Server-Sent Events with the current status of the
+    given orders followed by every status change as it is committed
+    """
+
+    @api.doc("stream_order_status", produces=["text/event-stream"])
+    @api.response(400, "Invalid or too many ids")
+    @api.response(503, "The status listener is not connected or too many streams are open")
+    @api.expect(status_stream_args, validate=True)
+    def get(self):
+        """Streams status changes as Server-Sent Events
+
+        Changes are not replayed after a reconnect, use /orders/changes for that.
+        The ASGI application serves the stream on its event loop. Under wsgi:app
+        every open stream holds a worker thread, so each worker serves at most
+        STATUS_STREAM_MAX_THREADS of them and answers 503 past that.
+        """
+        ids = status_stream_args.parse_args()["ids"]
+        if ids and len(ids) > app.config["LOOKUP_MAX_IDS"]:
+            abort(
+                status.HTTP_400_BAD_REQUEST,
+                f"At most {app.config['LOOKUP_MAX_IDS']} orders can be watched at once",
+            )
+        dsn = db.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        try:
+            subscription = hub.subscribe(
+                dsn,
+                ids,
+                app.config["STATUS_STREAM_QUEUE_SIZE"],
+                max_subscribers=app.config["STATUS_STREAM_MAX_THREADS"],
+            )
+        except (ConnectionError, SubscriberLimitError) as error:
+            abort(status.HTTP_503_SERVICE_UNAVAILABLE, str(error))
+        # read after subscribing so that no change falls in between
+        current = Order.statuses(ids) if ids else []
+        # give the connection back to the pool for as long as the stream is open
+        db.session.close()
+        heartbeat = app.config["STATUS_STREAM_HEARTBEAT"]
+        app.logger.info("Streaming the status of %s orders", len(ids) if ids else "all")
+
+        def events():
+            try:
+                for change in current:
+                    yield server_sent_event("status", change)
+                while True:
+                    change = subscription.get(heartbeat)
+                    if subscription.overflowed:
+                        # the client reconnects and reads the current status again
+                        yield server_sent_event("reset", {})
+                        return
+                    yield server_sent_event("status", change) if change else ": keepalive\n\n"
+            finally:
+                hub.unsubscribe(subscription)
+
+        return Response(
+            events(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+
+def server_sent_event(name: str, data: dict) -> str:
+    """Formats an event of a Server-Sent Events stream"""
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
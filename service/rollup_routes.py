@@ -0,0 +1,125 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Order Statistics Routes
+
+Counts and revenue of the orders read from the daily rollups
+"""
+from flask import abort
+from flask import current_app as app  # Import Flask application
+from flask_restx import Resource, fields, reqparse, inputs
+from service.models import Order, StatsRollup, STATS_GROUPS
+from service.common import status  # HTTP Status Codes
+from . import api
+
+
+stats_args = reqparse.RequestParser()
+stats_args.add_argument(
+    "group_by",
+    type=str,
+    location="args",
+    required=True,
+    choices=STATS_GROUPS,
+    help="Group the statistics by status, day or product_id",
+)
+stats_args.add_argument(
+    "created_from",
+    type=inputs.date,
+    location="args",
+    required=False,
+    help="Only count Orders created on or after this date (YYYY-MM-DD)",
+)
+stats_args.add_argument(
+    "created_to",
+    type=inputs.date,
+    location="args",
+    required=False,
+    help="Only count Orders created on or before this date (YYYY-MM-DD)",
+)
+stats_args.add_argument(
+    "limit",
+    type=inputs.positive,
+    location="args",
+    required=False,
+    help="Return at most this many groups",
+)
+stats_args.add_argument(
+    "live",
+    type=inputs.boolean,
+    location="args",
+    required=False,
+    default=False,
+    help="Compute from the order tables instead of the daily rollups",
+)
+
+stats_row_model = api.model(
+    "StatsRowModel",
+    {
+        "key": fields.String(description="The status, day or product_id of the group"),
+        "orders": fields.Integer(description="The number of Orders in the group"),
+        "items": fields.Integer(description="The number of Items in the group"),
+        "revenue": fields.Float(description="The sum of quantity * price in the group"),
+    },
+)
+
+stats_model = api.model(
+    "StatsModel",
+    {
+        "group_by": fields.String(enum=list(STATS_GROUPS)),
+        "rows": fields.List(fields.Nested(stats_row_model)),
+        "refreshed_at": fields.DateTime(
+            description="When the daily rollups were refreshed, null for live statistics"
+        ),
+    },
+)
+
+
+######################################################################
+#  PATH: /orders/stats
+######################################################################
+@api.route("/orders/stats")
+class OrderStats(Resource):
+    """Reports on the orders
+    GET /orders/stats?group_by=status|day|product_id - Counts and revenue per group
+    read from the daily rollups, or from the order tables with live=true and
+    before the rollups were first refreshed
+    """
+
+    @api.doc("order_stats")
+    @api.response(400, "Invalid arguments")
+    @api.expect(stats_args, validate=True)
+    @api.marshal_with(stats_model)
+    def get(self):
+        """Returns the number of orders, items and the revenue per group"""
+        args = stats_args.parse_args()
+        app.logger.info("Request for order stats with %s", args)
+        if args["created_from"] and args["created_to"] and args["created_from"] > args["created_to"]:
+            abort(status.HTTP_400_BAD_REQUEST, "created_from must not be after created_to")
+        # the daily rollups are cheap to read but only as fresh as their last
+        # refresh, and empty until the first one, so count live until then
+        refreshed_at = None if args["live"] else StatsRollup.last_refresh()
+        source = StatsRollup if refreshed_at else Order
+        rows = source.stats(
+            args["group_by"],
+            created_from=args["created_from"] and args["created_from"].date(),
+            created_to=args["created_to"] and args["created_to"].date(),
+            limit=args["limit"],
+        )
+        return (
+            {"group_by": args["group_by"], "rows": rows, "refreshed_at": refreshed_at},
+            status.HTTP_200_OK,
+        )
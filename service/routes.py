@@ -25,12 +25,18 @@ from flask import jsonify, request, abort
 from flask import current_app as app  # Import Flask application
 
 # from flask_restx import Resource
-from flask_restx import Resource, fields, reqparse
+from flask_restx import Resource, fields, reqparse, inputs, marshal
 
 # pyl disable=cyclic-import
-from service.models import Order, Item, OrderStatus
+from service.models import (
+    Order,
+    Item,
+    OrderStatus,
+    OrderArchive,
+)
 from service.common import status  # HTTP Status Codes
-from .models import db
+from service.common import idempotency
+from service.common.readiness import readiness
 from . import api
 
 logger = logging.getLogger("flask.app")
@@ -53,6 +59,18 @@ def health_check():
     return jsonify(status=200, message="Healthy"), status.HTTP_200_OK
 
 
+######################################################################
+# READINESS CHECK
+######################################################################
+@app.route("/ready")
+def readiness_check():
+    """Let them know when this worker has its database connections open"""
+    if not readiness.ready:
+        readiness.start()
+        return jsonify(status=503, message="Not ready"), status.HTTP_503_SERVICE_UNAVAILABLE
+    return jsonify(status=200, message="Ready"), status.HTTP_200_OK
+
+
 ######################################################################
 # GET INDEX
 ######################################################################
@@ -119,6 +137,12 @@ order_model = api.inherit(
         ),
         "created_at": fields.Date(),
         "updated_at": fields.Date(),
+        "total_amount": fields.Float(
+            readOnly=True, description="The sum of quantity * price over the items"
+        ),
+        "item_count": fields.Integer(
+            readOnly=True, description="The number of items in the Order"
+        ),
     },
 )
 
@@ -133,44 +157,224 @@ status_update_model = api.model(
     },
 )
 
-# query string arguments
-item_args = reqparse.RequestParser()
-item_args.add_argument(
-    "product_id",
+order_patch_model = api.model(
+    "OrderPatchModel",
+    {
+        "shipping_address": fields.String(description="The new shipping address"),
+        "status": fields.String(
+            enum=[OrderStatus.CREATED.name, OrderStatus.PROCESSING.name],
+            description="The new status of the Order",
+        ),
+    },
+)
+
+order_summary_model = api.model(
+    "OrderSummaryModel",
+    {
+        "id": fields.Integer(readOnly=True),
+        "customer_id": fields.Integer(),
+        "shipping_address": fields.String(),
+        "created_at": fields.Date(),
+        "status": fields.String(enum=[e.name for e in OrderStatus]),
+        "total_amount": fields.Float(readOnly=True),
+        "item_count": fields.Integer(readOnly=True),
+    },
+)
+
+# keys the Order list can be sorted by, a leading - sorts in descending order
+SORT_CHOICES = [prefix + key for key in Order.SORT_KEYS for prefix in ("", "-")]
+
+
+def status_name(value):
+    """Parses an Order status name in any case"""
+    try:
+        return OrderStatus[value.upper()].name
+    except KeyError as error:
+        names = ", ".join(order_status.name for order_status in OrderStatus)
+        raise ValueError(f"status must be one of {names}") from error
+
+
+order_args = reqparse.RequestParser()
+order_args.add_argument(
+    "customer_id",
     type=int,
     location="args",
     required=False,
-    help="List Items with a specific product id",
+    help="List Orders from a specific customer",
+)
+order_args.add_argument(
+    "status",
+    type=status_name,
+    location="args",
+    required=False,
+    help="List Orders with a specific Order status",
 )
-item_args.add_argument(
-    "quantity",
-    type=int,
+order_args.add_argument(
+    "status_name",
+    type=status_name,
     location="args",
     required=False,
-    help="List Items with a specific quantity",
+    help="Same as status",
 )
-item_args.add_argument(
-    "price",
+order_args.add_argument(
+    "created_from",
+    type=inputs.date,
+    location="args",
+    required=False,
+    help="List Orders created on or after this date (YYYY-MM-DD)",
+)
+order_args.add_argument(
+    "created_to",
+    type=inputs.date,
+    location="args",
+    required=False,
+    help="List Orders created on or before this date (YYYY-MM-DD)",
+)
+order_args.add_argument(
+    "min_total",
     type=float,
     location="args",
     required=False,
-    help="List Items with a specific price",
+    help="List Orders with a total_amount of at least this much",
+)
+order_args.add_argument(
+    "max_total",
+    type=float,
+    location="args",
+    required=False,
+    help="List Orders with a total_amount of at most this much",
+)
+order_args.add_argument(
+    "sort",
+    type=str,
+    location="args",
+    required=False,
+    choices=SORT_CHOICES,
+    help="Sort Orders by this key, prefix with - for descending order",
 )
 
-order_args = reqparse.RequestParser()
 order_args.add_argument(
+    "q",
+    type=str,
+    location="args",
+    required=False,
+    help="List Orders whose address or item descriptions match these words, best match first",
+)
+
+order_page_args = reqparse.RequestParser()
+order_page_args.add_argument(
+    "limit",
+    type=inputs.int_range(1, 1000),
+    location="args",
+    required=False,
+    help="Return at most this many Orders, the next page is in the Link header",
+)
+order_page_args.add_argument(
+    "cursor",
+    type=str,
+    location="args",
+    required=False,
+    help="The X-Next-Cursor of the previous page",
+)
+
+
+order_count_args = reqparse.RequestParser()
+order_count_args.add_argument(
+    "estimate",
+    type=inputs.boolean,
+    location="args",
+    required=False,
+    default=False,
+    help="Use the planner statistics instead of counting when there are no filters",
+)
+
+
+def order_list_conditions(args: dict) -> list:
+    """Returns the filter expressions for the order list query string"""
+    if args["customer_id"] is not None:
+        app.logger.info("Find by customer_id: %s", args["customer_id"])
+    # status_name is kept for older clients
+    order_status = args["status"] or args["status_name"]
+    if order_status:
+        app.logger.info("Find by status: %s", order_status)
+    return Order.filter_conditions(
+        {
+            "customer_id": args["customer_id"],
+            "status": order_status,
+            "created_from": args["created_from"] and args["created_from"].date(),
+            "created_to": args["created_to"] and args["created_to"].date(),
+            "min_total": args["min_total"],
+            "max_total": args["max_total"],
+        }
+    )
+
+
+def id_list(value):
+    """Parses a comma separated list of ids"""
+    try:
+        return [int(order_id) for order_id in value.split(",") if order_id.strip()]
+    except ValueError as error:
+        raise ValueError("ids must be a comma separated list of integers") from error
+
+
+order_delete_args = reqparse.RequestParser()
+order_delete_args.add_argument(
+    "ids",
+    type=id_list,
+    location="args",
+    required=False,
+    help="Delete Orders with these comma separated ids",
+)
+order_delete_args.add_argument(
     "customer_id",
     type=int,
     location="args",
     required=False,
-    help="List Orders from a specific customer",
+    help="Delete Orders from a specific customer",
 )
-order_args.add_argument(
+order_delete_args.add_argument(
     "status",
-    type=str,
+    type=status_name,
     location="args",
     required=False,
-    help="List Orders with a specific Order status",
+    help="Delete Orders with a specific Order status",
+)
+order_delete_args.add_argument(
+    "older_than_days",
+    type=inputs.natural,
+    location="args",
+    required=False,
+    help="Delete Orders created more than this many days ago",
+)
+order_delete_args.add_argument(
+    "all",
+    type=inputs.boolean,
+    location="args",
+    required=False,
+    default=False,
+    help="Must be true to delete every Order when no other filter is given",
+)
+
+delete_count_model = api.model(
+    "DeleteCountModel",
+    {"deleted": fields.Integer(description="The number of Orders deleted")},
+)
+
+lookup_model = api.model(
+    "LookupModel",
+    {
+        "ids": fields.List(
+            fields.Integer, required=True, description="The ids of the Orders to return"
+        ),
+    },
+)
+
+lookup_result_model = api.model(
+    "LookupResultModel",
+    {
+        "orders": fields.Raw(description="The Orders that were found keyed by id"),
+        "missing": fields.List(fields.Integer, description="The ids that were not found"),
+    },
 )
 
 ######################################################################
@@ -184,32 +388,37 @@ order_args.add_argument(
 
 @api.route("/orders")
 class OrderCollection(Resource):
-    """Allows listing or creating orders
+    """Allows listing, counting, creating or deleting orders
     GET /orders - Returns all orders
-    POST /orders - Create an order depending on the data in body
+    HEAD /orders - Returns the number of orders in the X-Total-Count header
+    POST /orders - Create an order depending on the data in body, once per Idempotency-Key
+    DELETE /orders - Delete every order matching the query string filters
     """
 
     @api.doc("list_orders")
-    @api.expect(order_args, validate=True)
+    @api.expect(order_args, order_page_args, validate=True)
     @api.marshal_list_with(order_model)
     def get(self):
         """Returns all orders"""
         app.logger.info("Request for order list")
-
-        orders = []
-        # Parse any arguments from the query string
-        customer_id = request.args.get("customer_id")
-        status_name = request.args.get("status_name")
-
-        if customer_id:
-            app.logger.info("Find by customer_id: %s", customer_id)
-            orders = Order.find_by_customer_id(customer_id)
-        elif status_name:
-            app.logger.info("Find by status: %s", status_name)
-            orders = Order.find_by_status(status_name)
+        args = order_args.parse_args()
+        page = order_page_args.parse_args()
+        if args["q"]:
+            if args["sort"]:
+                abort(status.HTTP_400_BAD_REQUEST, "Search results are sorted by rank")
+            orders, next_cursor = Order.search(
+                args["q"],
+                *order_list_conditions(args),
+                limit=page["limit"],
+                cursor=page["cursor"],
+            )
         else:
-            app.logger.info("Find all")
-            orders = Order.all()
+            orders, next_cursor = Order.page(
+                *order_list_conditions(args),
+                sort=args["sort"] or "id",
+                limit=page["limit"],
+                cursor=page["cursor"],
+            )
 
         results = []
         for order in orders:
@@ -219,11 +428,61 @@ class OrderCollection(Resource):
             app.logger.info(res["id"])
         app.logger.info("Returning %d orders", len(results))
 
-        return results, status.HTTP_200_OK
+        headers = {}
+        if next_cursor:
+            query = request.args.to_dict()
+            query["cursor"] = next_cursor
+            next_url = api.url_for(OrderCollection, _external=True, **query)
+            headers = {"X-Next-Cursor": next_cursor, "Link": f'<{next_url}>; rel="next"'}
+        return results, status.HTTP_200_OK, headers
+
+    @api.doc("count_orders")
+    @api.expect(order_args, order_count_args, validate=True)
+    @api.response(200, "The count is in the X-Total-Count header")
+    def head(self):
+        """Counts the orders matching the filters without returning them
+
+        Like the list, the count only covers the live orders: archived
+        orders are left out.
+        """
+        args = order_args.parse_args()
+        estimate = order_count_args.parse_args()["estimate"]
+        conditions = order_list_conditions(args)
+        if args["q"]:
+            conditions.append(Order.search_match(args["q"]))
+        total, estimated = Order.count(*conditions, estimate=estimate)
+        app.logger.info("Counted %d orders (estimated: %s)", total, estimated)
+        headers = {"X-Total-Count": str(total)}
+        if estimated:
+            headers["X-Total-Count-Estimated"] = "true"
+        return "", status.HTTP_200_OK, headers
+
+    @api.doc("delete_orders")
+    @api.response(400, "No filter was given")
+    @api.expect(order_delete_args, validate=True)
+    @api.marshal_with(delete_count_model)
+    def delete(self):
+        """Deletes every order matching the filters in batches"""
+        args = order_delete_args.parse_args()
+        conditions = Order.filter_conditions(args)
+        if not conditions and not args["all"]:
+            abort(
+                status.HTTP_400_BAD_REQUEST,
+                "Give ids, customer_id, status or older_than_days, or all=true",
+            )
+        app.logger.info("Request to bulk delete orders with %s", args)
+        deleted = Order.delete_where(
+            *conditions, batch_size=app.config["BULK_DELETE_BATCH_SIZE"]
+        )
+        app.logger.info("Deleted %d orders", deleted)
+        return {"deleted": deleted}, status.HTTP_200_OK
 
     @api.doc("create_order")
+    @api.doc(params={idempotency.HEADER: {"in": "header", "description": "Makes retries of this request safe"}})
     @api.response(400, "Invalid data")
+    @api.response(409, "A request with the same Idempotency-Key is in progress or took over its key")
     @api.expect(order_create_model)
+    @idempotency.idempotent
     @api.marshal_with(order_model, code=201)
     def post(self):
         """This method creates an order given the items and their quantities"""
@@ -248,22 +507,19 @@ class OrderCollection(Resource):
         order_obj.shipping_address = data["shipping_address"]
         order_obj.status = OrderStatus[data["status"]]
 
-        order_obj.create()
-
-        app.logger.info("ORDER ID: ")
-        logger.error(order_obj.id)
-
         for item in data["items"]:
             new_item = Item(
-                order_id=order_obj.id,
                 product_id=item["product_id"],
                 quantity=item["quantity"],
                 price=item["price"],
                 product_description=item["product_description"],
             )
-            new_item.create()
             order_obj.items.append(new_item)
-        order_obj.update()
+        # @idempotent commits the Order and its Items with the response
+        order_obj.create(commit=False)
+
+        app.logger.info("ORDER ID: ")
+        logger.error(order_obj.id)
 
         logger.info("**************ACTUAL DATA************")
         logger.info(order_obj.items)
@@ -273,11 +529,54 @@ class OrderCollection(Resource):
         return (message, status.HTTP_201_CREATED)
 
 
+######################################################################
+#  PATH: /orders:lookup
+######################################################################
+@api.route("/orders:lookup")
+class OrderLookup(Resource):
+    """Returns many orders at once
+    POST /orders:lookup - Return the orders with the ids in the body
+    """
+
+    @api.doc("lookup_orders")
+    @api.response(400, "Invalid or too many ids")
+    @api.expect(lookup_model)
+    @api.response(200, "Success", lookup_result_model)
+    def post(self):
+        """Returns the orders with the given ids keyed by id"""
+        data = request.get_json(silent=True) or {}
+        ids = data.get("ids")
+        if not isinstance(ids, list) or not all(isinstance(order_id, int) for order_id in ids):
+            abort(status.HTTP_400_BAD_REQUEST, "ids must be a list of integers")
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > app.config["LOOKUP_MAX_IDS"]:
+            abort(
+                status.HTTP_400_BAD_REQUEST,
+                f"At most {app.config['LOOKUP_MAX_IDS']} ids can be looked up at once",
+            )
+        app.logger.info("Request to look up %d orders", len(ids))
+        orders = Order.find_many(ids)
+        missing = [order_id for order_id in ids if order_id not in orders]
+        if missing:
+            # completed orders are moved to the archive after a while
+            orders.update(OrderArchive.find_many(missing))
+            missing = [order_id for order_id in missing if order_id not in orders]
+        result = {
+            "orders": {
+                str(order_id): marshal(order.serialize(), order_model)
+                for order_id, order in orders.items()
+            },
+            "missing": missing,
+        }
+        return result, status.HTTP_200_OK
+
+
 @api.route("/orders/<int:order_id>")
 class OrderResource(Resource):
     """Class for the Order resource
     GET /orders/{order_id: int} - Return an order with order_id
     PUT /orders/{order_id: int} - Update an order with order_id
+    PATCH /orders/{order_id: int} - Update some fields of an order with order_id
     DELETE /orders/{order_id: int} - Delete an order with order_id
     """
 
@@ -291,6 +590,9 @@ class OrderResource(Resource):
             order_id (int): ID of the order
         """
         curr_order = Order.query.filter_by(id=int(order_id)).first()
+        if curr_order is None:
+            # completed orders are moved to the archive after a while
+            curr_order = OrderArchive.find(int(order_id))
         if curr_order is None:
             abort(status.HTTP_404_NOT_FOUND, description="Order not found")
         logger.info("Returning order details:")
@@ -357,227 +659,32 @@ class OrderResource(Resource):
 
         return message, status.HTTP_200_OK
 
+    @api.doc("patch_order")
+    @api.response(400, "Invalid data or the order cannot be updated")
+    @api.response(404, "The order was not found")
+    @api.expect(order_patch_model)
+    @api.marshal_with(order_summary_model)
+    def patch(self, order_id):
+        """Updates the given fields of an order without reading it first"""
+        message = Order.patch(order_id, request.get_json(silent=True))
+        if message is None:
+            abort(status.HTTP_404_NOT_FOUND, f"Order ID {order_id} not found")
+        return message, status.HTTP_200_OK
+
     @api.doc("delete_order")
     @api.response(204, "Order deleted successfully")
     def delete(self, order_id):
         """Delete an order given an order ID"""
         logger.info("Deleting order with ID: %s", order_id)
 
-        curr_order = Order.query.filter_by(id=order_id).first()
-
-        if curr_order:
-            logger.info("*************ORDER TO DELETE*********************")
-            logger.info(curr_order.serialize())
-            curr_order.delete()
+        # A single DELETE, the database cascades it to the items
+        if Order.delete_by_id(order_id):
             logger.info("Order deleted successfully")
 
         # Even if the order was not found, still return 204 No Content
         return "", status.HTTP_204_NO_CONTENT
 
 
-######################################################################
-#  PATH: /orders/{order_id:int}/items
-######################################################################
-
-
-@api.route("/orders/<int:order_id>/items")
-class ItemCollection(Resource):
-    """Class to handle Item collection operations"""
-
-    @api.doc("create_item")
-    @api.response(400, "Invalid Item data")
-    @api.expect(item_model)
-    @api.marshal_with(item_model, code=201)
-    def post(self, order_id):
-        """
-        Add a new item to an order.
-        """
-        app.logger.info("Request to add an item to order %s", order_id)
-
-        order = Order.query.get(int(order_id))
-        if not order:
-            abort(
-                status.HTTP_404_NOT_FOUND, f"Order with id '{order_id}' was not found."
-            )
-
-        item_data = request.get_json()
-        if not item_data:
-            abort(status.HTTP_400_BAD_REQUEST, "No data provided")
-
-        try:
-            new_item = Item(
-                order_id=order.id,
-                product_id=item_data["product_id"],
-                product_description=item_data["product_description"],
-                quantity=item_data["quantity"],
-                price=item_data["price"],
-            )
-            db.session.add(new_item)
-            db.session.commit()
-        except KeyError as e:
-            abort(status.HTTP_400_BAD_REQUEST, f"Missing field: {str(e)}")
-
-        response_data = new_item.serialize()
-
-        location_url = api.url_for(
-            ItemResource, order_id=order.id, item_id=new_item.id, _external=True
-        )
-
-        return (
-            response_data,
-            status.HTTP_201_CREATED,
-            {"Location": location_url},
-        )
-
-    @api.doc("list_order_items")
-    @api.marshal_list_with(item_model)
-    def get(self, order_id):
-        """Returns the list of items in an order"""
-        logger.info("ORDER ID %d", order_id)
-
-        order = Order.query.filter_by(id=int(order_id)).first()
-        if order is None:
-            abort(
-                status.HTTP_404_NOT_FOUND,
-                "Order not found for ID " + str(order_id) + " inside get",
-            )
-
-        # Add query parameters for filtering
-        product_id = request.args.get("product_id")
-        quantity = request.args.get("quantity")
-        price = request.args.get("price")
-
-        query = Item.query.filter_by(order_id=order_id)
-        if product_id:
-            query = query.filter_by(product_id=product_id)
-        if quantity:
-            query = query.filter_by(quantity=int(quantity))
-        if price:
-            query = query.filter_by(price=float(price))
-
-        items = query.all()
-        items_list = [item.serialize() for item in items]
-
-        logger.info("Returning %d items for order ID %d", len(items_list), order_id)
-
-        return items_list, status.HTTP_200_OK
-
-
-######################################################################
-#  PATH: /orders/{order_id:int}/item/{item_id:int}
-######################################################################
-@api.route("/orders/<int:order_id>/item/<int:item_id>")
-@api.param("order_id", "The ID of the order (integer)")
-@api.param("item_id", "The ID of the item in the order (integer)")
-class ItemResource(Resource):
-    """
-    ItemResource
-    Handle operations on a single Item in an order
-    GET /orders/{order_id}/item/{item_id} - Get the order item with the given id
-    PUT /orders/{order_id}/item/{item_id} - Update the order item with the given id
-    DELETE /orders/{order_id}/item/{item_id} - Delete the order item with the given id
-
-    """
-
-    @api.doc("get_order_item")
-    @api.response(404, "Item Not Found")
-    @api.marshal_with(item_model)
-    def get(self, order_id, item_id):
-        """Returns the details of an item in an order
-
-        Args:
-            order_id (int): ID of the order
-            item_id (int): ID of the item in the order
-
-        """
-        req_item = Item.query.filter_by(order_id=int(order_id), id=int(item_id)).first()
-        if req_item is None:
-            abort(status.HTTP_404_NOT_FOUND, description="Item not found")
-        logger.info("Returning item details:")
-        logger.info("**********ITEM DETAILS***********")
-        logger.info(jsonify(req_item.serialize()))
-
-        message = req_item.serialize()
-        # message["created_at"] = message["created_at"].timestamp()
-
-        return message, status.HTTP_200_OK
-
-    @api.doc("update_order_item")
-    @api.response(404, "Item not found")
-    @api.response(400, "Invalid Item data")
-    @api.expect(item_model)
-    @api.marshal_with(item_model)
-    def put(self, order_id, item_id):
-        """Update an item in the order given order ID and item ID"""
-        logger.info("Updating item with ID: %s in order with ID: %s", item_id, order_id)
-
-        data = request.json
-        order = Order.query.filter_by(id=order_id).first()
-
-        if order is None:
-            abort(status.HTTP_404_NOT_FOUND, f"Order ID {order_id} not found")
-
-        if order.status != OrderStatus.CREATED:
-            abort(
-                status.HTTP_400_BAD_REQUEST,
-                f"Order ID {order_id} cannot be updated in its current status",
-            )
-
-        item = Item.query.filter_by(order_id=order_id, id=item_id).first()
-
-        if item is None:
-            abort(
-                status.HTTP_404_NOT_FOUND,
-                f"Item ID {item_id} not found in Order ID {order_id}",
-            )
-
-        logger.info("*************EXISTING ITEM DATA*********************")
-        logger.info(item.serialize())
-
-        if "quantity" in data:
-            item.quantity = data["quantity"]
-        if "price" in data:
-            item.price = data["price"]
-
-        # item.updated_at = datetime.now()
-        item.update()
-
-        logger.info("**************UPDATED ITEM DATA************")
-        logger.info(item.serialize())
-
-        message = item.serialize()
-        return message, status.HTTP_200_OK
-
-    @api.doc("delete_order_item")
-    @api.response(204, "Item deleted")
-    def delete(self, order_id, item_id):
-        """Delete an item from the order
-
-        Args:
-            order_id (int): ID of the order
-            item_id (int): ID of the item in the order
-
-        """
-        order_del = Order.query.filter_by(id=int(order_id)).first()
-        if order_del is None:
-            abort(status.HTTP_404_NOT_FOUND, description="Order not found")
-
-        item_del = Item.query.filter_by(
-            id=int(item_id), order_id=int(order_del.id)
-        ).first()
-        if item_del is None:
-            return (
-                {"message": "Item does not exist"},
-                status.HTTP_404_NOT_FOUND,
-            )
-        db.session.delete(item_del)
-        db.session.commit()
-        return (
-            {"message": "Item deleted successfully"},
-            status.HTTP_204_NO_CONTENT,
-        )
-
-
 ######################################################################
 #  PATH: /orders/{order_id:int}/status
 ######################################################################
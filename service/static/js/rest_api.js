@@ -345,10 +345,24 @@ $(document).ready(function () {
 
     }
 
+    // Function to show the number of orders without fetching them
+    function fetchOrderCount() {
+        $.ajax({
+            url: url,
+            type: 'HEAD',
+            success: function (data, textStatus, xhr) {
+                $('#order_count').text(`Total orders: ${xhr.getResponseHeader('X-Total-Count')}`);
+            }
+        });
+    }
+
     // Attach click event listener to the button
     $('#viewallorder-btn').click(function () {
         fetchJSONData();
+        fetchOrderCount();
     });
+
+    fetchOrderCount();
 });
 
 
@@ -53,3 +53,19 @@ class ItemFactory(Factory):
     quantity = Faker("random_digit")
     price = Faker("pyfloat", min_value=0, max_value=1000)
     order = SubFactory(OrderFactory)
+
+
+def make_order(items=1, **kwargs) -> Order:
+    """Creates a CREATED Order of today with Items in the database
+
+    :param items: the number of fake Items, or the Items themselves
+    :param kwargs: the fields of the Order to set instead of fake ones
+    """
+    kwargs.setdefault("status", OrderStatus.CREATED)
+    kwargs.setdefault("created_at", date.today())
+    order = OrderFactory(**kwargs)
+    if isinstance(items, int):
+        items = [ItemFactory(order=order) for _ in range(items)]
+    order.items.extend(items)
+    order.create()
+    return order
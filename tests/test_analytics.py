@@ -0,0 +1,81 @@
+"""
+Analytics Test Suite
+"""
+
+from datetime import date, timedelta
+from service.models import Item, OrderArchive, OrderStatus
+from service.common import analytics
+from .base import DatabaseTestCase
+from .factories import make_order
+
+
+def _items(lines):
+    """Returns an Item of the same product for each (quantity, price)"""
+    return [
+        Item(product_id="1", product_description="Glucose", quantity=quantity, price=price)
+        for quantity, price in lines
+    ]
+
+
+######################################################################
+#  T E S T   C A S E S
+######################################################################
+class TestAnalytics(DatabaseTestCase):
+    """Analytics Tests"""
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_load_items_in_batches(self):
+        """It should load the items into one array per column"""
+        order = make_order(_items([(1, 2.0), (2, 3.0), (3, 4.0)]), status=OrderStatus.CREATED)
+        columns = analytics.load_items(batch_size=2)
+        self.assertEqual(sorted(columns["id"].tolist()), sorted(item.id for item in order.items))
+        self.assertEqual(set(columns["order_id"].tolist()), {order.id})
+        self.assertEqual(sorted(columns["quantity"].tolist()), [1, 2, 3])
+        self.assertEqual(set(columns["status"].tolist()), {0})
+        self.assertEqual(set(columns["day"].tolist()), {(date.today() - date(1970, 1, 1)).days})
+
+    def test_load_items_by_date(self):
+        """It should only load the items of orders in a date range"""
+        old = date.today() - timedelta(days=30)
+        make_order(_items([(1, 1.0)]), status=OrderStatus.COMPLETED, created_at=old)
+        make_order(_items([(1, 1.0), (1, 1.0)]), status=OrderStatus.CREATED)
+        self.assertEqual(analytics.load_items(created_to=old)["id"].size, 1)
+        self.assertEqual(analytics.load_items(created_from=old + timedelta(days=1))["id"].size, 2)
+
+    def test_load_archived_items(self):
+        """It should load the items of archived orders with the live ones"""
+        old = date.today() - timedelta(days=200)
+        make_order(_items([(1, 1.0), (2, 1.0)]), status=OrderStatus.COMPLETED, created_at=old)
+        make_order(_items([(3, 1.0)]))
+        self.assertEqual(OrderArchive.archive_completed(days=90), 1)
+        self.assertEqual(sorted(analytics.load_items()["quantity"].tolist()), [1, 2, 3])
+        self.assertEqual(sorted(analytics.load_items(created_to=old)["quantity"].tolist()), [1, 2])
+
+    def test_summarize(self):
+        """It should compute revenue, quantiles and a histogram"""
+        make_order(_items([(2, 10.0), (1, 5.0)]), status=OrderStatus.CREATED)
+        make_order(_items([(1, 100.0)]), status=OrderStatus.COMPLETED)
+        make_order(_items([(4, 1.0)]), status=OrderStatus.PROCESSING)
+        report = analytics.analyze(bins=2)
+        self.assertEqual(report["items"], 4)
+        self.assertEqual(report["orders"], 3)
+        self.assertAlmostEqual(report["revenue"], 129.0)
+        self.assertEqual(
+            report["revenue_by_status"], {"CREATED": 25.0, "PROCESSING": 4.0, "COMPLETED": 100.0}
+        )
+        self.assertEqual(report["order_value_quantiles"]["p50"], 25.0)
+        self.assertEqual(report["order_value_histogram"], [(4.0, 52.0, 2), (52.0, 100.0, 1)])
+        text = analytics.format_report(report)
+        self.assertIn("Revenue: 129.00", text)
+        self.assertIn("Order value quantiles: p50=25.00", text)
+
+    def test_summarize_nothing(self):
+        """It should report zeros when there are no items"""
+        report = analytics.summarize(analytics.load_items())
+        self.assertEqual(report["items"], 0)
+        self.assertEqual(report["revenue"], 0.0)
+        self.assertEqual(report["order_value_histogram"], [])
+        self.assertIn("Items: 0", analytics.format_report(report))
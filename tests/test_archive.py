@@ -0,0 +1,65 @@
+"""
+Test cases for the Order Archive
+"""
+
+from datetime import date, timedelta
+from unittest.mock import patch
+from service.models import (
+    Order,
+    Item,
+    OrderArchive,
+    ItemArchive,
+    OrderStatus,
+    DataValidationError,
+)
+from .base import DatabaseTestCase
+from .factories import make_order
+
+
+######################################################################
+#  A R C H I V E   T E S T   C A S E S
+######################################################################
+class TestOrderArchive(DatabaseTestCase):
+    """Test Cases for the Order Archive"""
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_archive_completed(self):
+        """It should move old completed Orders and their Items to the archive"""
+        old = make_order(2, status=OrderStatus.COMPLETED, created_at=date.today() - timedelta(days=100))
+        old_id = old.id
+        old_items = sorted(item.id for item in old.items)
+        recent_id = make_order(2, status=OrderStatus.COMPLETED, created_at=date.today() - timedelta(days=10)).id
+        open_id = make_order(2, status=OrderStatus.PROCESSING, created_at=date.today() - timedelta(days=100)).id
+
+        self.assertEqual(OrderArchive.archive_completed(days=90), 1)
+
+        self.assertEqual(
+            sorted(order.id for order in Order.all()), sorted([recent_id, open_id])
+        )
+        self.assertEqual(Item.query.filter_by(order_id=old_id).count(), 0)
+        archived = OrderArchive.find(old_id)
+        self.assertIsNotNone(archived.archived_at)
+        self.assertEqual(archived.status, OrderStatus.COMPLETED)
+        self.assertEqual([item.id for item in archived.items], old_items)
+        serial = archived.serialize()
+        self.assertEqual(serial["id"], old_id)
+        self.assertEqual(len(serial["items"]), 2)
+
+    def test_archive_in_batches(self):
+        """It should archive in several batches"""
+        for _ in range(5):
+            make_order(1, status=OrderStatus.COMPLETED, created_at=date.today() - timedelta(days=100))
+        self.assertEqual(OrderArchive.archive_completed(days=90, batch_size=2), 5)
+        self.assertEqual(Order.query.count(), 0)
+        self.assertEqual(OrderArchive.query.count(), 5)
+        self.assertEqual(ItemArchive.query.count(), 5)
+        self.assertEqual(OrderArchive.archive_completed(days=90), 0)
+
+    @patch("service.models.db.session.commit")
+    def test_archive_failed(self, exception_mock):
+        """It should not archive Orders if there is a database error"""
+        exception_mock.side_effect = Exception()
+        self.assertRaises(DataValidationError, OrderArchive.archive_completed, 90)
@@ -0,0 +1,341 @@
+"""
+Test cases for the Async Routes served under ASGI
+"""
+
+import asyncio
+import json
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+from wsgi import app
+from service.common import status
+from service.common.status_hub import hub
+from service.models import db, Order, OrderArchive, OrderEvent, OrderStatus
+from service.async_routes import AsyncService
+from .base import DatabaseTestCase, BASE_URL
+from .factories import make_order
+
+
+######################################################################
+#  A S Y N C   R O U T E S   T E S T   C A S E S
+######################################################################
+class TestAsyncRoutes(DatabaseTestCase):
+    """Test Cases for the Async Routes"""
+
+    @classmethod
+    def setUpClass(cls):
+        """This runs once before the entire test suite"""
+        super().setUpClass()
+        # the pooled connections of the async engine belong to this loop
+        cls.loop = asyncio.new_event_loop()
+        cls.service = AsyncService(app, create_async_engine(db.engine.url))
+
+    @classmethod
+    def tearDownClass(cls):
+        """This runs once after the entire test suite"""
+        cls.loop.run_until_complete(cls.service.engine.dispose())
+        cls.loop.close()
+        super().tearDownClass()
+
+    def setUp(self):
+        """This runs before each test"""
+        super().setUp()
+        self.client = app.test_client()
+
+    ######################################################################
+    #  H E L P E R   M E T H O D S
+    ######################################################################
+
+    # pylint: disable=too-many-arguments
+    def _request(self, method, path, body=None, query=b"", content_type=b"application/json", service=None):
+        """Sends a request to the ASGI application and collects the response"""
+        content = b"" if body is None else json.dumps(body).encode()
+        scope = self._scope(method, path, query, content_type, len(content))
+        messages = [{"type": "http.request", "body": content, "more_body": False}]
+        sent = []
+
+        async def receive():
+            return messages.pop() if messages else {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        self.loop.run_until_complete((service or self.service)(scope, receive, send))
+        data = b"".join(message.get("body", b"") for message in sent[1:])
+        return SimpleNamespace(
+            status_code=sent[0]["status"],
+            headers={name.decode(): value.decode() for name, value in sent[0]["headers"]},
+            json=json.loads(data) if data else None,
+        )
+
+    @staticmethod
+    def _scope(method, path, query=b"", content_type=b"application/json", length=0):
+        """Returns the ASGI scope of a request"""
+        return {
+            "type": "http",
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query,
+            "headers": [
+                (b"host", b"localhost"),
+                (b"content-type", content_type),
+                (b"content-length", str(length).encode()),
+            ],
+            "server": ("localhost", 80),
+            "client": ("127.0.0.1", 50000),
+        }
+
+    def _open_stream(self, query=b""):
+        """Starts a status stream, returns its task, its messages and the event that disconnects it"""
+        sent = []
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = self._scope("GET", f"{BASE_URL}/status-stream", query)
+        return asyncio.ensure_future(self.service(scope, receive, send)), sent, disconnect
+
+    @staticmethod
+    async def _until(condition):
+        """Waits until a condition holds"""
+
+        async def poll():
+            while not condition():
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(poll(), 5)
+
+    def _find(self, order_id):
+        """Reads an Order as the async routes left it"""
+        db.session.expire_all()
+        return Order.find(order_id)
+
+    def _events(self):
+        """Returns the (order_id, type) of every event in order"""
+        events, _ = OrderEvent.changes(limit=1000)
+        db.session.rollback()
+        return [(event.order_id, event.type) for event in events]
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_get_order(self):
+        """It should answer a read of an Order like the Flask application"""
+        order = make_order(2)
+        url = f"{BASE_URL}/{order.id}"
+        resp = self._request("GET", url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json, self.client.get(url).get_json())
+        self.assertEqual(self._request("GET", url + "/").json["id"], order.id)
+        self.assertEqual(self._request("GET", f"{BASE_URL}/0").status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_archived_order(self):
+        """It should leave archived Orders to the Flask application"""
+        order_id = make_order(2, created_at=date.today() - timedelta(days=100)).id
+        Order.patch(order_id, {"status": "PROCESSING"})
+        db.session.execute(
+            Order.__table__.update().where(Order.id == order_id).values(status=OrderStatus.COMPLETED)
+        )
+        db.session.commit()
+        OrderArchive.archive_completed(90)
+        resp = self._request("GET", f"{BASE_URL}/{order_id}")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json["status"], "COMPLETED")
+
+    def test_items(self):
+        """It should answer reads of Items like the Flask application"""
+        order = make_order(2)
+        url = f"{BASE_URL}/{order.id}/items"
+        resp = self._request("GET", url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.json), 2)
+        self.assertEqual(resp.json, self.client.get(url).get_json())
+        # filters and pages are answered by Flask
+        resp = self._request("GET", url, query=b"limit=1")
+        self.assertEqual(len(resp.json), 1)
+        self.assertIn("X-Next-Cursor".lower(), resp.headers)
+        self.assertEqual(self._request("GET", f"{BASE_URL}/0/items").status_code, status.HTTP_404_NOT_FOUND)
+        item_url = f"{BASE_URL}/{order.id}/item/{order.items[0].id}"
+        resp = self._request("GET", item_url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json, self.client.get(item_url).get_json())
+        resp = self._request("GET", f"{BASE_URL}/{order.id}/item/0")
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_item(self):
+        """It should add an Item, refresh the totals and record the change"""
+        order = make_order(0)
+        new_item = {"product_id": 7, "product_description": "A", "quantity": 3, "price": 2.5}
+        resp = self._request("POST", f"{BASE_URL}/{order.id}/items", new_item)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.json["product_id"], 7)
+        self.assertEqual(resp.json["order_id"], order.id)
+        self.assertEqual(
+            resp.headers["location"], f"http://localhost{BASE_URL}/{order.id}/item/{resp.json['id']}"
+        )
+        self.assertEqual(self._find(order.id).total_amount, 7.5)
+        self.assertEqual(self._events(), [(order.id, "created"), (order.id, "updated")])
+        # invalid Items and missing Orders are reported by Flask
+        resp = self._request("POST", f"{BASE_URL}/{order.id}/items", {"product_id": 7})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self._request("POST", f"{BASE_URL}/0/items", new_item)
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_patch_order(self):
+        """It should patch an Order and push its status change"""
+        order = make_order(2)
+        url = f"{BASE_URL}/{order.id}"
+        resp = self._request("PATCH", url, {"shipping_address": "1 New St"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json["shipping_address"], "1 New St")
+        self.assertNotIn("items", resp.json)
+        resp = self._request("PATCH", url, {"status": "PROCESSING"})
+        self.assertEqual(resp.json["status"], "PROCESSING")
+        self.assertEqual(
+            self._events(), [(order.id, "created"), (order.id, "updated"), (order.id, "status")]
+        )
+        # errors are reported by Flask
+        self.assertEqual(self._request("PATCH", url, {"status": "CREATED"}).status_code, 400)
+        self.assertEqual(self._request("PATCH", url, {"bad": 1}).status_code, 400)
+        resp = self._request("PATCH", url, {"shipping_address": "x"}, content_type=b"text/plain")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self._request("PATCH", f"{BASE_URL}/0", {"shipping_address": "x"})
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_patch_item(self):
+        """It should patch an Item and refresh the totals"""
+        order = make_order(1)
+        url = f"{BASE_URL}/{order.id}/item/{order.items[0].id}"
+        resp = self._request("PATCH", url, {"quantity": 4, "price": 1.5})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual((resp.json["quantity"], resp.json["price"]), (4, 1.5))
+        self.assertEqual(self._find(order.id).total_amount, 6.0)
+        self.assertEqual(self._request("PATCH", url, {"quantity": "many"}).status_code, 400)
+        resp = self._request("PATCH", f"{BASE_URL}/{order.id}/item/0", {"quantity": 1})
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delete(self):
+        """It should delete Items and Orders"""
+        order = make_order(2)
+        order_id, item_id = order.id, order.items[0].id
+        url = f"{BASE_URL}/{order_id}/item/{item_id}"
+        self.assertEqual(self._request("DELETE", url).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self._find(order_id).item_count, 1)
+        # a missing Item is reported by Flask
+        resp = self._request("DELETE", url)
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(resp.json["message"], "Item does not exist")
+        resp = self._request("DELETE", f"{BASE_URL}/{order_id}")
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertIsNone(self._find(order_id))
+        self.assertEqual(
+            self._events(), [(order_id, "created"), (order_id, "updated"), (order_id, "deleted")]
+        )
+
+    def test_other_paths(self):
+        """It should hand every other request to the Flask application"""
+        self.assertEqual(self._request("GET", "/health").json["message"], "Healthy")
+        new_order = {
+            "customer_id": "1",
+            "shipping_address": "1 Main St",
+            "status": "CREATED",
+            "items": [],
+        }
+        resp = self._request("POST", BASE_URL, new_order)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+    def test_database_errors(self):
+        """It should let the Flask application answer when the async path fails"""
+        order = make_order(2)
+        error = OperationalError("SELECT", {}, Exception("connection lost"))
+        with patch.object(AsyncService, "get_order", side_effect=error):
+            service = AsyncService(app, self.service.engine)
+        resp = self._request("GET", f"{BASE_URL}/{order.id}", service=service)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json["id"], order.id)
+
+    def test_status_stream(self):
+        """It should stream the status of Orders on the event loop"""
+        order = make_order()
+
+        changed = f'event: status\ndata: {{"id": {order.id}, "status": "PROCESSING"}}\n\n'
+
+        async def watch():
+            task, sent, disconnect = self._open_stream(f"ids={order.id}".encode())
+            await self._until(lambda: len(sent) > 1)
+            self.assertEqual(sent[0]["status"], status.HTTP_200_OK)
+            self.assertIn((b"content-type", b"text/event-stream; charset=utf-8"), sent[0]["headers"])
+            self.assertEqual(hub.subscribers, 1)
+            order.status = OrderStatus.PROCESSING
+            order.update()
+            await self._until(lambda: changed.encode() in [message.get("body") for message in sent])
+            await self._until(lambda: sent[-1]["body"] == b": keepalive\n\n")
+            disconnect.set()
+            await task
+            return [message["body"].decode() for message in sent[1:]]
+
+        with patch.dict(app.config, {"STATUS_STREAM_HEARTBEAT": 0.05}):
+            chunks = self.loop.run_until_complete(watch())
+        self.assertEqual(chunks[0], f'event: status\ndata: {{"id": {order.id}, "status": "CREATED"}}\n\n')
+        self.assertIn(changed, chunks)
+        self.assertEqual(hub.subscribers, 0)
+
+    def test_status_stream_overflow(self):
+        """It should end the stream of a client that fell behind"""
+
+        async def watch():
+            task, sent, _ = self._open_stream()
+            await self._until(lambda: len(sent) > 0)
+            # both changes reach the queue before the stream reads one
+            hub.publish({"id": 1, "status": "PROCESSING"})
+            hub.publish({"id": 2, "status": "PROCESSING"})
+            await task
+            return sent[-1]
+
+        with patch.dict(app.config, {"STATUS_STREAM_QUEUE_SIZE": 1}):
+            last = self.loop.run_until_complete(watch())
+        self.assertEqual(last["body"], b"event: reset\ndata: {}\n\n")
+        self.assertFalse(last["more_body"])
+        self.assertEqual(hub.subscribers, 0)
+
+    def test_status_stream_refused(self):
+        """It should refuse streams past the limit and leave invalid ids to Flask"""
+        url = f"{BASE_URL}/status-stream"
+        self.assertEqual(self._request("GET", url, query=b"ids=a").status_code, status.HTTP_400_BAD_REQUEST)
+        ids = ",".join(str(order_id) for order_id in range(501)).encode()
+        self.assertEqual(self._request("GET", url, query=b"ids=" + ids).status_code, status.HTTP_400_BAD_REQUEST)
+        with patch.dict(app.config, {"STATUS_STREAM_MAX_CLIENTS": 0}):
+            resp = self._request("GET", url)
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn("At most 0 status streams", resp.json["message"])
+        with patch("service.async_routes.hub.subscribe_async", side_effect=ConnectionError("down")):
+            resp = self._request("GET", url)
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(resp.json["message"], "down")
+
+    def test_lifespan(self):
+        """It should dispose of the connection pool when the server stops"""
+        service = AsyncService(app, create_async_engine(db.engine.url))
+        messages = [{"type": "lifespan.shutdown"}, {"type": "lifespan.startup"}]
+        sent = []
+
+        async def receive():
+            return messages.pop()
+
+        async def send(message):
+            sent.append(message["type"])
+
+        self.loop.run_until_complete(service({"type": "lifespan"}, receive, send))
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
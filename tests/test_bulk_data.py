@@ -0,0 +1,184 @@
+"""
+Bulk Data Test Suite
+"""
+
+import io
+import os
+import csv
+import gzip
+import json
+import tempfile
+from unittest.mock import patch
+from service.models import db, Order, OrderArchive, Item, DataValidationError
+from service.common.bulk_data import (
+    BulkExporter,
+    BulkLoader,
+    generate_orders,
+    read_csv,
+    read_ndjson,
+)
+from .base import DatabaseTestCase
+
+CSV_DATA = """order_ref,customer_id,shipping_address,created_at,status,product_id,product_description,quantity,price
+a,1,1 Main St,2024-01-02,CREATED,10,Glucose,2,23.4
+a,1,1 Main St,2024-01-02,CREATED,11,Candy,1,10.0
+b,2,2 Main St,2024-01-03,COMPLETED,,,,
+"""
+
+
+######################################################################
+#  T E S T   C A S E S
+######################################################################
+class TestBulkData(DatabaseTestCase):
+    """Bulk Data Tests"""
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_generate_orders(self):
+        """It should generate random orders with items"""
+        orders = list(generate_orders(5, items_per_order=2))
+        self.assertEqual(len(orders), 5)
+        for order in orders:
+            self.assertIn(len(order["items"]), (1, 2))
+
+    def test_seed(self):
+        """It should load generated orders in batches"""
+        batches = []
+        loader = BulkLoader(batch_size=4, progress=lambda bulk: batches.append(bulk.orders))
+        loader.load(generate_orders(10, items_per_order=2))
+        self.assertEqual(batches, [4, 8, 10])
+        self.assertEqual(Order.query.count(), 10)
+        self.assertEqual(Item.query.count(), loader.items)
+        self.assertGreater(loader.rows_per_second, 0)
+        for order in Order.all():
+            self.assertGreaterEqual(len(order.items), 1)
+            self.assertEqual(order.item_count, len(order.items))
+            self.assertAlmostEqual(
+                order.total_amount, sum(item.quantity * item.price for item in order.items)
+            )
+
+    def test_ids_do_not_collide(self):
+        """It should keep using the sequences after a bulk load"""
+        BulkLoader().load(generate_orders(3))
+        order = Order(customer_id="1", shipping_address="1 Main St", status="CREATED")
+        order.create()
+        self.assertEqual(Order.query.count(), 4)
+
+    def test_import_ndjson(self):
+        """It should import orders from NDJSON"""
+        lines = [
+            json.dumps(
+                {
+                    "customer_id": 7,
+                    "shipping_address": "726 Broadway",
+                    "created_at": "2024-02-01",
+                    "status": "processing",
+                    "items": [
+                        {"product_id": 1, "product_description": "Glucose", "quantity": 2, "price": 23.4}
+                    ],
+                }
+            ),
+            "",
+        ]
+        BulkLoader().load(read_ndjson(io.StringIO("\n".join(lines))))
+        order = Order.all()[0]
+        self.assertEqual(order.customer_id, "7")
+        self.assertEqual(order.status.name, "PROCESSING")
+        self.assertEqual(order.items[0].product_description, "Glucose")
+
+    def test_import_csv(self):
+        """It should import orders from CSV with one row per item"""
+        loader = BulkLoader().load(read_csv(io.StringIO(CSV_DATA)))
+        self.assertEqual(loader.orders, 2)
+        self.assertEqual(loader.items, 2)
+        orders = {order.customer_id: order for order in Order.all()}
+        self.assertEqual(len(orders["1"].items), 2)
+        self.assertEqual(len(orders["2"].items), 0)
+
+    def test_import_alphanumeric_customer_id(self):
+        """It should keep a customer id that is not a number"""
+        orders = [{"customer_id": "CUST-0042", "shipping_address": "726 Broadway", "items": []}]
+        BulkLoader().load(orders)
+        self.assertEqual(Order.all()[0].customer_id, "CUST-0042")
+
+    def test_import_csv_missing_columns(self):
+        """It should reject a CSV file with missing columns"""
+        stream = io.StringIO("order_ref,customer_id\na,1\n")
+        self.assertRaises(DataValidationError, list, read_csv(stream))
+
+    def test_import_bad_order(self):
+        """It should not load anything from a batch with a bad order"""
+        orders = [{"customer_id": 1, "items": []}]
+        self.assertRaises(DataValidationError, BulkLoader().load, orders)
+        self.assertEqual(Order.query.count(), 0)
+
+    def test_export_csv(self):
+        """It should export every table to gzipped CSV files by id range"""
+        loader = BulkLoader().load(generate_orders(20))
+        with tempfile.TemporaryDirectory() as directory:
+            results = BulkExporter(directory, "csv", workers=3).export()
+            self.assertEqual(sum(rows for _, rows in results), loader.orders + loader.items)
+            order_files = sorted(path for path, _ in results if "order-" in path)
+            self.assertEqual(len(order_files), 3)
+            ids = []
+            for path in order_files:
+                with gzip.open(path, "rt") as source:
+                    reader = csv.DictReader(source)
+                    ids.extend(int(row["id"]) for row in reader)
+                    self.assertNotIn("search_vector", reader.fieldnames)
+            self.assertEqual(sorted(ids), sorted(order.id for order in Order.all()))
+
+    def test_export_ndjson(self):
+        """It should export every table to plain NDJSON files"""
+        BulkLoader().load(read_csv(io.StringIO(CSV_DATA)))
+        with tempfile.TemporaryDirectory() as directory:
+            results = BulkExporter(directory, "ndjson", workers=1, compress=False).export()
+            paths = {os.path.basename(path): rows for path, rows in results}
+            self.assertEqual(
+                paths,
+                {"order-0001.ndjson": 2, "item-0001.ndjson": 2, "order_archive-0001.ndjson": 0, "item_archive-0001.ndjson": 0},
+            )
+            with open(os.path.join(directory, "item-0001.ndjson"), encoding="utf-8") as source:
+                items = [json.loads(line) for line in source]
+            self.assertEqual({item["product_description"] for item in items}, {"Glucose", "Candy"})
+
+    def test_export_snapshot(self):
+        """It should export the tables as they were when the export started"""
+        loader = BulkLoader().load(generate_orders(10, 2))
+        id_ranges = BulkExporter._id_ranges
+
+        def delete_items_after_ranges(exporter, conn, table):
+            ranges = id_ranges(exporter, conn, table)
+            with db.engine.begin() as other:
+                other.exec_driver_sql("DELETE FROM item")
+            return ranges
+
+        with patch.object(BulkExporter, "_id_ranges", delete_items_after_ranges):
+            with tempfile.TemporaryDirectory() as directory:
+                results = BulkExporter(directory, workers=2).export()
+        self.assertEqual(sum(rows for path, rows in results if "item-" in path), loader.items)
+        self.assertEqual(Item.query.count(), 0)
+
+    def test_export_empty_tables(self):
+        """It should export empty files when there is no data"""
+        with tempfile.TemporaryDirectory() as directory:
+            results = BulkExporter(directory, workers=2).export()
+            self.assertEqual([rows for _, rows in results], [0, 0, 0, 0])
+
+    def test_export_archive(self):
+        """It should export the archived Orders and Items with the live ones"""
+        BulkLoader().load(read_csv(io.StringIO(CSV_DATA)))
+        self.assertEqual(OrderArchive.archive_completed(days=90), 1)
+        with tempfile.TemporaryDirectory() as directory:
+            results = BulkExporter(directory, "ndjson", workers=1, compress=False).export()
+            paths = {os.path.basename(path): rows for path, rows in results}
+            self.assertEqual(paths["order-0001.ndjson"], 1)
+            self.assertEqual(paths["order_archive-0001.ndjson"], 1)
+            with open(os.path.join(directory, "order_archive-0001.ndjson"), encoding="utf-8") as source:
+                self.assertEqual(json.loads(source.readline())["status"], "COMPLETED")
+
+    def test_export_bad_format(self):
+        """It should reject unknown export formats"""
+        self.assertRaises(DataValidationError, BulkExporter, "/tmp", "xml")
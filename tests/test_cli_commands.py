@@ -2,12 +2,29 @@
 CLI Command Extensions for Flask
 """
 import os
+import json
+import tempfile
+from datetime import datetime, timedelta
 from unittest import TestCase
 from unittest.mock import patch, MagicMock
 from click.testing import CliRunner
 # pylint: disable=unused-import
 from wsgi import app  # noqa: F401
-from service.common.cli_commands import db_create  # noqa: E402
+from service.common.cli_commands import (  # noqa: E402
+    analytics_report,
+    db_create,
+    db_seed,
+    db_import,
+    db_export,
+    db_archive,
+    db_partitions,
+    db_purge_events,
+    db_purge_keys,
+    db_rollups,
+    db_upgrade,
+    load_test,
+)
+from service.models import db, Order, DataValidationError  # noqa: E402
 
 
 class TestFlaskCLI(TestCase):
@@ -16,10 +33,192 @@ class TestFlaskCLI(TestCase):
     def setUp(self):
         self.runner = CliRunner()
 
+    @patch('service.common.cli_commands.migrations.upgrade')
+    @patch('service.common.cli_commands.migrations.drop')
     @patch('service.common.cli_commands.db')
-    def test_db_create(self, db_mock):
+    def test_db_create(self, db_mock, drop_mock, upgrade_mock):
         """It should call the db-create command"""
         db_mock.return_value = MagicMock()
         with patch.dict(os.environ, {"FLASK_APP": "wsgi:app"}, clear=True):
             result = self.runner.invoke(db_create)
             self.assertEqual(result.exit_code, 0)
+        drop_mock.assert_called_once_with(db_mock.engine)
+        upgrade_mock.assert_called_once_with(db_mock.engine)
+
+    def test_db_upgrade(self):
+        """It should apply the pending migrations"""
+        result = self.runner.invoke(db_upgrade)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Applied 0 migrations, the schema is at version 6", result.output)
+        migration = MagicMock(version=7, description="Add a column")
+        with patch('service.common.cli_commands.migrations.upgrade', return_value=[migration]) as upgrade_mock:
+            result = self.runner.invoke(db_upgrade, ["--to", "7"])
+        upgrade_mock.assert_called_once_with(db.engine, 7)
+        self.assertIn("0007 Add a column", result.output)
+
+    @patch('service.common.load_generator.LoadGenerator.send')
+    def test_load_test(self, send_mock):
+        """It should run the load-test command and print a report"""
+        send_mock.return_value = (201, {"id": 1})
+        result = self.runner.invoke(
+            load_test, ["--requests", "20", "--concurrency", "2", "--mix", "create=1"]
+        )
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(send_mock.call_count, 20)
+        self.assertIn("req/s", result.output)
+        self.assertIn("p99", result.output)
+
+    def test_load_test_bad_mix(self):
+        """It should reject an invalid traffic mix"""
+        result = self.runner.invoke(load_test, ["--mix", "explode=1"])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("explode", result.output)
+
+    def test_db_seed(self):
+        """It should seed the database with generated orders"""
+        db.session.query(Order).delete()
+        db.session.commit()
+        result = self.runner.invoke(db_seed, ["--orders", "25", "--batch-size", "10"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Loaded 25 orders", result.output)
+        self.assertEqual(Order.query.count(), 25)
+        db.session.remove()
+
+    def test_db_import(self):
+        """It should import orders from an NDJSON file"""
+        db.session.query(Order).delete()
+        db.session.commit()
+        order = {"customer_id": 1, "shipping_address": "1 Main St", "status": "CREATED", "items": []}
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as source:
+            source.write(json.dumps(order) + "\n")
+        result = self.runner.invoke(db_import, [source.name])
+        os.unlink(source.name)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Loaded 1 orders", result.output)
+        db.session.remove()
+
+    def test_db_import_bad_data(self):
+        """It should fail to import unknown formats and bad orders"""
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as source:
+            source.write("{}\n")
+        result = self.runner.invoke(db_import, [source.name])
+        self.assertNotEqual(result.exit_code, 0)
+        result = self.runner.invoke(db_import, [source.name, "--format", "ndjson"])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("Invalid order", result.output)
+        os.unlink(source.name)
+
+    def test_db_export(self):
+        """It should export the tables to a directory"""
+        with tempfile.TemporaryDirectory() as directory:
+            result = self.runner.invoke(db_export, [directory, "--workers", "2"])
+            self.assertEqual(result.exit_code, 0)
+            self.assertIn("Exported", result.output)
+            self.assertTrue(os.path.exists(os.path.join(directory, "order-0001.csv.gz")))
+
+    @patch('service.common.cli_commands.OrderArchive.archive_completed')
+    def test_db_archive(self, archive_mock):
+        """It should archive old completed orders once"""
+        archive_mock.return_value = 3
+        result = self.runner.invoke(db_archive, ["--days", "30"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Archived 3", result.output)
+        archive_mock.assert_called_once_with(30, app.config["ARCHIVE_BATCH_SIZE"])
+
+    @patch('service.common.cli_commands.time.sleep')
+    @patch('service.common.cli_commands.OrderArchive.archive_completed')
+    def test_db_archive_scheduled(self, archive_mock, sleep_mock):
+        """It should keep archiving on a schedule until stopped"""
+        archive_mock.side_effect = [1, DataValidationError("locked"), 2]
+        sleep_mock.side_effect = [None, None, KeyboardInterrupt()]
+        result = self.runner.invoke(db_archive, ["--every", "60"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(archive_mock.call_count, 3)
+        sleep_mock.assert_called_with(60)
+        self.assertIn("will retry", result.output)
+        self.assertIn("Archiver stopped", result.output)
+
+    @patch('service.common.cli_commands.OrderArchive.archive_completed')
+    def test_db_archive_failed(self, archive_mock):
+        """It should fail when a single archive run fails"""
+        archive_mock.side_effect = DataValidationError("boom")
+        result = self.runner.invoke(db_archive)
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("boom", result.output)
+
+    @patch('service.common.cli_commands.IdempotencyKey.purge')
+    def test_db_purge_keys(self, purge_mock):
+        """It should purge old idempotency keys"""
+        purge_mock.return_value = 4
+        result = self.runner.invoke(db_purge_keys, ["--hours", "2"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Purged 4 idempotency keys older than 2 hours", result.output)
+        purge_mock.assert_called_once_with(timedelta(hours=2))
+        purge_mock.side_effect = DataValidationError("boom")
+        result = self.runner.invoke(db_purge_keys)
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("boom", result.output)
+
+    @patch('service.common.cli_commands.OrderEvent.purge')
+    def test_db_purge_events(self, purge_mock):
+        """It should purge old order events"""
+        purge_mock.return_value = 9
+        result = self.runner.invoke(db_purge_events)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn(f"Purged 9 order events older than {app.config['OUTBOX_RETAIN_DAYS']} days", result.output)
+        purge_mock.side_effect = DataValidationError("boom")
+        result = self.runner.invoke(db_purge_events, ["--days", "1"])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("boom", result.output)
+
+    def test_db_partitions_not_partitioned(self):
+        """It should refuse to manage partitions of a plain order table"""
+        result = self.runner.invoke(db_partitions)
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("not partitioned", result.output)
+
+    @patch('service.common.cli_commands.partitions.is_partitioned', return_value=True)
+    @patch('service.common.cli_commands.partitions.maintain')
+    def test_db_partitions(self, maintain_mock, _):
+        """It should create and detach partitions"""
+        maintain_mock.return_value = {"created": ["order_p202501"], "detached": []}
+        result = self.runner.invoke(db_partitions, ["--ahead", "2", "--retain", "12"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("order_p202501", result.output)
+        self.assertIn("Detached partitions: none", result.output)
+        self.assertEqual(maintain_mock.call_args[0][1:], (2, 12))
+
+    def test_db_rollups(self):
+        """It should refresh the daily rollups"""
+        result = self.runner.invoke(db_rollups)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Refreshed daily rollups", result.output)
+
+    @patch('service.common.cli_commands.time.sleep')
+    @patch('service.common.cli_commands.StatsRollup.refresh')
+    def test_db_rollups_scheduled(self, refresh_mock, sleep_mock):
+        """It should keep refreshing the rollups until stopped"""
+        refresh_mock.side_effect = [DataValidationError("locked"), datetime.now()]
+        sleep_mock.side_effect = [None, KeyboardInterrupt()]
+        result = self.runner.invoke(db_rollups, ["--every", "300", "--blocking"])
+        self.assertEqual(result.exit_code, 0)
+        refresh_mock.assert_called_with(concurrently=False)
+        self.assertIn("will retry", result.output)
+        self.assertIn("Rollup refresher stopped", result.output)
+
+    @patch('service.common.cli_commands.StatsRollup.refresh')
+    def test_db_rollups_failed(self, refresh_mock):
+        """It should fail when a single refresh fails"""
+        refresh_mock.side_effect = DataValidationError("boom")
+        result = self.runner.invoke(db_rollups)
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("boom", result.output)
+
+    def test_analytics(self):
+        """It should print an analytics report"""
+        result = self.runner.invoke(analytics_report, ["--from", "2024-01-01", "--to", "2024-12-31"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Revenue by status", result.output)
+        result = self.runner.invoke(analytics_report, ["--json", "--bins", "3"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("revenue_by_status", json.loads(result.output))
@@ -0,0 +1,89 @@
+"""
+Test cases for the gunicorn configuration
+"""
+
+import os
+import runpy
+from unittest import TestCase
+from unittest.mock import mock_open, patch
+
+CONF = os.path.join(os.path.dirname(os.path.dirname(__file__)), "gunicorn.conf.py")
+
+
+######################################################################
+#  G U N I C O R N   C O N F I G U R A T I O N   T E S T   C A S E S
+######################################################################
+class TestGunicornConf(TestCase):
+    """Test Cases for gunicorn.conf.py"""
+
+    def _load(self, **env):
+        """Reads the configuration with some environment variables"""
+        with patch.dict(os.environ, env):
+            return runpy.run_path(CONF)
+
+    def test_defaults(self):
+        """It should run threaded workers of the WSGI app by default"""
+        with patch.dict(os.environ, {"PORT": "8080"}):
+            for name in [name for name in os.environ if name.startswith("GUNICORN_")]:
+                del os.environ[name]
+            conf = runpy.run_path(CONF)
+        self.assertEqual(conf["worker_class"], "gthread")
+        self.assertEqual(conf["wsgi_app"], "wsgi:app")
+        self.assertEqual(conf["bind"], "0.0.0.0:8080")
+        self.assertGreaterEqual(conf["workers"], 1)
+        self.assertEqual(conf["threads"], 4)
+        self.assertFalse(conf["preload_app"])
+        self.assertEqual((conf["max_requests"], conf["max_requests_jitter"]), (1000, 100))
+
+    def test_environment(self):
+        """It should be tuned with environment variables"""
+        conf = self._load(
+            GUNICORN_WORKER_CLASS="uvicorn.workers.UvicornWorker",
+            GUNICORN_WORKERS="3",
+            GUNICORN_KEEPALIVE="10",
+            GUNICORN_PRELOAD="true",
+        )
+        self.assertEqual(conf["wsgi_app"], "asgi:app")
+        self.assertEqual(conf["workers"], 3)
+        self.assertEqual(conf["keepalive"], 10)
+        self.assertTrue(conf["preload_app"])
+
+    def test_default_workers(self):
+        """It should start as many workers as the CPU and memory limits allow"""
+        conf = self._load()
+        default_workers = conf["default_workers"]
+        for cpus, memory, workers in ((0.5, 128, 1), (4.0, 256, 3), (2.0, None, 4)):
+            with patch.dict(
+                default_workers.__globals__,
+                cpu_quota=lambda cpus=cpus: cpus,
+                memory_limit=lambda memory=memory: memory,
+            ):
+                self.assertEqual(default_workers(), workers)
+        memory_limit = conf["memory_limit"]
+        with patch("builtins.open", mock_open(read_data="134217728\n")):
+            self.assertEqual(memory_limit(), 128)
+        with patch("builtins.open", mock_open(read_data="max\n")):
+            self.assertIsNone(memory_limit())
+        with patch("builtins.open", side_effect=OSError()):
+            self.assertIsNone(memory_limit())
+
+    def test_post_worker_init(self):
+        """It should open the connection pool of every new worker"""
+        post_worker_init = self._load()["post_worker_init"]
+        with patch("service.common.readiness.readiness.start") as start_mock:
+            post_worker_init(None)
+        start_mock.assert_called_once_with()
+
+    def test_cpu_quota(self):
+        """It should read the CPU limit of the container from its cgroup"""
+        cpu_quota = self._load()["cpu_quota"]
+        with patch("builtins.open", mock_open(read_data="50000 100000")):
+            self.assertEqual(cpu_quota(), 0.5)
+        # cgroup v1 files after a missing cgroup v2 one
+        files = [OSError(), mock_open(read_data="150000")(), mock_open(read_data="100000")()]
+        with patch("builtins.open", side_effect=files):
+            self.assertEqual(cpu_quota(), 1.5)
+        with patch("builtins.open", side_effect=OSError()), patch("os.cpu_count", return_value=4):
+            self.assertEqual(cpu_quota(), 4.0)
+        with patch("builtins.open", mock_open(read_data="max 100000")), patch("os.cpu_count", return_value=2):
+            self.assertEqual(cpu_quota(), 2.0)
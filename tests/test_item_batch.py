@@ -0,0 +1,116 @@
+"""
+Item Batch API Service Test Suite
+"""
+
+import logging
+from unittest.mock import patch
+from wsgi import app
+
+from service.common import status
+from service.models import Item
+
+from .base import RouteTestCase, BASE_URL
+from .factories import make_order
+
+logger = logging.getLogger("flask.app")
+
+
+######################################################################
+#  T E S T   C A S E S
+######################################################################
+class TestItemBatchRoutes(RouteTestCase):
+    """Item Batch REST API Server Tests"""
+
+    ######################################################################
+    #  P L A C E   T E S T   C A S E S   H E R E
+    ######################################################################
+
+    # ----------------------------------------------------------
+    # TEST ITEM BATCH
+    # ----------------------------------------------------------
+    def test_batch_items(self):
+        """It should add, update and remove Items in one call"""
+        order = make_order()
+        kept = Item(order_id=order.id, product_id="7", product_description="Kept", quantity=1, price=2.0)
+        kept.create()
+        removed_id = order.items[0].id
+        new_item = {"product_id": 5, "product_description": "Bread", "quantity": 2, "price": 3.5}
+        response, statements = self._count_selects(
+            "post",
+            f"{BASE_URL}/{order.id}/items:batch",
+            json=[
+                {"op": "add", "value": new_item},
+                {"op": "add", "value": new_item},
+                {"op": "update", "id": kept.id, "value": {"quantity": 4}},
+                {"op": "remove", "id": removed_id},
+            ],
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual(len(data["added"]), 2)
+        self.assertEqual(data["added"][0]["product_description"], "Bread")
+        self.assertEqual(data["updated"][0]["quantity"], 4)
+        self.assertEqual(data["updated"][0]["price"], 2.0)
+        self.assertEqual(data["removed"], [removed_id])
+        # lock, delete, update, insert and the totals refresh
+        self.assertEqual(len(statements), 5)
+        data = self.client.get(f"{BASE_URL}/{order.id}").get_json()
+        self.assertEqual((data["item_count"], data["total_amount"]), (3, 22.0))
+
+    def test_batch_items_is_atomic(self):
+        """It should apply none of the operations when one of them fails"""
+        order = make_order()
+        item_id = order.items[0].id
+        response = self.client.post(
+            f"{BASE_URL}/{order.id}/items:batch",
+            json=[{"op": "remove", "id": item_id}, {"op": "update", "id": 0, "value": {"price": 1}}],
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Items not found in the Order: 0", response.get_json()["message"])
+        self.assertIsNotNone(Item.find_in_order(order.id, item_id))
+
+    def test_batch_items_bad_requests(self):
+        """It should not apply invalid batches"""
+        order = make_order()
+        item_id = order.items[0].id
+        url = f"{BASE_URL}/{order.id}/items:batch"
+        for body in (
+            {},
+            [],
+            ["add"],
+            [{"op": "move"}],
+            [{"op": "add", "value": {"product_id": 1}}],
+            [{"op": "remove"}],
+            [{"op": "remove", "id": item_id}, {"op": "update", "id": item_id, "value": {"price": 1}}],
+            [{"op": "update", "id": item_id, "value": {}}],
+            [{"op": "update", "id": item_id, "value": {"quantity": "many"}}],
+            [{"op": "add", "value": "x"}],
+            [{"op": "add", "value": [1]}],
+            [{"op": "update", "id": item_id, "value": "x"}],
+            [{"op": "update", "id": item_id, "value": [1]}],
+            [{"op": "remove", "id": True}],
+        ):
+            response = self.client.post(url, json=body)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+        response = self.client.post(url, json=[{"op": "remove", "id": item_id}] * 501)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(f"{BASE_URL}/0/items:batch", json=[{"op": "remove", "id": 1}])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        shipped = make_order(status="PROCESSING")
+        response = self.client.post(
+            f"{BASE_URL}/{shipped.id}/items:batch", json=[{"op": "remove", "id": shipped.items[0].id}]
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("current status", response.get_json()["message"])
+
+    def test_batch_items_bad_requests_outside_testing(self):
+        """It should answer 400 to a batch with unknown Items or bad values when not testing"""
+        order = make_order()
+        url = f"{BASE_URL}/{order.id}/items:batch"
+        with patch.dict(app.config, {"TESTING": False}):
+            response = self.client.post(url, json=[{"op": "update", "id": 0, "value": {"price": 1}}])
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("Items not found in the Order: 0", response.get_json()["message"])
+            response = self.client.post(url, json=[{"op": "add", "value": "x"}])
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("must have an object as value", response.get_json()["message"])
@@ -0,0 +1,607 @@
+"""
+Item API Service Test Suite
+"""
+
+import random
+import logging
+
+from service.common import status
+from service.models import db, Order, Item, OrderStatus
+
+from .base import RouteTestCase, BASE_URL
+from .factories import ItemFactory, make_order
+
+logger = logging.getLogger("flask.app")
+
+
+######################################################################
+#  T E S T   C A S E S
+######################################################################
+# pylint: disable=too-many-public-methods
+class TestItemRoutes(RouteTestCase):
+    """Item REST API Server Tests"""
+
+    ######################################################################
+    #  P L A C E   T E S T   C A S E S   H E R E
+    ######################################################################
+
+    # ----------------------------------------------------------
+    # TEST CRUD
+    # ----------------------------------------------------------
+    def test_view_item(self):
+        """It should view an item in an order"""
+        customer_id = random.randint(0, 10000)
+        order1 = make_order(
+            0, customer_id=customer_id, shipping_address="726 Broadway, NY 10003", status=OrderStatus.CREATED
+        )
+        item1 = ItemFactory(order=order1)
+        item1.create()
+        response = self.client.get(
+            f"{BASE_URL}/{order1.id}/item/{item1.id}",
+            content_type="application/json",
+        )
+        item_view = response.get_json()
+
+        logger.info("***************** RECEIVED DATA *******************")
+        logger.info(item_view)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(
+            f"{BASE_URL}/{order1.id}/item/502212",
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_item_not_found(self):
+        """It should check if order does not exist"""
+        non_existent_order_id = random.randint(10001, 20000)
+        non_existent_item_id = random.randint(10001, 20000)
+
+        response = self.client.get(
+            f"{BASE_URL}/{non_existent_order_id}/item/{non_existent_item_id}",
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delete_item(self):
+        """It should delete an item in an order"""
+        customer_id = random.randint(0, 10000)
+        order1 = make_order(
+            0, customer_id=customer_id, shipping_address="726 Broadway, NY 10003", status=OrderStatus.CREATED
+        )
+        item1 = ItemFactory(order=order1)
+        item1.create()
+        item_id = item1.id
+        response = self.client.delete(
+            f"{BASE_URL}/{order1.id}/item/{item_id}",
+            content_type="application/json",
+        )
+        # print(response.data)
+        # item_view = response.get_json()
+
+        # logger.info("***************** RECEIVED DATA *******************")
+        # logger.info(item_view)
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.delete(
+            f"{BASE_URL}/70210/item/{item_id}",
+            content_type="application/json",
+        )
+        print("RESPONSE: ", response)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.delete(
+            f"{BASE_URL}/{order1.id}/item/12434353",
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_add_item(self):
+        """It should Create a new Item"""
+        customer_id = random.randint(0, 10000)
+        order1 = make_order(
+            0, customer_id=customer_id, shipping_address="726 Broadway, NY 10003", status=OrderStatus.CREATED
+        )
+
+        item1 = ItemFactory(order=order1)
+        item1.create()
+
+        # Perform POST request to create a new item
+        response = self.client.post(
+            f"{BASE_URL}/{order1.id}/items",
+            json=item1.serialize(),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # Check if 'Location' header is present
+        location = response.headers.get("Location")
+        self.assertIsNotNone(location)
+
+        # Perform GET request to retrieve the newly created item
+        response = self.client.get(location)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Validate the retrieved item matches the created item
+        new_item = response.get_json()
+        self.assertIsInstance(new_item, dict)
+        self.assertEqual(str(new_item["product_id"]), str(item1.product_id))
+        self.assertEqual(new_item["product_description"], item1.product_description)
+        self.assertEqual(float(new_item["price"]), float(item1.price))
+        self.assertEqual(int(new_item["quantity"]), item1.quantity)
+
+    def test_add_item_sad_path_invalid_json(self):
+        """Test adding a new item with invalid JSON data."""
+        customer_id = random.randint(0, 10000)
+        order1 = make_order(
+            0, customer_id=customer_id, shipping_address="726 Broadway, NY 10003", status=OrderStatus.CREATED
+        )
+
+        # Perform POST request with invalid JSON data
+        response = self.client.post(
+            f"{BASE_URL}/{order1.id}/items",
+            data="Invalid JSON data",
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_add_item_sad_path_no_data(self):
+        """Test adding a new item with no item data."""
+        customer_id = random.randint(0, 10000)
+        order1 = make_order(
+            0, customer_id=customer_id, shipping_address="726 Broadway, NY 10003", status=OrderStatus.CREATED
+        )
+
+        # Perform POST request with invalid JSON data
+        response = self.client.post(
+            f"{BASE_URL}/{order1.id}/items",
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_add_item_sad_path_missing_fields(self):
+        """Test adding a new item with missing required fields."""
+        customer_id = random.randint(0, 10000)
+        order1 = make_order(
+            0, customer_id=customer_id, shipping_address="726 Broadway, NY 10003", status=OrderStatus.CREATED
+        )
+
+        # Create an item with missing required fields
+        incomplete_item = {
+            "product_id": 12345,
+            # Missing 'quantity', 'product_description', 'price'
+        }
+
+        # Perform POST request with incomplete item data
+        response = self.client.post(
+            f"{BASE_URL}/{order1.id}/items",
+            json=incomplete_item,
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_add_item_sad_path_order_not_found(self):
+        """Test adding a new item to a non-existent order."""
+        non_existent_order_id = 99999
+
+        # Perform POST request to add item to a non-existent order
+        response = self.client.post(
+            f"{BASE_URL}/{non_existent_order_id}/items",
+            json={
+                "product_id": 12345,
+                "quantity": 1,
+                "product_description": "Test Product",
+                "price": 10.99,
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_update_item(self):
+        """It should update the item in order"""
+        customer_id = random.randint(0, 10000)
+
+        order = make_order(
+            0, customer_id=customer_id, shipping_address="1428 Elm St", status=OrderStatus.CREATED
+        )
+
+        item = Item(
+            order_id=order.id,
+            product_id=1,
+            quantity=2,
+            price=23.4,
+            product_description="Apple",
+        )
+        item.create()
+
+        # update the quantities and total price
+        update_data = {
+            "quantity": 5,
+            "price": 30.0,
+        }
+
+        logger.info("***************** SENT ITEM DATA *******************")
+        logger.info(update_data)
+
+        response = self.client.put(
+            f"{BASE_URL}/{order.id}/item/{item.id}",
+            json=update_data,
+            content_type="application/json",
+        )
+
+        updated_item = response.get_json()
+
+        logger.info("***************** RECEIVED ITEM DATA *******************")
+        logger.info(updated_item)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(updated_item["quantity"], update_data["quantity"])
+        self.assertEqual(updated_item["price"], update_data["price"])
+
+    def test_update_item_order_not_found(self):
+        """It should check if it can't find order"""
+        non_existent_order_id = random.randint(10001, 20000)
+        item_id = random.randint(1, 100)
+
+        update_data = {
+            "product_id": 2,
+            "quantity": 5,
+            "price": 30.0,
+        }
+
+        response = self.client.put(
+            f"{BASE_URL}/{non_existent_order_id}/item/{item_id}",
+            json=update_data,
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn(
+            f"Order ID {non_existent_order_id} not found",
+            response.get_json()["message"],
+        )
+
+    def test_update_item_not_found(self):
+        """It should check if it can't find item"""
+        customer_id = random.randint(0, 10000)
+
+        order = make_order(
+            0, customer_id=customer_id, shipping_address="1428 Elm St", status=OrderStatus.CREATED
+        )
+
+        # Create non exist item id
+        non_existent_item_id = random.randint(10001, 20000)
+
+        update_data = {
+            "product_id": 2,
+            "quantity": 5,
+            "price": 30.0,
+        }
+
+        response = self.client.put(
+            f"{BASE_URL}/{order.id}/item/{non_existent_item_id}",
+            json=update_data,
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn(
+            f"Item ID {non_existent_item_id} not found in Order ID {order.id}",
+            response.get_json()["message"],
+        )
+
+    def test_update_item_not_created(self):
+        """It should check if the order status is not CREATED"""
+        customer_id = random.randint(0, 10000)
+
+        # non CREATED
+        order = make_order(
+            0, customer_id=customer_id, shipping_address="1428 Elm St", status=OrderStatus.PROCESSING
+        )
+
+        item = Item(
+            order_id=order.id,
+            product_id=1,
+            quantity=2,
+            price=23.4,
+            product_description="Apple",
+        )
+        item.create()
+
+        update_data = {
+            "product_id": 2,
+            "quantity": 5,
+            "price": 30.0,
+        }
+
+        response = self.client.put(
+            f"{BASE_URL}/{order.id}/item/{item.id}",
+            json=update_data,
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(
+            f"Order ID {order.id} cannot be updated in its current status",
+            response.get_json()["message"],
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # ----------------------------------------------------------
+    # TEST LIST AND FILTER
+    # ----------------------------------------------------------
+    def test_list_items_in_order(self):
+        """It should list all items in an order"""
+        customer_id = random.randint(0, 10000)
+
+        order = make_order(
+            0, customer_id=customer_id, shipping_address="726 Broadway, NY 10003", status=OrderStatus.CREATED
+        )
+
+        item1 = Item(
+            order_id=order.id,
+            product_id=1,
+            quantity=2,
+            price=23.4,
+            product_description="Apple",
+        )
+        item1.create()
+
+        item2 = Item(
+            order_id=order.id,
+            product_id=2,
+            quantity=5,
+            price=50.0,
+            product_description="Banana",
+        )
+        item2.create()
+
+        response = self.client.get(
+            f"/api/orders/{order.id}/items", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        items_list = response.get_json()
+        self.assertIsInstance(items_list, list)
+        self.assertEqual(len(items_list), 2)
+
+        self.assertEqual(int(items_list[0]["product_id"]), int(item1.product_id))
+        self.assertEqual(int(items_list[0]["quantity"]), int(item1.quantity))
+        self.assertEqual(int(items_list[0]["price"]), int(item1.price))
+        self.assertEqual(
+            items_list[0]["product_description"], item1.product_description
+        )
+
+        self.assertEqual(int(items_list[1]["product_id"]), int(item2.product_id))
+        self.assertEqual(int(items_list[1]["quantity"]), int(item2.quantity))
+        self.assertEqual(int(items_list[1]["price"]), int(item2.price))
+        self.assertEqual(
+            items_list[1]["product_description"], item2.product_description
+        )
+
+    def test_list_items_in_nonexistent_order(self):
+        """It should check if the order does not exist"""
+        non_existent_order_id = random.randint(10001, 20000)
+
+        response = self.client.get(
+            f"/api/orders/{non_existent_order_id}/items",
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_items_filter_product_id(self):
+        """It should list items in an order filtered by product_id"""
+        order = make_order(
+            0, customer_id=random.randint(0, 10000), shipping_address="1428 Elm St", status=OrderStatus.CREATED
+        )
+
+        item1 = Item(
+            order_id=order.id,
+            product_id=101,
+            product_description="Product 01",
+            quantity=1,
+            price=10.0,
+        )
+        item1.create()
+
+        item2 = Item(
+            order_id=order.id,
+            product_id=102,
+            product_description="Product 02",
+            quantity=2,
+            price=20.0,
+        )
+        item2.create()
+
+        response = self.client.get(
+            f"{BASE_URL}/{order.id}/items?product_id=101",
+            content_type="application/json",
+        )
+
+        data = response.get_json()
+
+        logger.info("***************** RECEIVED ITEM DATA *******************")
+        logger.info(data)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(int(data[0]["product_id"]), 101)
+        self.assertEqual(data[0]["product_description"], "Product 01")
+        self.assertEqual(data[0]["quantity"], 1)
+        self.assertEqual(data[0]["price"], 10.0)
+
+    def test_list_items_filter_quantity(self):
+        """It should list items in an order filtered by quantity"""
+        order = make_order(
+            0, customer_id=random.randint(0, 10000), shipping_address="1428 Elm St", status=OrderStatus.CREATED
+        )
+
+        item1 = Item(
+            order_id=order.id,
+            product_id=101,
+            product_description="Product 01",
+            quantity=1,
+            price=10.0,
+        )
+        item1.create()
+
+        item2 = Item(
+            order_id=order.id,
+            product_id=102,
+            product_description="Product 02",
+            quantity=2,
+            price=20.0,
+        )
+        item2.create()
+
+        response = self.client.get(
+            f"{BASE_URL}/{order.id}/items?quantity=2",
+            content_type="application/json",
+        )
+
+        data = response.get_json()
+
+        logger.info("***************** RECEIVED ITEM DATA *******************")
+        logger.info(data)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]["quantity"], 2)
+        self.assertEqual(data[0]["product_description"], "Product 02")
+        self.assertEqual(data[0]["price"], 20.0)
+
+    def test_list_items_filter_price(self):
+        """It should list items in an order filtered by price"""
+        order = make_order(
+            0, customer_id=random.randint(0, 10000), shipping_address="1428 Elm St", status=OrderStatus.CREATED
+        )
+
+        item1 = Item(
+            order_id=order.id,
+            product_id=101,
+            product_description="Product 01",
+            quantity=1,
+            price=10.0,
+        )
+        item1.create()
+
+        item2 = Item(
+            order_id=order.id,
+            product_id=102,
+            product_description="Product 02",
+            quantity=2,
+            price=20.0,
+        )
+        item2.create()
+
+        response = self.client.get(
+            f"{BASE_URL}/{order.id}/items?price=20.0",
+            content_type="application/json",
+        )
+
+        data = response.get_json()
+
+        logger.info("***************** RECEIVED ITEM DATA *******************")
+        logger.info(data)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]["price"], 20.0)
+        self.assertEqual(data[0]["product_description"], "Product 02")
+        self.assertEqual(data[0]["quantity"], 2)
+
+    # ----------------------------------------------------------
+    # TEST ITEM READS
+    # ----------------------------------------------------------
+    def test_list_items_in_one_query(self):
+        """It should list the Items of an Order with a single query"""
+        order = make_order()
+        response, statements = self._count_selects("get", f"{BASE_URL}/{order.id}/items")
+        self.assertEqual(len(response.get_json()), 1)
+        self.assertEqual(len(statements), 1)
+        empty = Order(customer_id=1, shipping_address="1 Main St", status="CREATED")
+        empty.create()
+        response, statements = self._count_selects("get", f"{BASE_URL}/{empty.id}/items")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json(), [])
+        self.assertEqual(len(statements), 1)
+
+    def test_list_items_in_pages(self):
+        """It should page through the Items of an Order"""
+        order = make_order()
+        for _ in range(4):
+            Item(
+                order_id=order.id, product_id="101", product_description="Glucose", quantity=1, price=1.0
+            ).create()
+        expected = [item["id"] for item in self.client.get(f"{BASE_URL}/{order.id}/items").get_json()]
+        seen = []
+        query = "limit=2&product_id=101"
+        while True:
+            response = self.client.get(f"{BASE_URL}/{order.id}/items", query_string=query)
+            seen += [item["id"] for item in response.get_json()]
+            if "X-Next-Cursor" not in response.headers:
+                break
+            self.assertIn('rel="next"', response.headers["Link"])
+            query = f"limit=2&product_id=101&cursor={response.headers['X-Next-Cursor']}"
+        self.assertEqual(seen, expected[1:])
+
+    def test_delete_item_in_one_statement(self):
+        """It should delete an Item with one statement and update the totals"""
+        order = make_order()
+        item_id = order.items[0].id
+        response, statements = self._count_selects("delete", f"{BASE_URL}/{order.id}/item/{item_id}")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(len([sql for sql in statements if not sql.startswith("UPDATE")]), 1)
+        data = self.client.get(f"{BASE_URL}/{order.id}").get_json()
+        self.assertEqual((data["item_count"], data["total_amount"]), (0, 0.0))
+
+    # ----------------------------------------------------------
+    # TEST PATCH
+    # ----------------------------------------------------------
+    def test_patch_item(self):
+        """It should update some fields of an Item and the Order totals"""
+        order = make_order()
+        item_id = order.items[0].id
+        url = f"{BASE_URL}/{order.id}/item/{item_id}"
+        response, statements = self._count_selects("patch", url, json={"quantity": 3, "price": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual((data["id"], data["quantity"], data["price"]), (item_id, 3, 2.0))
+        # the item update and the totals refresh
+        self.assertEqual(len(statements), 2)
+        data = self.client.get(f"{BASE_URL}/{order.id}").get_json()
+        self.assertEqual((data["item_count"], data["total_amount"]), (1, 6.0))
+
+    def test_patch_item_bad_requests(self):
+        """It should not patch missing Items or Items of a processed Order"""
+        order = make_order()
+        url = f"{BASE_URL}/{order.id}/item/{order.items[0].id}"
+        for body in (
+            {},
+            {"product_id": 1},
+            {"quantity": "many"},
+            {"quantity": "2"},
+            {"quantity": 1.7},
+            {"quantity": True},
+            {"quantity": 2**31},
+            {"price": False},
+            {"price": "1.5"},
+        ):
+            response = self.client.patch(url, json=body)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+        # a whole number sent as a float is an integer
+        db.session.expire_all()
+        response = self.client.patch(url, json={"quantity": 2.0})
+        self.assertEqual(response.get_json()["quantity"], 2)
+        for missing in (f"{BASE_URL}/{order.id}/item/0", f"{BASE_URL}/0/item/{order.items[0].id}"):
+            response = self.client.patch(missing, json={"quantity": 1})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        shipped = make_order(status="PROCESSING")
+        response = self.client.patch(
+            f"{BASE_URL}/{shipped.id}/item/{shipped.items[0].id}", json={"quantity": 1}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("current status", response.get_json()["message"])
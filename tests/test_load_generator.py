@@ -0,0 +1,128 @@
+"""
+Load Generator Test Suite
+"""
+import json
+from http.client import RemoteDisconnected
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+from urllib.error import HTTPError, URLError
+from service.common.load_generator import (
+    LoadGenerator,
+    LoadReport,
+    OrderPool,
+    parse_mix,
+    percentile,
+)
+
+
+def fake_response(code, body=None):
+    """Creates a fake urlopen response"""
+    resp = MagicMock()
+    resp.status = code
+    resp.read.return_value = json.dumps(body).encode("utf-8") if body else b""
+    resp.__enter__.return_value = resp
+    return resp
+
+
+class FakeService:  # pylint: disable=too-few-public-methods
+    """Answers load generator requests like the Orders service would"""
+
+    def __init__(self):
+        self.next_id = 0
+        self.calls = []
+
+    def __call__(self, req, timeout=None):  # pylint: disable=unused-argument
+        self.calls.append((req.get_method(), req.full_url))
+        if req.get_method() == "POST":
+            self.next_id += 1
+            return fake_response(201, {"id": self.next_id})
+        if req.get_method() == "GET" and req.full_url.endswith("/orders"):
+            return fake_response(200, [])
+        return fake_response(200, {"id": 1})
+
+
+######################################################################
+#  T E S T   C A S E S
+######################################################################
+class TestLoadGenerator(TestCase):
+    """Load Generator Tests"""
+
+    def test_parse_mix(self):
+        """It should parse a traffic mix into weights"""
+        weights = parse_mix("create=20, get=80")
+        self.assertEqual(weights, {"create": 20, "get": 80})
+
+    def test_parse_bad_mix(self):
+        """It should reject unknown operations and bad weights"""
+        self.assertRaises(ValueError, parse_mix, "explode=10")
+        self.assertRaises(ValueError, parse_mix, "create=lots")
+        self.assertRaises(ValueError, parse_mix, "create=-1")
+        self.assertRaises(ValueError, parse_mix, "create=0,get=0")
+
+    def test_percentile(self):
+        """It should compute nearest-rank percentiles"""
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 95), 95)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile([], 99), 0.0)
+
+    def test_order_pool(self):
+        """It should track orders and walk them through their statuses"""
+        pool = OrderPool()
+        self.assertIsNone(pool.pick())
+        pool.add(1, "CREATED")
+        self.assertEqual(pool.pick("CREATED"), 1)
+        self.assertEqual(pool.advance(1), "PROCESSING")
+        self.assertIsNone(pool.pick("CREATED"))
+        self.assertEqual(pool.advance(1), "COMPLETED")
+        self.assertIsNone(pool.pick("CREATED", "PROCESSING"))
+
+    def test_report(self):
+        """It should summarize latencies and errors"""
+        report = LoadReport()
+        self.assertEqual(report.throughput, 0.0)
+        report.record("get", 0.010, True)
+        report.record("get", 0.020, False)
+        report.elapsed = 1.0
+        rows = report.summary()
+        self.assertEqual([row["operation"] for row in rows], ["get", "total"])
+        self.assertEqual(rows[0]["count"], 2)
+        self.assertEqual(rows[0]["errors"], 1)
+        self.assertEqual(report.throughput, 2.0)
+        self.assertIn("2 requests", report.format())
+
+    @patch("service.common.load_generator.urlopen")
+    def test_run(self, urlopen_mock):
+        """It should run every operation in the mix"""
+        service = FakeService()
+        urlopen_mock.side_effect = service
+        weights = parse_mix("create=1,list=1,get=1,update=1,status=1")
+        report = LoadGenerator("http://test/", weights).run(50, 4)
+        self.assertEqual(report.total, 50)
+        self.assertEqual(sum(report.errors.values()), 0)
+        methods = {method for method, _ in service.calls}
+        self.assertEqual(methods, {"GET", "POST", "PUT"})
+
+    @patch("service.common.load_generator.urlopen")
+    def test_operations_without_orders(self, urlopen_mock):
+        """It should create an order when there is none to work on"""
+        urlopen_mock.side_effect = FakeService()
+        generator = LoadGenerator("http://test", {"get": 1})
+        self.assertTrue(generator.get())
+        generator = LoadGenerator("http://test", {"update": 1})
+        self.assertTrue(generator.update())
+        generator = LoadGenerator("http://test", {"status": 1})
+        self.assertTrue(generator.status())
+
+    @patch("service.common.load_generator.urlopen")
+    def test_send_errors(self, urlopen_mock):
+        """It should report HTTP and connection errors as failures"""
+        generator = LoadGenerator("http://test", {"list": 1})
+        urlopen_mock.side_effect = HTTPError("http://test", 500, "boom", {}, None)
+        self.assertEqual(generator.send("GET"), (500, None))
+        urlopen_mock.side_effect = URLError("refused")
+        self.assertEqual(generator.send("GET"), (0, None))
+        urlopen_mock.side_effect = RemoteDisconnected("closed")
+        self.assertEqual(generator.send("GET"), (0, None))
+        self.assertFalse(generator.list())
@@ -0,0 +1,131 @@
+"""
+Migrations Test Suite
+"""
+
+import logging
+from unittest import TestCase
+from sqlalchemy import create_engine, inspect, text
+from wsgi import app
+from service.models import db
+from service.common import migrations
+from service.common.migrations import SchemaVersionError
+
+SCHEMA = "migrations_test"
+
+
+######################################################################
+#  T E S T   C A S E S
+######################################################################
+# pylint: disable=duplicate-code
+class TestMigrations(TestCase):
+    """Schema Migration Tests"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Run once before all tests"""
+        app.config["TESTING"] = True
+        app.config["DEBUG"] = False
+        app.logger.setLevel(logging.CRITICAL)
+        app.app_context().push()
+
+    def setUp(self):
+        """Migrates an empty schema of its own instead of the test database"""
+        with db.engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        self.engine = create_engine(db.engine.url, connect_args={"options": f"-csearch_path={SCHEMA}"})
+
+    def tearDown(self):
+        """Throws the schema away"""
+        self.engine.dispose()
+        with db.engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+    def _versions(self, applied):
+        return [migration.version for migration in applied]
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_upgrade_new_database(self):
+        """It should create the whole schema in a new database once"""
+        applied = migrations.upgrade(self.engine)
+        self.assertEqual(self._versions(applied), [1, 2, 3, 4, 5, 6])
+        tables = inspect(self.engine).get_table_names()
+        for table in db.metadata.tables:
+            self.assertIn(table, tables)
+        self.assertEqual(
+            sorted(inspect(self.engine).get_materialized_view_names()),
+            ["order_daily_stats", "product_daily_stats"],
+        )
+        self.assertEqual(migrations.upgrade(self.engine), [])
+        self.assertEqual(migrations.verify(self.engine), migrations.LATEST_VERSION)
+
+    def test_drop(self):
+        """It should drop every table and view the migrations created"""
+        migrations.upgrade(self.engine)
+        migrations.drop(self.engine)
+        schema = inspect(self.engine)
+        self.assertEqual(schema.get_table_names(), [])
+        self.assertEqual(schema.get_materialized_view_names(), [])
+        self.assertEqual(self._versions(migrations.upgrade(self.engine)), [1, 2, 3, 4, 5, 6])
+
+    def test_upgrade_matches_the_models(self):
+        """It should create the columns and indexes the models expect"""
+        migrations.upgrade(self.engine)
+        schema = inspect(self.engine)
+        for table in db.metadata.sorted_tables:
+            columns = {column["name"] for column in schema.get_columns(table.name)}
+            self.assertEqual(columns, set(table.columns.keys()), table.name)
+            indexes = {index["name"] for index in schema.get_indexes(table.name)}
+            self.assertLessEqual({index.name for index in table.indexes}, indexes, table.name)
+
+    def test_upgrade_in_steps(self):
+        """It should stop at a version and carry on from it later"""
+        self.assertEqual(self._versions(migrations.upgrade(self.engine, 2)), [1, 2])
+        with self.engine.connect() as conn:
+            self.assertEqual(migrations.current_version(conn), 2)
+        self.assertRaises(SchemaVersionError, migrations.verify, self.engine)
+        self.assertEqual(self._versions(migrations.upgrade(self.engine)), [3, 4, 5, 6])
+
+    def test_upgrade_old_database(self):
+        """It should upgrade a database created before the schema had a version"""
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TYPE orderstatus AS ENUM ('CREATED', 'PROCESSING', 'COMPLETED')"))
+            conn.execute(
+                text(
+                    'CREATE TABLE "order" (id serial PRIMARY KEY, customer_id varchar(16) NOT NULL, '
+                    "shipping_address varchar(128) NOT NULL, created_at date NOT NULL, "
+                    "status orderstatus NOT NULL DEFAULT 'CREATED')"
+                )
+            )
+            conn.execute(
+                text(
+                    "CREATE TABLE item (id serial PRIMARY KEY, "
+                    'order_id integer NOT NULL REFERENCES "order" (id) ON DELETE CASCADE, '
+                    "product_id varchar(16) NOT NULL, product_description varchar(64) NOT NULL, "
+                    "quantity integer NOT NULL, price float NOT NULL)"
+                )
+            )
+            conn.execute(text("INSERT INTO \"order\" VALUES (1, 'C1', '1 Main Street', current_date, 'CREATED')"))
+            conn.execute(text("INSERT INTO item VALUES (1, 1, 'P1', 'red shoes', 2, 5.0), (2, 1, 'P2', 'hat', 1, 3.0)"))
+
+        self.assertEqual(self._versions(migrations.upgrade(self.engine)), [1, 2, 3, 4, 5, 6])
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text("SELECT total_amount, item_count, search_vector @@ to_tsquery('street') FROM \"order\"")
+            ).one()
+            self.assertEqual(tuple(row), (13.0, 2, True))
+            indexes = [index["name"] for index in inspect(conn).get_indexes("order")]
+        self.assertIn("ix_order_created_at_id", indexes)
+
+    def test_verify(self):
+        """It should refuse an older schema and accept a newer one"""
+        with self.assertRaises(SchemaVersionError) as context:
+            migrations.verify(self.engine)
+        self.assertIn("version 0", str(context.exception))
+        migrations.upgrade(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(migrations.schema_version.insert().values(version=99, description="From the future"))
+        self.assertEqual(migrations.verify(self.engine), 99)
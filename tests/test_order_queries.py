@@ -0,0 +1,270 @@
+"""
+Test cases for listing, searching, looking up and counting Orders
+"""
+
+from datetime import date, timedelta
+from unittest.mock import patch
+from urllib.parse import quote_plus
+from sqlalchemy import event, text
+from wsgi import app
+from service.common import status
+from service.models import db, Order, Item, OrderArchive
+from .base import RouteTestCase, BASE_URL
+from .factories import OrderFactory, make_order
+
+
+######################################################################
+#  O R D E R   Q U E R Y   T E S T   C A S E S
+######################################################################
+class TestOrderQueries(RouteTestCase):
+    """Test Cases for the Order list, search, lookup and count routes"""
+
+    def _create_orders(self, count: int = 1) -> list:
+        """Factory method to create Orders in bulk"""
+        orders = []
+        for _ in range(count):
+            test_order = OrderFactory()
+            response = self.client.post(BASE_URL, json=test_order.serialize())
+            self.assertEqual(
+                response.status_code,
+                status.HTTP_201_CREATED,
+                "Could not create test Order",
+            )
+            new_orders = response.get_json()
+            test_order.id = new_orders["id"]
+            orders.append(test_order)
+        return orders
+
+    # ----------------------------------------------------------
+    # TEST LIST AND QUERY
+    # ----------------------------------------------------------
+    def test_get_order_list(self):
+        """It should Get a list of Orders"""
+        self._create_orders(5)
+        response = self.client.get(BASE_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual(len(data), 5)
+
+    def test_query_by_customer_id(self):
+        """It should Query Orders by customer id"""
+        orders = self._create_orders(5)
+        test_customer_id = orders[0].customer_id
+        cust_count = len(
+            [order for order in orders if order.customer_id == test_customer_id]
+        )
+        response = self.client.get(
+            BASE_URL, query_string=f"customer_id={quote_plus(str(test_customer_id))}"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual(len(data), cust_count)
+        # check the data just to be sure
+        for order in data:
+            self.assertEqual(str(order["customer_id"]), str(test_customer_id))
+
+    def test_query_by_status(self):
+        """It should Query Orders by status"""
+        orders = self._create_orders(5)
+        test_status = orders[0].status
+        status_count = len([order for order in orders if order.status == test_status])
+        response = self.client.get(
+            BASE_URL, query_string=f"status_name={test_status.name}"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual(len(data), status_count)
+        # check the data just to be sure
+        for order in data:
+            self.assertEqual(order["status"], test_status.name)
+
+    # ----------------------------------------------------------
+    # TEST DATE RANGE AND PAGINATION
+    # ----------------------------------------------------------
+    def test_list_orders_by_date_range(self):
+        """It should list the Orders created within a date range"""
+        for days in (10, 5, 0):
+            make_order(created_at=date.today() - timedelta(days=days))
+        created_from = date.today() - timedelta(days=6)
+        response = self.client.get(BASE_URL, query_string=f"created_from={created_from}")
+        self.assertEqual(len(response.get_json()), 2)
+        response = self.client.get(
+            BASE_URL, query_string=f"created_from={created_from}&created_to={created_from}"
+        )
+        self.assertEqual(response.get_json(), [])
+        response = self.client.head(BASE_URL, query_string=f"created_to={created_from}")
+        self.assertEqual(response.headers["X-Total-Count"], "1")
+
+    def test_list_orders_in_pages(self):
+        """It should walk every sort order page by page with a cursor"""
+        for days in (3, 1, 1, 2, 0):
+            make_order(created_at=date.today() - timedelta(days=days))
+        for sort in ("id", "-created_at", "total_amount", "-item_count"):
+            expected = [order["id"] for order in self.client.get(BASE_URL, query_string=f"sort={sort}").get_json()]
+            seen = []
+            query = f"sort={sort}&limit=2"
+            while True:
+                response = self.client.get(BASE_URL, query_string=query)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                seen += [order["id"] for order in response.get_json()]
+                if "X-Next-Cursor" not in response.headers:
+                    break
+                self.assertIn('rel="next"', response.headers["Link"])
+                query = f"sort={sort}&limit=2&cursor={response.headers['X-Next-Cursor']}"
+            self.assertEqual(seen, expected, sort)
+        created_at = [order["created_at"] for order in self.client.get(BASE_URL, query_string="sort=-created_at").get_json()]
+        self.assertEqual(created_at, sorted(created_at, reverse=True))
+
+    def test_list_orders_bad_cursor(self):
+        """It should reject cursors it did not make"""
+        make_order()
+        make_order()
+        response = self.client.get(BASE_URL, query_string="limit=1")
+        cursor = response.headers["X-Next-Cursor"]
+        response = self.client.get(BASE_URL, query_string=f"limit=1&sort=-id&cursor={cursor}")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(BASE_URL, query_string="limit=1&cursor=garbage")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(BASE_URL, query_string="limit=0")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_orders_bad_arguments_outside_testing(self):
+        """It should answer 400 to a bad cursor or status when exceptions do not propagate"""
+        make_order()
+        with patch.dict(app.config, {"TESTING": False}):
+            for query in ("limit=1&cursor=zzz", "status=FOO", "status_name=FOO"):
+                response = self.client.get(BASE_URL, query_string=query)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+            response = self.client.head(BASE_URL, query_string="status=FOO")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(BASE_URL, query_string="status=created")
+        self.assertEqual(len(response.get_json()), 1)
+
+    # ----------------------------------------------------------
+    # TEST SEARCH
+    # ----------------------------------------------------------
+    def _make_search_order(self, address, *descriptions):
+        """Creates an Order with an address and Items with descriptions"""
+        order = Order(customer_id=1, shipping_address=address, status="CREATED")
+        for description in descriptions:
+            order.items.append(
+                Item(product_id="1", product_description=description, quantity=1, price=1.0)
+            )
+        order.create()
+        return order.id
+
+    def test_search_orders(self):
+        """It should find Orders by address or item description, best match first"""
+        both = self._make_search_order("12 Banana Road", "Banana bread")
+        address = self._make_search_order("7 Banana Road", "Glucose")
+        item = self._make_search_order("1 Main Street", "Ripe bananas", "Milk")
+        self._make_search_order("2 Main Street", "Glucose")
+        response = self.client.get(BASE_URL, query_string="q=banana")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [order["id"] for order in response.get_json()]
+        self.assertEqual(ids[0], both)
+        self.assertEqual(sorted(ids[1:]), sorted([address, item]))
+        response = self.client.get(BASE_URL, query_string='q="banana bread"')
+        self.assertEqual([order["id"] for order in response.get_json()], [both])
+        response = self.client.head(BASE_URL, query_string="q=glucose")
+        self.assertEqual(response.headers["X-Total-Count"], "2")
+        response = self.client.get(BASE_URL, query_string="q=glucose&sort=id")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_orders_in_pages(self):
+        """It should page through search results with a cursor"""
+        expected = [self._make_search_order(f"{number} Elm Street") for number in range(5)]
+        seen = []
+        query = "q=elm&limit=2"
+        while True:
+            response = self.client.get(BASE_URL, query_string=query)
+            seen += [order["id"] for order in response.get_json()]
+            if "X-Next-Cursor" not in response.headers:
+                break
+            query = f"q=elm&limit=2&cursor={response.headers['X-Next-Cursor']}"
+        self.assertEqual(seen, expected[::-1])
+
+    # ----------------------------------------------------------
+    # TEST LOOKUP
+    # ----------------------------------------------------------
+    def test_lookup_orders(self):
+        """It should return many Orders keyed by id in two queries"""
+        orders = [make_order() for _ in range(3)]
+        ids = [orders[0].id, orders[2].id, orders[0].id]
+        db.session.expire_all()
+        statements = []
+
+        def capture(conn, cursor, statement, *args):  # pylint: disable=unused-argument
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", capture)
+        try:
+            response = self.client.post(f"{BASE_URL}:lookup", json={"ids": ids})
+        finally:
+            event.remove(db.engine, "before_cursor_execute", capture)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual(set(data["orders"]), {str(orders[0].id), str(orders[2].id)})
+        self.assertEqual(len(data["orders"][str(orders[0].id)]["items"]), 1)
+        self.assertEqual(data["missing"], [])
+        self.assertEqual(len([sql for sql in statements if sql.startswith("SELECT")]), 2)
+
+        response = self.client.post(f"{BASE_URL}:lookup", json={"ids": [0, orders[1].id]})
+        self.assertEqual(list(response.get_json()["orders"]), [str(orders[1].id)])
+        self.assertEqual(response.get_json()["missing"], [0])
+
+    def test_lookup_archived_orders(self):
+        """It should also return archived Orders"""
+        order_id = make_order(
+            status="COMPLETED", created_at=date.today() - timedelta(days=365)
+        ).id
+        OrderArchive.archive_completed(days=90)
+        response = self.client.post(f"{BASE_URL}:lookup", json={"ids": [order_id]})
+        self.assertEqual(list(response.get_json()["orders"]), [str(order_id)])
+        self.assertEqual(response.get_json()["missing"], [])
+        db.session.query(OrderArchive).delete()
+        db.session.commit()
+
+    def test_lookup_bad_ids(self):
+        """It should reject invalid or too many ids"""
+        for body in ({}, {"ids": "1,2"}, {"ids": [1, "x"]}, {"ids": list(range(501))}):
+            response = self.client.post(f"{BASE_URL}:lookup", json=body)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # ----------------------------------------------------------
+    # TEST COUNT
+    # ----------------------------------------------------------
+    def test_count_orders(self):
+        """It should count the Orders matching the filters with HEAD"""
+        make_order(customer_id=1, status="COMPLETED")
+        make_order(customer_id=1, status="CREATED")
+        make_order(customer_id=2, status="CREATED")
+        response = self.client.head(BASE_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers["X-Total-Count"], "3")
+        self.assertEqual(response.data, b"")
+        response = self.client.head(BASE_URL, query_string="customer_id=1&status=created")
+        self.assertEqual(response.headers["X-Total-Count"], "1")
+        response = self.client.head(BASE_URL, query_string="status_name=CREATED&estimate=true")
+        self.assertEqual(response.headers["X-Total-Count"], "2")
+        self.assertNotIn("X-Total-Count-Estimated", response.headers)
+        response = self.client.head(BASE_URL, query_string="status=shipped")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_count_leaves_out_archived_orders(self):
+        """It should count the Orders GET lists, which leaves out the archive"""
+        make_order(status="COMPLETED", created_at=date.today() - timedelta(days=365))
+        make_order()
+        OrderArchive.archive_completed(days=90)
+        response = self.client.head(BASE_URL)
+        self.assertEqual(response.headers["X-Total-Count"], "1")
+        self.assertEqual(len(self.client.get(BASE_URL).get_json()), 1)
+
+    def test_estimate_order_count(self):
+        """It should estimate the count of all Orders from the planner statistics"""
+        for _ in range(3):
+            make_order()
+        db.session.execute(text('ANALYZE "order"'))
+        response = self.client.head(BASE_URL, query_string="estimate=true")
+        self.assertEqual(response.headers["X-Total-Count-Estimated"], "true")
+        self.assertEqual(response.headers["X-Total-Count"], "3")
@@ -0,0 +1,146 @@
+"""
+Test cases for the Order Event outbox
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import func, select, update
+from service.models import (
+    db,
+    Order,
+    Item,
+    OrderArchive,
+    OrderEvent,
+    OrderStatus,
+    DataValidationError,
+    apply_item_batch,
+)
+from service.common.bulk_data import BulkLoader, generate_orders
+from .base import DatabaseTestCase
+from .factories import make_order
+
+
+######################################################################
+#  O U T B O X   T E S T   C A S E S
+######################################################################
+class TestOrderEvent(DatabaseTestCase):
+    """Test Cases for the Order Event outbox"""
+
+    def _events(self):
+        """Returns the (order_id, type) of every event in order"""
+        events, _ = OrderEvent.changes(limit=1000)
+        db.session.rollback()
+        return [(event.order_id, event.type) for event in events]
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_orm_changes(self):
+        """It should write one event per Order changed through the ORM"""
+        order = make_order(items=2, )
+        order.shipping_address = "1 New St"
+        order.update()
+        order.status = OrderStatus.PROCESSING
+        order.update()
+        Item(order_id=order.id, product_id="1", product_description="A", quantity=1, price=1.0).create()
+        order.items[0].delete()
+        self.assertEqual(
+            self._events(),
+            [(order.id, event_type) for event_type in ("created", "updated", "status", "updated", "updated")],
+        )
+        event = OrderEvent.changes(limit=1000)[0][-1]
+        self.assertEqual(event.payload["item_count"], 2)
+        self.assertEqual(event.payload["status"], "PROCESSING")
+        self.assertEqual(event.serialize()["order_id"], order.id)
+
+    def test_orm_delete(self):
+        """It should write a deleted event when the ORM deletes an Order"""
+        order = make_order()
+        order_id = order.id
+        db.session.delete(order)
+        db.session.commit()
+        self.assertEqual(self._events(), [(order_id, "created"), (order_id, "deleted")])
+        event = OrderEvent.changes(limit=1000)[0][-1]
+        self.assertEqual(event.payload, {"id": order_id})
+
+    def test_statement_changes(self):
+        """It should write events for the changes that bypass the ORM"""
+        orders = [make_order() for _ in range(3)]
+        first, second, third = (order.id for order in orders)
+        item_id = orders[1].items[0].id
+        Order.patch(first, {"status": "PROCESSING"})
+        Order.patch(second, {"shipping_address": "1 New St"})
+        Item.patch(second, item_id, {"quantity": 2})
+        Item.delete_from_order(second, item_id)
+        new_item = {"product_id": 1, "product_description": "A", "quantity": 1, "price": 1.0}
+        apply_item_batch(second, [{"op": "add", "value": new_item}])
+        Order.delete_by_id(second)
+        Order.delete_where(Order.id == third)
+        self.assertEqual(
+            self._events()[3:],
+            [
+                (first, "status"),
+                (second, "updated"),
+                (second, "updated"),
+                (second, "updated"),
+                (second, "updated"),
+                (second, "deleted"),
+                (third, "deleted"),
+            ],
+        )
+
+    def test_archive_and_import(self):
+        """It should write events for archived and imported Orders"""
+        order_id = make_order(
+            status=OrderStatus.COMPLETED, created_at=date.today() - timedelta(days=100)
+        ).id
+        OrderArchive.archive_completed(90)
+        BulkLoader().load(generate_orders(2))
+        events = self._events()
+        self.assertEqual(events[:2], [(order_id, "created"), (order_id, "archived")])
+        self.assertEqual([event_type for _, event_type in events[2:]], ["created", "created"])
+
+    def test_changes_in_pages(self):
+        """It should page through the events with a cursor"""
+        for _ in range(5):
+            make_order()
+        expected = self._events()
+        seen = []
+        events, cursor = OrderEvent.changes(limit=2)
+        while events:
+            seen += [(event.order_id, event.type) for event in events]
+            events, next_cursor = OrderEvent.changes(cursor, limit=2)
+            if not events:
+                # the cursor stays put when there is nothing new
+                self.assertEqual(next_cursor, cursor)
+            cursor = next_cursor
+        self.assertEqual(seen, expected)
+        order = make_order()
+        events, _ = OrderEvent.changes(cursor)
+        self.assertEqual([event.order_id for event in events], [order.id])
+        self.assertRaises(DataValidationError, OrderEvent.changes, "bad")
+
+    def test_running_transactions_are_not_passed(self):
+        """It should hold back events while an older transaction is running"""
+        first = make_order()
+        with db.engine.connect() as other:
+            # an open transaction that wrote something
+            OrderEvent.record(other, OrderEvent.DELETED, [0])
+            make_order()
+            self.assertEqual(self._events(), [(first.id, "created")])
+            other.commit()
+        self.assertEqual(len(self._events()), 3)
+
+    def test_purge(self):
+        """It should delete events older than a number of days"""
+        make_order()
+        make_order()
+        oldest = select(func.min(OrderEvent.id)).scalar_subquery()
+        db.session.execute(
+            update(OrderEvent)
+            .where(OrderEvent.id == oldest)
+            .values(created_at=datetime.now(timezone.utc) - timedelta(days=8))
+        )
+        db.session.commit()
+        self.assertEqual(OrderEvent.purge(7), 1)
+        self.assertEqual(len(self._events()), 1)
@@ -0,0 +1,105 @@
+"""
+Order Change Routes Test Suite
+"""
+
+from unittest.mock import patch
+from wsgi import app
+from service.common import status
+from service.common.status_hub import hub, Subscription, SubscriberLimitError
+from .base import RouteTestCase, BASE_URL
+from .factories import make_order
+
+
+######################################################################
+#  T E S T   C A S E S
+######################################################################
+class TestOrderChangeRoutes(RouteTestCase):
+    """Change Feed and Status Stream Tests"""
+
+    # ----------------------------------------------------------
+    # TEST CHANGE FEED
+    # ----------------------------------------------------------
+    def test_change_feed(self):
+        """It should return the Order changes after a cursor"""
+        order = make_order()
+        self.client.patch(f"{BASE_URL}/{order.id}", json={"status": "PROCESSING"})
+        response = self.client.get(f"{BASE_URL}/changes", query_string="limit=1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual([event["type"] for event in data["events"]], ["created"])
+        self.assertEqual(data["events"][0]["payload"]["id"], order.id)
+        response = self.client.get(f"{BASE_URL}/changes", query_string=f"cursor={data['next_cursor']}")
+        data = response.get_json()
+        self.assertEqual([event["type"] for event in data["events"]], ["status"])
+        self.assertEqual(data["events"][0]["payload"]["status"], "PROCESSING")
+        cursor = data["next_cursor"]
+        data = self.client.get(f"{BASE_URL}/changes", query_string=f"cursor={cursor}").get_json()
+        self.assertEqual(data, {"events": [], "next_cursor": cursor})
+        response = self.client.get(f"{BASE_URL}/changes", query_string="cursor=bad")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_change_feed_long_poll(self):
+        """It should wait for a change when there is none"""
+        order = make_order()
+        cursor = self.client.get(f"{BASE_URL}/changes").get_json()["next_cursor"]
+        with patch("service.outbox_routes.time.sleep") as sleep:
+            response = self.client.get(f"{BASE_URL}/changes", query_string=f"cursor={cursor}")
+            self.assertEqual(response.get_json()["events"], [])
+            self.assertEqual(sleep.call_count, 0)
+            # the order is deleted while the request waits
+            sleep.side_effect = lambda seconds: order.delete()
+            response = self.client.get(f"{BASE_URL}/changes", query_string=f"cursor={cursor}&wait=5")
+            self.assertEqual(sleep.call_count, 1)
+        self.assertEqual([event["type"] for event in response.get_json()["events"]], ["deleted"])
+
+    # ----------------------------------------------------------
+    # TEST STATUS STREAM
+    # ----------------------------------------------------------
+    def test_status_stream(self):
+        """It should stream the current status and the status changes of Orders"""
+        app.config["STATUS_STREAM_HEARTBEAT"] = 0.05
+        order = make_order()
+        response = self.client.get(f"{BASE_URL}/status-stream", query_string=f"ids={order.id}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.mimetype, "text/event-stream")
+        chunks = (chunk.decode() for chunk in response.response)
+        self.assertEqual(
+            next(chunks), f'event: status\ndata: {{"id": {order.id}, "status": "CREATED"}}\n\n'
+        )
+        self.assertEqual(next(chunks), ": keepalive\n\n")
+        self.client.put(f"{BASE_URL}/{order.id}/status", json={"status": "PROCESSING"})
+        received = next(chunk for chunk in chunks if chunk.startswith("event:"))
+        self.assertEqual(received, f'event: status\ndata: {{"id": {order.id}, "status": "PROCESSING"}}\n\n')
+        response.close()
+        self.assertEqual(hub.subscribers, 0)
+
+    def test_status_stream_limit(self):
+        """It should answer 503 to streams past the limit of the worker"""
+        order = make_order()
+        with patch.dict(app.config, {"STATUS_STREAM_MAX_THREADS": 1}):
+            first = self.client.get(f"{BASE_URL}/status-stream", query_string=f"ids={order.id}")
+            self.assertEqual(first.status_code, status.HTTP_200_OK)
+            response = self.client.get(f"{BASE_URL}/status-stream", query_string=f"ids={order.id}")
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertIn("At most 1 status streams", response.get_json()["message"])
+            first.close()
+            response = self.client.get(f"{BASE_URL}/status-stream", query_string=f"ids={order.id}")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response.close()
+
+    def test_status_stream_overflow(self):
+        """It should end the stream of a client that fell behind"""
+        with patch("service.outbox_routes.hub.subscribe") as subscribe:
+            subscribe.return_value = Subscription(queue_size=1)
+            subscribe.return_value.overflowed = True
+            response = self.client.get(f"{BASE_URL}/status-stream")
+            self.assertEqual(response.get_data(as_text=True), "event: reset\ndata: {}\n\n")
+            subscribe.side_effect = ConnectionError("down")
+            response = self.client.get(f"{BASE_URL}/status-stream")
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            subscribe.side_effect = SubscriberLimitError("full")
+            response = self.client.get(f"{BASE_URL}/status-stream")
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        ids = ",".join(str(order_id) for order_id in range(501))
+        response = self.client.get(f"{BASE_URL}/status-stream", query_string=f"ids={ids}")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
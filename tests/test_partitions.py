@@ -0,0 +1,121 @@
+"""
+Partitions Test Suite
+"""
+
+import logging
+from datetime import date
+from unittest import TestCase
+from sqlalchemy import text
+from wsgi import app
+from service.models import db
+from service.common import partitions
+
+TABLES = ("test_parent", "test_child")
+
+
+######################################################################
+#  T E S T   C A S E S
+######################################################################
+# pylint: disable=duplicate-code
+class TestPartitions(TestCase):
+    """Partition Maintenance Tests"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Run once before all tests"""
+        app.config["TESTING"] = True
+        app.config["DEBUG"] = False
+        app.logger.setLevel(logging.CRITICAL)
+        app.app_context().push()
+
+    def setUp(self):
+        """Creates a small partitioned parent and child table"""
+        self.conn = db.engine.connect()
+        self.transaction = self.conn.begin()
+        self.conn.execute(
+            text(
+                "CREATE TABLE test_parent (id int, created_at date, "
+                "PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)"
+            )
+        )
+        self.conn.execute(
+            text(
+                "CREATE TABLE test_child (id int, parent_id int, parent_created_at date, "
+                "PRIMARY KEY (id, parent_created_at), "
+                "FOREIGN KEY (parent_id, parent_created_at) "
+                "REFERENCES test_parent (id, created_at) ON DELETE CASCADE) "
+                "PARTITION BY RANGE (parent_created_at)"
+            )
+        )
+
+    def tearDown(self):
+        """Throws the test tables away"""
+        self.transaction.rollback()
+        self.conn.close()
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_month_start(self):
+        """It should find the first day of nearby months"""
+        self.assertEqual(partitions.month_start(date(2024, 3, 15)), date(2024, 3, 1))
+        self.assertEqual(partitions.month_start(date(2024, 11, 30), 2), date(2025, 1, 1))
+        self.assertEqual(partitions.month_start(date(2024, 1, 31), -1), date(2023, 12, 1))
+        self.assertEqual(partitions.partition_name("order", date(2024, 3, 1)), "order_p202403")
+
+    def test_is_partitioned(self):
+        """It should tell partitioned tables apart"""
+        self.assertTrue(partitions.is_partitioned(self.conn, "test_parent"))
+        self.assertFalse(partitions.is_partitioned(self.conn, "order_archive"))
+
+    def test_create_partitions(self):
+        """It should create monthly partitions once"""
+        created = partitions.create_partitions(self.conn, "test_parent", date(2024, 12, 5), 2)
+        self.assertEqual(created, ["test_parent_p202412", "test_parent_p202501"])
+        self.assertEqual(partitions.create_partitions(self.conn, "test_parent", date(2024, 12, 5), 2), [])
+        partitions.create_default_partition(self.conn, "test_parent")
+        self.conn.execute(text("INSERT INTO test_parent VALUES (1, '2025-01-31'), (2, '2030-01-01')"))
+        rows = self.conn.execute(text("SELECT tableoid::regclass::text FROM test_parent ORDER BY id")).scalars()
+        self.assertEqual(list(rows), ["test_parent_p202501", "test_parent_default"])
+
+    def test_create_partitions_moves_default_rows(self):
+        """It should move the rows of a new month out of the DEFAULT partition"""
+        for table in TABLES:
+            partitions.create_default_partition(self.conn, table)
+        self.conn.execute(text("INSERT INTO test_parent VALUES (1, '2024-02-03'), (2, '2024-03-04')"))
+        self.conn.execute(text("INSERT INTO test_child VALUES (1, 1, '2024-02-03'), (2, 2, '2024-03-04')"))
+        result = partitions.maintain(self.conn, ahead=0, retain=0, today=date(2024, 2, 10), tables=TABLES)
+        self.assertEqual(result["created"], ["test_parent_p202402", "test_child_p202402"])
+        for table in TABLES:
+            rows = self.conn.execute(text(f"SELECT tableoid::regclass::text FROM {table} ORDER BY id")).scalars()
+            self.assertEqual(list(rows), [f"{table}_p202402", f"{table}_default"])
+        self.assertEqual(partitions.partition_key(self.conn, "test_child"), "parent_created_at")
+
+    def test_maintain(self):
+        """It should create future partitions and detach old ones"""
+        today = date(2024, 6, 10)
+        for table in TABLES:
+            partitions.create_partitions(self.conn, table, date(2024, 1, 1), 3)
+        self.conn.execute(text("INSERT INTO test_parent VALUES (1, '2024-01-02')"))
+        self.conn.execute(text("INSERT INTO test_child VALUES (1, 1, '2024-01-02')"))
+        result = partitions.maintain(self.conn, ahead=1, retain=4, today=today, tables=TABLES)
+        self.assertEqual(
+            result["created"],
+            ["test_parent_p202406", "test_parent_p202407", "test_child_p202406", "test_child_p202407"],
+        )
+        self.assertEqual(result["detached"], ["test_child_p202401", "test_parent_p202401"])
+        self.assertEqual(
+            partitions.partitions(self.conn, "test_parent"),
+            ["test_parent_p202402", "test_parent_p202403", "test_parent_p202406", "test_parent_p202407"],
+        )
+        # the detached data is kept as a plain table
+        count = self.conn.execute(text("SELECT count(*) FROM test_child_p202401")).scalar()
+        self.assertEqual(count, 1)
+
+    def test_maintain_keeps_everything(self):
+        """It should not detach anything when retain is 0"""
+        partitions.create_partitions(self.conn, "test_parent", date(2020, 1, 1), 1)
+        result = partitions.maintain(self.conn, ahead=0, retain=0, tables=("test_parent",))
+        self.assertEqual(result["detached"], [])
+        self.assertEqual(len(result["created"]), 1)
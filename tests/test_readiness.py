@@ -0,0 +1,88 @@
+"""
+Readiness Test Suite
+"""
+
+import logging
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+from sqlalchemy.exc import OperationalError
+from wsgi import app
+from service.models import db
+from service.common.readiness import Readiness, retry_database, warm_pool
+
+ERROR = OperationalError("SELECT 1", {}, Exception("connection refused"))
+
+
+######################################################################
+#  R E A D I N E S S   T E S T   C A S E S
+######################################################################
+# pylint: disable=duplicate-code
+class TestReadiness(TestCase):
+    """Test Cases for the Readiness of a worker"""
+
+    @classmethod
+    def setUpClass(cls):
+        """This runs once before the entire test suite"""
+        app.config["TESTING"] = True
+        app.config["DEBUG"] = False
+        app.logger.setLevel(logging.CRITICAL)
+        app.app_context().push()
+
+    def setUp(self):
+        """This runs before each test"""
+        self.settings = patch.dict(app.config, RETRY_COUNT=3, RETRY_DELAY=0.01, RETRY_MAX_DELAY=0.02)
+        self.settings.start()
+
+    def tearDown(self):
+        """This runs after each test"""
+        self.settings.stop()
+
+    def test_retry_database(self):
+        """It should retry while the database cannot be reached"""
+        func = MagicMock(side_effect=[ERROR, ERROR, 7])
+        with patch("retry.api.time.sleep") as sleep_mock:
+            self.assertEqual(retry_database(app, func, "a"), 7)
+        func.assert_called_with("a")
+        # exponential backoff up to the maximum delay
+        self.assertEqual([call.args[0] for call in sleep_mock.call_args_list], [0.01, 0.02])
+        func = MagicMock(side_effect=ERROR)
+        self.assertRaises(OperationalError, retry_database, app, func)
+        self.assertEqual(func.call_count, 3)
+        # other errors are not retried
+        func = MagicMock(side_effect=ValueError())
+        self.assertRaises(ValueError, retry_database, app, func)
+        self.assertEqual(func.call_count, 1)
+
+    def test_warm_pool(self):
+        """It should open every connection of the pool"""
+        db.engine.dispose()
+        size = warm_pool(db.engine)
+        self.assertEqual(size, db.engine.pool.size())
+        self.assertEqual(db.engine.pool.checkedin(), size)
+
+    def test_ready(self):
+        """It should be ready once the pool of this process is warm"""
+        readiness = Readiness()
+        readiness.init_app(app)
+        self.assertFalse(readiness.ready)
+        readiness.start()
+        self.assertTrue(readiness.wait(5))
+        self.assertTrue(readiness.ready)
+        with patch("service.common.readiness.threading.Thread") as thread_mock:
+            readiness.start()
+        thread_mock.assert_not_called()
+        # a forked worker warms its own pool
+        with patch("service.common.readiness.os.getpid", return_value=-1):
+            self.assertFalse(readiness.ready)
+
+    def test_not_ready(self):
+        """It should stay not ready when the database cannot be reached"""
+        readiness = Readiness()
+        readiness.init_app(app)
+        with patch("service.common.readiness.warm_pool", side_effect=ERROR) as warm_mock:
+            readiness.start()
+            self.assertFalse(readiness.wait(0.5))
+        self.assertEqual(warm_mock.call_count, 3)
+        # the next check starts over
+        readiness.start()
+        self.assertTrue(readiness.wait(5))
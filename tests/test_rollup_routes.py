@@ -0,0 +1,141 @@
+"""
+Order Statistics Routes Test Suite
+"""
+
+from datetime import date, timedelta
+from service.common import status
+from service.models import db, Order, Item, OrderArchive, OrderStatus, StatsRollup
+from .base import RouteTestCase, BASE_URL
+from .factories import make_order
+
+
+######################################################################
+#  T E S T   C A S E S
+######################################################################
+class TestOrderStatsRoutes(RouteTestCase):
+    """Order Statistics Tests"""
+
+    # ----------------------------------------------------------
+    # TEST STATS
+    # ----------------------------------------------------------
+    def _make_stats_orders(self):
+        """Creates Orders with known Items on two days"""
+        yesterday = date.today() - timedelta(days=1)
+        for order_status, created_at, items in (
+            ("CREATED", yesterday, [("1", 2, 10.0), ("2", 1, 5.0)]),
+            ("COMPLETED", yesterday, [("1", 1, 10.0)]),
+            ("COMPLETED", date.today(), [("3", 4, 1.0)]),
+        ):
+            order = Order(
+                customer_id=1,
+                shipping_address="726 Broadway",
+                status=order_status,
+                created_at=created_at,
+            )
+            for product_id, quantity, price in items:
+                order.items.append(
+                    Item(
+                        product_id=product_id,
+                        product_description=f"Product {product_id}",
+                        quantity=quantity,
+                        price=price,
+                    )
+                )
+            order.create()
+        return yesterday
+
+    def test_stats_by_status(self):
+        """It should count orders and revenue by status"""
+        self._make_stats_orders()
+        response = self.client.get(f"{BASE_URL}/stats", query_string="group_by=status&live=true")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual(data["group_by"], "status")
+        self.assertIsNone(data["refreshed_at"])
+        self.assertEqual(
+            data["rows"],
+            [
+                {"key": "CREATED", "orders": 1, "items": 2, "revenue": 25.0},
+                {"key": "COMPLETED", "orders": 2, "items": 2, "revenue": 14.0},
+            ],
+        )
+
+    def test_stats_by_day_in_range(self):
+        """It should count orders by day within a date range"""
+        yesterday = self._make_stats_orders()
+        response = self.client.get(
+            f"{BASE_URL}/stats",
+            query_string=f"group_by=day&created_from={yesterday}&created_to={yesterday}&live=1",
+        )
+        rows = response.get_json()["rows"]
+        self.assertEqual(rows, [{"key": str(yesterday), "orders": 2, "items": 3, "revenue": 35.0}])
+
+    def test_stats_by_product(self):
+        """It should return the top products by revenue"""
+        self._make_stats_orders()
+        response = self.client.get(f"{BASE_URL}/stats", query_string="group_by=product_id&limit=2&live=true")
+        rows = response.get_json()["rows"]
+        self.assertEqual([row["key"] for row in rows], ["1", "2"])
+        self.assertEqual(rows[0], {"key": "1", "orders": 2, "items": 2, "revenue": 30.0})
+
+    def test_stats_from_rollups(self):
+        """It should read the same stats from the daily rollups once refreshed"""
+        yesterday = self._make_stats_orders()
+        StatsRollup.refresh(concurrently=False)
+        for query in (
+            "group_by=status",
+            f"group_by=day&created_from={yesterday}",
+            f"group_by=product_id&created_to={date.today()}&limit=2",
+        ):
+            rollup = self.client.get(f"{BASE_URL}/stats", query_string=query).get_json()
+            live = self.client.get(f"{BASE_URL}/stats", query_string=f"{query}&live=true").get_json()
+            self.assertEqual(rollup["rows"], live["rows"], query)
+            self.assertIsNotNone(rollup["refreshed_at"])
+
+        # new orders only show up after the next refresh
+        make_order()
+        response = self.client.get(f"{BASE_URL}/stats", query_string="group_by=day")
+        self.assertEqual(sum(row["orders"] for row in response.get_json()["rows"]), 3)
+        StatsRollup.refresh()
+        response = self.client.get(f"{BASE_URL}/stats", query_string="group_by=day")
+        self.assertEqual(sum(row["orders"] for row in response.get_json()["rows"]), 4)
+
+    def test_stats_with_archive(self):
+        """It should count the archived Orders in the live stats and the daily rollups"""
+        self._make_stats_orders()
+        old = date.today() - timedelta(days=200)
+        make_order(
+            [Item(product_id="1", product_description="Product 1", quantity=3, price=10.0)],
+            status=OrderStatus.COMPLETED,
+            created_at=old,
+        )
+        self.assertEqual(OrderArchive.archive_completed(days=90), 1)
+        StatsRollup.refresh(concurrently=False)
+        for query in ("group_by=status", f"group_by=day&created_to={old}", "group_by=product_id&limit=1"):
+            rollup = self.client.get(f"{BASE_URL}/stats", query_string=query).get_json()
+            live = self.client.get(f"{BASE_URL}/stats", query_string=f"{query}&live=true").get_json()
+            self.assertEqual(rollup["rows"], live["rows"], query)
+        self.assertEqual(live["rows"], [{"key": "1", "orders": 3, "items": 3, "revenue": 60.0}])
+        response = self.client.get(f"{BASE_URL}/stats", query_string=f"group_by=day&created_to={old}&live=true")
+        self.assertEqual(response.get_json()["rows"], [{"key": str(old), "orders": 1, "items": 1, "revenue": 30.0}])
+
+    def test_stats_before_first_refresh(self):
+        """It should count live until the daily rollups were refreshed"""
+        db.session.query(StatsRollup).delete()
+        db.session.commit()
+        self._make_stats_orders()
+        rollup = self.client.get(f"{BASE_URL}/stats", query_string="group_by=status").get_json()
+        live = self.client.get(f"{BASE_URL}/stats", query_string="group_by=status&live=true").get_json()
+        self.assertEqual(rollup, live)
+        self.assertIsNone(rollup["refreshed_at"])
+
+    def test_stats_bad_arguments(self):
+        """It should reject invalid stats arguments"""
+        for query in (
+            "",
+            "group_by=customer_id",
+            "group_by=day&created_from=yesterday",
+            "group_by=day&created_from=2024-02-01&created_to=2024-01-01",
+        ):
+            response = self.client.get(f"{BASE_URL}/stats", query_string=query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
@@ -0,0 +1,131 @@
+"""
+Test cases for the Status Hub
+"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+from service.models import db, OrderStatus
+from service.common.status_hub import AsyncSubscription, StatusHub, Subscription, SubscriberLimitError
+from .base import DatabaseTestCase
+from .factories import make_order
+
+
+######################################################################
+#  S T A T U S   H U B   T E S T   C A S E S
+######################################################################
+class TestStatusHub(DatabaseTestCase):
+    """Test Cases for the Status Hub"""
+
+    @classmethod
+    def setUpClass(cls):
+        """This runs once before the entire test suite"""
+        super().setUpClass()
+        cls.dsn = db.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+    def setUp(self):
+        """This runs before each test"""
+        super().setUp()
+        self.hub = StatusHub(poll_interval=0.1, retry_delay=0.1)
+
+    def tearDown(self):
+        """This runs after each test"""
+        self.hub.stop()
+        super().tearDown()
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_status_changes_are_pushed(self):
+        """It should push committed status changes to the subscribers that watch them"""
+        watched = make_order(0)
+        other = make_order(0)
+        everything = self.hub.subscribe(self.dsn)
+        one = self.hub.subscribe(self.dsn, [watched.id])
+        self.assertEqual(self.hub.subscribers, 2)
+        for order in (other, watched):
+            order.status = OrderStatus.PROCESSING
+            order.update()
+        self.assertEqual(everything.get(5), {"id": other.id, "status": "PROCESSING"})
+        self.assertEqual(everything.get(5), {"id": watched.id, "status": "PROCESSING"})
+        self.assertEqual(one.get(5), {"id": watched.id, "status": "PROCESSING"})
+        self.assertIsNone(one.get(0.1))
+        # other changes are not pushed
+        watched.shipping_address = "1 New St"
+        watched.update()
+        self.assertIsNone(everything.get(0.3))
+        self.hub.unsubscribe(one)
+        self.assertEqual(self.hub.subscribers, 1)
+
+    def test_async_subscribers(self):
+        """It should push status changes to the queues of subscribers on an event loop"""
+        order = make_order(0)
+
+        async def watch():
+            subscription = await self.hub.subscribe_async(self.dsn, [order.id])
+            order.status = OrderStatus.PROCESSING
+            order.update()
+            return subscription, await subscription.get(5), await subscription.get(0.1)
+
+        loop = asyncio.new_event_loop()
+        subscription, change, nothing = loop.run_until_complete(watch())
+        self.assertEqual(change, {"id": order.id, "status": "PROCESSING"})
+        self.assertIsNone(nothing)
+        self.assertIsInstance(subscription, AsyncSubscription)
+        # a closed event loop has no client left to hand changes to
+        loop.close()
+        subscription.offer({"id": order.id, "status": "COMPLETED"})
+        self.assertTrue(subscription.queue.empty())
+
+    def test_rolled_back_changes_are_not_pushed(self):
+        """It should not push status changes that were rolled back"""
+        order = make_order(0)
+        subscription = self.hub.subscribe(self.dsn)
+        order.status = OrderStatus.PROCESSING
+        db.session.flush()
+        db.session.rollback()
+        self.assertIsNone(subscription.get(0.3))
+
+    def test_slow_subscribers_overflow(self):
+        """It should drop changes for a subscriber that fell behind"""
+        subscription = Subscription(queue_size=1)
+        subscription.offer({"id": 1})
+        self.assertFalse(subscription.overflowed)
+        subscription.offer({"id": 2})
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual(subscription.get(0), {"id": 1})
+
+    def test_listener_restarts(self):
+        """It should start a new listener in a forked worker or after it died"""
+        self.hub.subscribe(self.dsn)
+        first = self.hub._thread  # pylint: disable=protected-access
+        self.hub.subscribe(self.dsn)
+        self.assertIs(self.hub._thread, first)  # pylint: disable=protected-access
+        with patch("service.common.status_hub.os.getpid", return_value=-1):
+            self.hub.stop()
+            self.hub.subscribe(self.dsn)
+        self.assertIsNot(self.hub._thread, first)  # pylint: disable=protected-access
+
+    def test_listener_not_connected(self):
+        """It should fail to subscribe when the database cannot be reached"""
+        self.assertRaises(
+            ConnectionError, self.hub.subscribe, "postgresql://nobody@localhost:1/none", timeout=0.2
+        )
+        self.assertEqual(self.hub.subscribers, 0)
+
+    def test_subscriber_limit(self):
+        """It should refuse subscribers past the limit of the process"""
+        first = self.hub.subscribe(self.dsn, max_subscribers=1)
+        self.assertRaises(SubscriberLimitError, self.hub.subscribe, self.dsn, max_subscribers=1)
+        self.assertEqual(self.hub.subscribers, 1)
+        self.hub.unsubscribe(first)
+        self.hub.subscribe(self.dsn, max_subscribers=1)
+        self.assertEqual(self.hub.subscribers, 1)
+
+    def test_invalid_notifications(self):
+        """It should ignore notifications that are not JSON"""
+        subscription = self.hub.subscribe(self.dsn)
+        self.hub._notified(SimpleNamespace(payload="not json"))  # pylint: disable=protected-access
+        self.hub._notified(SimpleNamespace(payload='{"id": 1}'))  # pylint: disable=protected-access
+        self.assertEqual(subscription.get(0), {"id": 1})